@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class AgentRegistry:
+    """
+    動態 Bot 註冊表（run/bots.json）：
+    - 啟動時載入一次到記憶體，之後讀取都不再碰磁碟
+    - 每次註冊/移除只追加一行到日誌檔（bots.journal），由背景任務在執行緒中寫入
+    - 定期把記憶體狀態壓縮成快照：先寫臨時檔再 rename，寫入中途崩潰不會損壞存檔
+    """
+
+    def __init__(self, store_path: str, *, journal_path: Optional[str] = None,
+                 compact_every: int = 200, compact_interval: int = 300):
+        self._store_path = os.path.abspath(store_path)
+        self._journal_path = os.path.abspath(journal_path or os.path.splitext(store_path)[0] + ".journal")
+        self._compact_every = compact_every
+        self._compact_interval = compact_interval
+        # 以 token 為鍵，dict 保持插入順序，快照輸出順序與原檔一致
+        self._items: Dict[str, dict] = {}
+        self._loaded = False
+        self._pending: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._journal_entries = 0
+        self._dirty = False
+        self._last_compact_ts = time.time()
+
+    @property
+    def store_path(self) -> str:
+        return self._store_path
+
+    # -------------------- 載入 --------------------
+    def load(self) -> List[dict]:
+        """載入快照並重放日誌（僅首次呼叫會讀磁碟）。"""
+        if self._loaded:
+            return self.items()
+        self._loaded = True
+        try:
+            if os.path.exists(self._store_path):
+                with open(self._store_path, "r", encoding="utf-8") as f:
+                    for it in json.load(f) or []:
+                        if it.get("token"):
+                            self._items[it["token"]] = it
+        except Exception as e:
+            logger.error(f"load agents store failed: {e}")
+
+        replayed = 0
+        try:
+            if os.path.exists(self._journal_path):
+                with open(self._journal_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # 崩潰時可能留下半行，忽略即可（upsert/remove 皆為冪等操作）
+                            logger.warning(f"skip malformed agents journal line: {line[:80]!r}")
+                            continue
+                        self._apply(entry)
+                        replayed += 1
+        except Exception as e:
+            logger.error(f"replay agents journal failed: {e}")
+
+        if replayed:
+            # 有未壓縮的日誌，下一輪背景任務會寫回快照
+            self._journal_entries = replayed
+            self._dirty = True
+            self._wakeup.set()
+            logger.info(f"Replayed {replayed} agent journal entries from {self._journal_path}")
+        return self.items()
+
+    def items(self) -> List[dict]:
+        if not self._loaded:
+            self.load()
+        return [dict(it) for it in self._items.values()]
+
+    # -------------------- 變更 --------------------
+    def upsert(self, token: str, brand: str, proxy: Optional[str],
+               bot_name: Optional[str] = None, bot_username: Optional[str] = None) -> None:
+        """新增或更新代理 bot（以 token 去重），只改記憶體並排入日誌佇列。"""
+        if not self._loaded:
+            self.load()
+        entry = {"op": "upsert", "token": token, "brand": brand, "proxy": proxy}
+        if bot_name:
+            entry["bot_name"] = bot_name
+        if bot_username:
+            entry["bot_username"] = bot_username
+        self._apply(entry)
+        self._enqueue(entry)
+
+    def remove(self, token: str) -> bool:
+        """移除代理 bot；不存在時回傳 False 且不寫日誌。"""
+        if not self._loaded:
+            self.load()
+        if token not in self._items:
+            return False
+        entry = {"op": "remove", "token": token}
+        self._apply(entry)
+        self._enqueue(entry)
+        return True
+
+    def _apply(self, entry: dict) -> None:
+        token = entry.get("token")
+        if not token:
+            return
+        if entry.get("op") == "remove":
+            self._items.pop(token, None)
+            return
+        item = self._items.get(token)
+        if item is None:
+            item = {"token": token}
+            self._items[token] = item
+        item["brand"] = entry.get("brand")
+        item["proxy"] = entry.get("proxy")
+        item["enabled"] = True
+        if entry.get("bot_name"):
+            item["bot_name"] = entry["bot_name"]
+        if entry.get("bot_username"):
+            item["bot_username"] = entry["bot_username"]
+
+    def _enqueue(self, entry: dict) -> None:
+        self._pending.append(entry)
+        self._dirty = True
+        self._wakeup.set()
+
+    # -------------------- 背景寫入 --------------------
+    def _append_journal(self, entries: List[dict]) -> None:
+        os.makedirs(os.path.dirname(self._journal_path), exist_ok=True)
+        with open(self._journal_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, items: List[dict]) -> None:
+        os.makedirs(os.path.dirname(self._store_path), exist_ok=True)
+        tmp_path = f"{self._store_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(items, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._store_path)
+        # 快照已包含所有變更，清空日誌；若在此之前崩潰，重放日誌結果不變
+        with open(self._journal_path, "w", encoding="utf-8"):
+            pass
+
+    async def flush(self, *, compact: bool = False) -> None:
+        """寫出佇列中的日誌；compact=True 或達到門檻時同時壓縮快照。"""
+        if self._pending:
+            entries, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._append_journal, entries)
+                self._journal_entries += len(entries)
+            except Exception as e:
+                # 寫入失敗時放回佇列，下一輪重試
+                self._pending = entries + self._pending
+                logger.error(f"append agents journal failed: {e}")
+                return
+
+        due = (
+            self._journal_entries >= self._compact_every
+            or time.time() - self._last_compact_ts >= self._compact_interval
+        )
+        if self._dirty and (compact or due):
+            try:
+                await asyncio.to_thread(self._write_snapshot, self.items())
+                self._journal_entries = 0
+                self._dirty = bool(self._pending)
+                self._last_compact_ts = time.time()
+                logger.info(f"Compacted agents store ({len(self._items)} agents) -> {self._store_path}")
+            except Exception as e:
+                logger.error(f"save agents store failed: {e}")
+
+    async def run(self) -> None:
+        """背景寫入任務：有變更時立即追加日誌，並按次數/時間觸發壓縮。"""
+        try:
+            while True:
+                # 不用 wait_for：事件已觸發時它可能吞掉取消信號
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=self._compact_interval)
+                finally:
+                    waiter.cancel()
+                self._wakeup.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            # 退出前盡量把剩餘變更寫入並壓縮
+            try:
+                await self.flush(compact=True)
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"final agents store flush failed: {e}")
+            raise
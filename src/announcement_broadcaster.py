@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from rate_limiter import TelegramRateLimiter, call_with_limit
+
+
+logger = logging.getLogger(__name__)
+
+
+class AnnouncementJob:
+    """單次公告廣播的進度，供狀態接口查詢。"""
+
+    def __init__(self, announcement_id: str, targets: List[dict]):
+        self.announcement_id = announcement_id
+        self.targets = targets
+        self.total = len(targets)
+        self.sent = 0
+        self.failed = 0
+        self.results: List[dict] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._done = asyncio.Event()
+
+    @property
+    def remaining(self) -> int:
+        return self.total - self.sent - self.failed
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    async def wait(self) -> None:
+        await self._done.wait()
+
+    def snapshot(self, limiter: Optional[TelegramRateLimiter] = None) -> dict:
+        now = self.finished_at or time.time()
+        elapsed = now - self.created_at
+        finished = self.sent + self.failed
+        eta = 0.0
+        if self.remaining:
+            if finished and elapsed > 0:
+                # 以實際吞吐估算
+                eta = self.remaining * elapsed / finished
+            elif limiter is not None:
+                # 尚無進度時以全域速率給出下限
+                eta = self.remaining / limiter.global_rate
+        return {
+            "announcement_id": self.announcement_id,
+            "status": "done" if self.done else "running",
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "remaining": self.remaining,
+            "elapsed_seconds": round(elapsed, 2),
+            "eta_seconds": round(eta, 2),
+            "failures": [r for r in self.results if r.get("status") == "failed"],
+        }
+
+
+class AnnouncementBroadcaster:
+    """
+    公告廣播器：多個 worker 並發發送，速率由 TelegramRateLimiter 控制
+    （全域 ~30/s + 單群間隔），而不是每則之間固定 sleep。
+    - 429 時暫停整個 bot 的發送並重試該則（見 call_with_limit）
+    - 進度以 announcement_id 保存，保留最近 keep_jobs 次
+    """
+
+    def __init__(self, limiter: TelegramRateLimiter, *, concurrency: int = 30,
+                 send_timeout: float = 15.0, max_retries: int = 3, keep_jobs: int = 200):
+        self._limiter = limiter
+        self._concurrency = concurrency
+        self._send_timeout = send_timeout
+        self._max_retries = max_retries
+        self._keep_jobs = keep_jobs
+        self._jobs: "OrderedDict[str, AnnouncementJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def limiter(self) -> TelegramRateLimiter:
+        return self._limiter
+
+    def get(self, announcement_id: str) -> Optional[AnnouncementJob]:
+        return self._jobs.get(announcement_id)
+
+    def start(self, targets: List[dict], send: Callable[[dict], Awaitable[None]],
+              announcement_id: Optional[str] = None) -> AnnouncementJob:
+        """
+        在背景開始廣播並立即返回 job。
+        targets 每項至少包含 chat_id；send(target) 負責實際發送，失敗時拋出異常。
+        """
+        announcement_id = str(announcement_id or uuid.uuid4().hex)
+        if announcement_id in self._tasks:
+            raise ValueError(f"Announcement {announcement_id} is already running")
+        job = AnnouncementJob(announcement_id, targets)
+        self._jobs[announcement_id] = job
+        self._jobs.move_to_end(announcement_id)
+        while len(self._jobs) > self._keep_jobs:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.done:
+                break
+            self._jobs.pop(oldest_id)
+        task = asyncio.create_task(self._run(job, send))
+        self._tasks[announcement_id] = task
+        task.add_done_callback(lambda _t: self._tasks.pop(announcement_id, None))
+        return job
+
+    async def _run(self, job: AnnouncementJob, send: Callable[[dict], Awaitable[None]]) -> None:
+        queue: asyncio.Queue = asyncio.Queue()
+        for target in job.targets:
+            queue.put_nowait(target)
+
+        async def worker():
+            while True:
+                try:
+                    target = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await self._send_one(target, send)
+                job.results.append(result)
+                if result["status"] == "sent":
+                    job.sent += 1
+                else:
+                    job.failed += 1
+
+        logger.info(f"[announcement] {job.announcement_id} 開始並發發送 {job.total} 個頻道")
+        try:
+            workers = max(1, min(self._concurrency, job.total))
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        finally:
+            job.finished_at = time.time()
+            job._done.set()
+            logger.info(
+                f"[announcement] {job.announcement_id} 完成: 成功 {job.sent}/{job.total}，"
+                f"失敗 {job.failed}，耗時 {job.finished_at - job.created_at:.1f}s"
+            )
+
+    async def _send_one(self, target: dict, send: Callable[[dict], Awaitable[None]]) -> dict:
+        result = {k: target.get(k) for k in ("chat_id", "topic_id", "lang")}
+        try:
+            await call_with_limit(
+                self._limiter,
+                target["chat_id"],
+                lambda: asyncio.wait_for(send(target), timeout=self._send_timeout),
+                max_retries=self._max_retries,
+            )
+            result["status"] = "sent"
+        except TelegramRetryAfter as e:
+            result.update(status="failed", error=f"Rate limited: retry after {e.retry_after}s")
+        except asyncio.TimeoutError:
+            logger.error(f"[announcement] 发送到频道 {target['chat_id']} 超时")
+            result.update(status="failed", error="Timeout while sending to Telegram")
+        except Exception as e:  # noqa: BLE001
+            logger.error(f"[announcement] 发送到频道 {target['chat_id']} 失败: {e}")
+            result.update(status="failed", error=str(e))
+        return result
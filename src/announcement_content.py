@@ -0,0 +1,82 @@
+import html
+import re
+from typing import Dict
+
+from multilingual_utils import AI_TRANSLATE_HINT, apply_rtl_if_needed
+
+
+# 已含 AI 提示詞的判斷（不分大小寫）
+_AI_HINT_PATTERNS = (
+    "~AI翻译", "~AI 自動翻譯", "~AI Translation",
+    "AI翻译", "AI 自動翻譯", "AI Translation",
+    "由AI", "by AI", "AI翻訳", "AI 자동 번역",
+    "仅供参考", "for reference", "参考用", "참고용",
+)
+_AI_HINT_RE = re.compile("|".join(re.escape(p) for p in _AI_HINT_PATTERNS), re.IGNORECASE)
+
+# Telegram HTML 支援的標籤原樣保留，其餘 < > & 一律轉義
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<br><br\s*/?>)
+    | (?P<tag>
+        </?(?:b|strong|i|em|u|ins|s|strike|del|code|pre|tg-spoiler|blockquote)>
+        | <a\s+href="[^"<>]*">
+        | </a>
+        | <span\s+class="tg-spoiler">
+        | </span>
+      )
+    | (?P<entity>&(?:[a-zA-Z][a-zA-Z0-9]*|\#[0-9]+|\#x[0-9a-fA-F]+);)
+    | \[(?P<link_text>[^\]]+)\]\((?P<link_url>[^)\s]+)\)
+    | \*\*(?P<bold>[^*]+)\*\*
+    | \*(?P<italic>[^*]+)\*
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+
+def has_ai_hint(text: str) -> bool:
+    """检查文本是否已经包含 AI 提示词"""
+    return _AI_HINT_RE.search(text) is not None
+
+
+def markdown_to_telegram_html(text: str) -> str:
+    """
+    將公告中的簡易 Markdown 轉為 Telegram HTML：
+    [text](url) -> <a>，**text** -> <b>，*text* -> <i>，<br> -> 換行；
+    已是 Telegram 支援的 HTML 標籤與實體保留，其餘文字做 HTML 轉義。
+    """
+    out = []
+    pos = 0
+    for m in _TOKEN_RE.finditer(text):
+        if m.start() > pos:
+            out.append(html.escape(text[pos:m.start()], quote=False))
+        pos = m.end()
+        if m.group("br") is not None:
+            out.append("\n")
+        elif m.group("tag") is not None or m.group("entity") is not None:
+            out.append(m.group(0))
+        elif m.group("link_text") is not None:
+            url = html.escape(html.unescape(m.group("link_url")), quote=True)
+            out.append(f'<a href="{url}">{markdown_to_telegram_html(m.group("link_text"))}</a>')
+        elif m.group("bold") is not None:
+            out.append(f"<b>{markdown_to_telegram_html(m.group('bold'))}</b>")
+        else:
+            out.append(f"<i>{markdown_to_telegram_html(m.group('italic'))}</i>")
+    out.append(html.escape(text[pos:], quote=False))
+    return "".join(out)
+
+
+def prepare_announcement_content(content: str, lang_code: str) -> str:
+    """單一語言的公告定稿：按需附加 AI 提示詞（英文不加）、轉 HTML、處理 RTL。"""
+    if not has_ai_hint(content) and not str(lang_code).lower().startswith("en"):
+        content = content + "\n" + AI_TRANSLATE_HINT.get(lang_code, AI_TRANSLATE_HINT["en_US"])
+    return apply_rtl_if_needed(markdown_to_telegram_html(content))
+
+
+def prepare_announcements(content_dict: Dict[str, str]) -> Dict[str, str]:
+    """每個語言版本只處理一次，發送時按頻道語言直接取用。"""
+    return {
+        lang: prepare_announcement_content(content, lang)
+        for lang, content in content_dict.items()
+        if content
+    }
@@ -1,43 +1,159 @@
 import asyncio
 import logging
 import time
-from typing import Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
 
-from aiogram import Bot, Dispatcher, Router
+from aiogram import BaseMiddleware, Bot, Dispatcher, Router
 from aiogram.client.bot import DefaultBotProperties
 from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramConflictError
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import TelegramObject, Update, User
+from aiogram.utils.token import extract_bot_id
 
 
 logger = logging.getLogger(__name__)
 
 
 class BotContext:
-    """保存單一 Bot 的運行上下文（Bot、Dispatcher、任務等）。"""
+    """保存單一 Bot 的運行狀態：憑證（Bot 實例）、輪詢游標與任務；路由與 FSM 儲存由所有 Bot 共用。"""
 
-    def __init__(self, bot: Bot, dispatcher: Dispatcher, brand: str, proxy: Optional[str] = None):
+    def __init__(self, bot: Bot, brand: str, proxy: Optional[str] = None):
         self.bot = bot
-        self.dispatcher = dispatcher
         self.brand = brand
         self.proxy = proxy
         self.tasks = []  # type: list[asyncio.Task]
         self.bot_id: Optional[int] = None
+        self.me: Optional[User] = None
+        # getUpdates 的 offset 游標
+        self.cursor: Optional[int] = None
         self.last_activity_ts: float = time.time()
+        # DETAIL_API_BY_BOT 語言快照，由 BotContextMiddleware 惰性刷新
+        self.detail_lang: Optional[str] = None
+        self.detail_lang_ts: float = 0.0
+        self._detail_refresh: Optional[asyncio.Task] = None
+
+    @property
+    def username(self) -> Optional[str]:
+        return getattr(self.me, "username", None)
+
+    @property
+    def display_name(self) -> str:
+        """與 get_bot_display_name 一致：@username 優先，其次 first_name，最後 bot_id。"""
+        return self.username or getattr(self.me, "first_name", None) or str(self.bot_id)
+
+
+class BotContextMiddleware(BaseMiddleware):
+    """
+    分派時把 BotContext 注入 handler（data["bot_ctx"]）：
+    - brand / display_name / username 直接從 context 讀取，handler 內無需 await
+    - get_me 只在 context 第一次出現時請求一次（動態 Bot 註冊時已取得）
+    - 語言快照首次同步載入，過期後在背景刷新，handler 讀到的是上一次的快照
+    """
+
+    def __init__(self, manager: "BotManager", *, default_brand: str,
+                 lang_loader: Optional[Callable[[Bot, str], Awaitable[Optional[str]]]] = None,
+                 lang_ttl: int = 20 * 60, lang_retry: int = 60):
+        self._manager = manager
+        self._default_brand = default_brand
+        self._lang_loader = lang_loader
+        self._lang_ttl = lang_ttl
+        self._lang_retry = lang_retry
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        bot = data.get("bot")
+        if bot is None:
+            return await handler(event, data)
+        ctx = self._manager.context_for(bot, self._default_brand)
+        if ctx.me is None:
+            await self._manager.ensure_me(ctx)
+        if self._lang_loader is not None:
+            if ctx.detail_lang_ts == 0.0:
+                await self._refresh_detail_lang(ctx)
+            elif time.time() - ctx.detail_lang_ts >= (self._lang_ttl if ctx.detail_lang else self._lang_retry):
+                self._refresh_detail_lang(ctx)
+        data["bot_ctx"] = ctx
+        return await handler(event, data)
+
+    def _refresh_detail_lang(self, ctx: BotContext) -> asyncio.Task:
+        """同一 Bot 同時只有一個刷新任務（single-flight），失敗時保留舊快照。"""
+        if ctx._detail_refresh is None or ctx._detail_refresh.done():
+            ctx._detail_refresh = asyncio.create_task(self._load_detail_lang(ctx))
+        return ctx._detail_refresh
+
+    async def _load_detail_lang(self, ctx: BotContext) -> None:
+        try:
+            lang = await self._lang_loader(ctx.bot, ctx.brand)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Bot {ctx.bot_id} 刷新語言快照失敗: {e}")
+            lang = None
+        if lang:
+            ctx.detail_lang = str(lang)
+        ctx.detail_lang_ts = time.time()
 
 
 class BotManager:
-    """簡單的多 Bot 管理器，負責註冊、啟動與停止額外的 Bot。"""
+    """簡單的多 Bot 管理器，負責註冊、啟動與停止額外的 Bot。
+
+    所有動態 Bot 共用同一個 Dispatcher（一份預先編譯的 handler 表）與同一個 FSM 儲存，
+    aiogram 的 StorageKey 本身帶 bot_id，不同 Bot 的狀態不會互相干擾。
+    """
 
-    def __init__(self, shared_router: Router, max_bots: int = 200):
-        self._shared_router = shared_router
+    def __init__(self, shared_router: Optional[Router] = None, max_bots: int = 200):
         self._max_bots = max_bots
         self._lock = asyncio.Lock()
         self._contexts: Dict[int, BotContext] = {}
+        # get_me 結果快取：{token: (User, ts)}
+        self._me_cache: Dict[str, Tuple[User, float]] = {}
+        self._me_cache_ttl = 6 * 3600
+        self._dispatcher = Dispatcher(storage=MemoryStorage())
+        self._router_attached = False
+        self._allowed_updates: Optional[list] = None
+        # 保存處理中的 update 任務引用，避免被 GC 回收
+        self._update_tasks: Set[asyncio.Task] = set()
+        # 未經 manager 註冊、但經過 middleware 的 bot（主 Bot）
+        self._standalone: Dict[int, BotContext] = {}
+        if shared_router is not None:
+            self.attach_router(shared_router)
+
+    def attach_router(self, router: Router) -> None:
+        """掛載共用 handler 表（只能掛載一次），並預先計算需要輪詢的 update 類型。"""
+        if self._router_attached:
+            raise RuntimeError("Shared router already attached")
+        self._dispatcher.include_router(router)
+        self._router_attached = True
+        self._allowed_updates = self._dispatcher.resolve_used_update_types()
+        logger.info(f"BotManager shared router attached, allowed_updates={self._allowed_updates}")
 
     def get_brand_by_bot_id(self, bot_id: int, default_brand: str) -> str:
         ctx = self._contexts.get(bot_id)
         return ctx.brand if ctx else default_brand
 
+    @property
+    def dispatcher(self) -> Dispatcher:
+        return self._dispatcher
+
+    def peek_context(self, bot_id: int) -> Optional[BotContext]:
+        """取得已存在的 context（動態 Bot 或已見過的主 Bot），不建立新的。"""
+        return self._contexts.get(bot_id) or self._standalone.get(bot_id)
+
+    def context_for(self, bot: Bot, default_brand: str) -> BotContext:
+        """取得 bot 的 context；未經 manager 註冊的 bot（例如主 Bot）建立一份獨立 context，不計入 max_bots。"""
+        ctx = self.peek_context(bot.id)
+        if ctx is None:
+            ctx = BotContext(bot=bot, brand=default_brand)
+            ctx.bot_id = bot.id
+            self._standalone[bot.id] = ctx
+        return ctx
+
+    async def ensure_me(self, ctx: BotContext) -> None:
+        try:
+            ctx.me = await self._get_me_cached(ctx.bot, ctx.bot.token)
+        except Exception as e:  # noqa: BLE001
+            # 下一個 update 再試；display_name 暫時回退為 bot_id
+            logger.warning(f"Bot {ctx.bot_id} get_me 失敗: {e}")
+
     def list_bots(self) -> list:
         return [
             {
@@ -49,64 +165,119 @@ class BotManager:
             for bot_id, ctx in self._contexts.items()
         ]
 
+    def expire_detail_lang(self, *, brand: Optional[str] = None, username: Optional[str] = None) -> int:
+        """讓符合條件的 context 語言快照過期，下一個 update 時重新載入。返回受影響的 context 數。"""
+        expired = 0
+        for ctx in list(self._contexts.values()) + list(self._standalone.values()):
+            if (brand is None or ctx.brand == brand) and (username is None or ctx.display_name == username):
+                ctx.detail_lang_ts = 0.0
+                expired += 1
+        return expired
+
     def record_activity(self, bot_id: int) -> None:
         ctx = self._contexts.get(bot_id)
         if ctx:
             ctx.last_activity_ts = time.time()
 
-    async def _detect_bot_conflicts(self, bot: Bot, bot_id: int) -> dict:
+    async def _get_me_cached(self, bot: Bot, token: str) -> User:
+        """取得 bot 的 get_me 結果，按 token 快取，避免重複請求 Telegram。"""
+        item = self._me_cache.get(token)
+        if item and time.time() - item[1] < self._me_cache_ttl:
+            return item[0]
+        me = await bot.get_me()
+        self._me_cache[token] = (me, time.time())
+        return me
+
+    async def _probe_polling(self, bot: Bot) -> None:
+        """以極短的 getUpdates 探測是否可輪詢；offset=-1 同時丟棄積壓更新。"""
+        await bot.get_updates(offset=-1, limit=1, timeout=0)
+
+    async def _detect_bot_conflicts(self, bot: Bot, bot_id: int, *, probe_timeout: float) -> dict:
         """
-        检测 bot 是否与其他实例冲突
-        返回冲突信息字典
+        事件驅動的冲突探測：
+        - 直接探測 getUpdates，成功即返回（無冲突時只需一次往返）
+        - 若提示 webhook 仍啟用，刪除 webhook 後立即重新探測
+        - 若被其他 getUpdates 終止，按指數退避重試，直到成功或超過 probe_timeout
         """
         conflict_info = {
             "has_conflict": False,
             "conflict_type": None,
             "conflict_details": None
         }
-        
-        try:
-            # 1. 检查 webhook 状态
-            webhook_info = await bot.get_webhook_info()
-            if webhook_info.url and webhook_info.url.strip():
-                conflict_info["has_conflict"] = True
-                conflict_info["conflict_type"] = "webhook_active"
-                conflict_info["conflict_details"] = f"Bot 正在使用 webhook: {webhook_info.url}"
-                logger.warning(f"Bot {bot_id} 检测到活跃的 webhook: {webhook_info.url}")
-                return conflict_info
-            
-            # 2. 尝试获取 pending updates 数量（使用非常短的超时，避免触发冲突）
-            # 注意：这里不检查冲突，因为 get_updates 本身可能会触发冲突错误
-            # 我们只记录信息，不将其视为冲突
-            try:
-                updates = await bot.get_updates(limit=1, timeout=0.1)
-                # 如果有很多 pending updates，可能表示 bot 在其他地方运行
-                if len(updates) > 0:
-                    logger.info(f"Bot {bot_id} 有 {len(updates)} 个待处理更新")
-            except Exception as e:
-                # 不将 get_updates 错误视为冲突，因为这可能是正常的（bot 正在其他地方运行）
-                # 我们会在删除 webhook 后处理这个问题
-                logger.debug(f"Bot {bot_id} 获取更新时出错（这可能是正常的）: {e}")
-            
-            # 3. 检查 bot 是否响应正常
+        deadline = time.monotonic() + probe_timeout
+        backoff = 0.25
+        webhook_deleted = False
+
+        while True:
             try:
-                me = await bot.get_me()
-                if me.id != bot_id:
+                await self._probe_polling(bot)
+                return conflict_info
+            except TelegramConflictError as e:
+                error_msg = str(e)
+                if "webhook" in error_msg.lower() and not webhook_deleted:
+                    # 清除 webhook 屬於可恢復的冲突，只作為警告返回
+                    logger.warning(f"Bot {bot_id} 检测到活跃的 webhook，正在删除: {error_msg}")
                     conflict_info["has_conflict"] = True
-                    conflict_info["conflict_type"] = "token_mismatch"
-                    conflict_info["conflict_details"] = f"Token 不匹配: 期望 {bot_id}, 实际 {me.id}"
+                    conflict_info["conflict_type"] = "webhook_active"
+                    conflict_info["conflict_details"] = f"Bot 先前使用 webhook，已自動清除: {error_msg}"
+                    try:
+                        await bot.delete_webhook(drop_pending_updates=True)
+                        webhook_deleted = True
+                        logger.info(f"Bot {bot_id} webhook 已清除")
+                    except Exception as del_e:  # noqa: BLE001
+                        logger.warning(f"delete_webhook failed for bot {bot_id}: {del_e}")
+                        conflict_info["conflict_type"] = "webhook_delete_failed"
+                        conflict_info["conflict_details"] = f"无法删除 webhook: {str(del_e)}"
+                        return conflict_info
+                    continue
+
+                # 其他實例仍在輪詢；等待其連接釋放，一旦探測成功即返回
+                if time.monotonic() + backoff > deadline:
+                    logger.warning(f"Bot {bot_id} 检测到其他实例正在运行: {error_msg}")
+                    conflict_info["has_conflict"] = True
+                    conflict_info["conflict_type"] = "other_instance_running"
+                    conflict_info["conflict_details"] = f"检测到其他实例正在使用此 bot token: {error_msg}"
+                    return conflict_info
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 2.0)
             except Exception as e:
-                conflict_info["has_conflict"] = True
-                conflict_info["conflict_type"] = "get_me_failed"
-                conflict_info["conflict_details"] = f"无法获取 bot 信息: {str(e)}"
-                
-        except Exception as e:
-            logger.error(f"Bot {bot_id} 冲突检测时出错: {e}")
-            conflict_info["has_conflict"] = True
-            conflict_info["conflict_type"] = "detection_error"
-            conflict_info["conflict_details"] = f"冲突检测失败: {str(e)}"
-        
-        return conflict_info
+                # 網絡等其他錯誤不視為冲突，交給輪詢自行重試
+                logger.debug(f"Bot {bot_id} 测试获取更新时出错（可能是正常的）: {e}")
+                return conflict_info
+
+    async def _feed_update(self, bot: Bot, update: Update) -> None:
+        try:
+            await self._dispatcher.feed_update(bot, update)
+        except Exception as e:  # noqa: BLE001
+            logger.exception(f"Bot {bot.id} 處理 update {update.update_id} 失敗: {e}")
+
+    async def _poll_updates(self, ctx: BotContext, *, polling_timeout: int = 30) -> None:
+        """單一 Bot 的長輪詢：只維護自己的 offset 游標，update 交給共用 Dispatcher 處理。"""
+        backoff = 1.0
+        while True:
+            try:
+                updates = await ctx.bot.get_updates(
+                    offset=ctx.cursor,
+                    timeout=polling_timeout,
+                    allowed_updates=self._allowed_updates,
+                    request_timeout=polling_timeout + 10,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Bot {ctx.bot_id} getUpdates 失敗，{backoff:.0f}s 後重試: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = 1.0
+            if updates:
+                # 活動時間按批次記錄：每次 getUpdates 只更新一次
+                ctx.last_activity_ts = time.time()
+            for update in updates:
+                ctx.cursor = update.update_id + 1
+                task = asyncio.create_task(self._feed_update(ctx.bot, update))
+                self._update_tasks.add(task)
+                task.add_done_callback(self._update_tasks.discard)
 
     async def _idle_watchdog(self, bot_id: int, *, max_idle_seconds: int, check_interval: int) -> None:
         """定期檢查 Bot 是否長時間無活動，超過閾值則自動停止。"""
@@ -129,129 +300,108 @@ class BotManager:
 
     async def register_and_start_bot(self, token: str, brand: str, *, proxy: Optional[str] = None,
                                      heartbeat_coro_factory=None, periodic_coro_factory=None,
-                                     router_factory=None, max_idle_seconds: Optional[int] = 3*24*3600,
-                                     idle_check_interval: int = 3600) -> dict:
+                                     max_idle_seconds: Optional[int] = 3*24*3600,
+                                     idle_check_interval: int = 3600,
+                                     conflict_probe_timeout: float = 8.0) -> dict:
         """
         建立並啟動一個新的 Bot：
-        - 使用與主程式相同的 Router（共用 handlers）
-        - 各自擁有獨立 Dispatcher 與任務
+        - 共用 BotManager 的 Dispatcher 與 handler 表，不再為每個 Bot 建立 Router
+        - 每個 Bot 只保存憑證、輪詢游標與自身任務
+        - get_me 與冲突探測並發執行，無冲突時一次往返即可完成
         回傳 bot_id。
         """
         async with self._lock:
-            if len(self._contexts) >= self._max_bots:
-                raise RuntimeError("Max bots limit reached")
-
             session = AiohttpSession(proxy=proxy) if proxy else None
             bot = Bot(token=token, default=DefaultBotProperties(parse_mode="HTML"), session=session)
-
-            # 先呼叫 get_me 取得 bot_id 和 bot 信息
-            me = await bot.get_me()
-            bot_id = me.id
-            bot_name = getattr(me, "first_name", None) or "Unknown"
-            username = getattr(me, "username", None)
+            # bot_id 可直接由 token 解析，無需請求 Telegram
+            bot_id = bot.id
 
             # 如果已存在，直接返回，避免不必要的操作（如删除 webhook）
             if bot_id in self._contexts:
-                try:
-                    await bot.session.close()
-                except Exception:  # noqa: BLE001
-                    pass
                 ctx = self._contexts[bot_id]
-                # 获取已存在 bot 的信息
                 try:
-                    existing_me = await ctx.bot.get_me()
-                    existing_bot_name = getattr(existing_me, "first_name", None) or "Unknown"
-                    existing_username = getattr(existing_me, "username", None)
-                except Exception:
-                    existing_bot_name = "Unknown"
-                    existing_username = None
+                    # bot_id 只是 token 的前綴：token 與運行中的不同時，需向 Telegram 驗證提交的 token
+                    if ctx.bot.token != token:
+                        me = await bot.get_me()
+                        if me.id != bot_id:
+                            raise RuntimeError(f"Bot token does not match bot {bot_id}")
+                        logger.warning(f"Bot {bot_id} 已以另一個 token 運行，提交的 token 驗證通過")
+                finally:
+                    try:
+                        await bot.session.close()
+                    except Exception:  # noqa: BLE001
+                        pass
+                existing_bot_name = getattr(ctx.me, "first_name", None) or "Unknown"
+                existing_username = getattr(ctx.me, "username", None)
                 logger.info(f"Bot {bot_id} 已存在，返回已启动状态")
                 return {"bot_id": bot_id, "status": "already_started", "brand": ctx.brand, "proxy": ctx.proxy, "bot_name": existing_bot_name, "username": existing_username}
 
-            # 检测 bot 冲突（仅在 bot 不存在时检测）
-            conflict_info = await self._detect_bot_conflicts(bot, bot_id)
-            
-            # 確保使用輪詢模式：若先前設有 webhook，需刪除
-            # 实现"抢占"机制：删除 webhook 后等待更长时间，让其他实例的连接超时
+            if len(self._contexts) >= self._max_bots:
+                try:
+                    await bot.session.close()
+                except Exception:  # noqa: BLE001
+                    pass
+                raise RuntimeError("Max bots limit reached")
+
+            # get_me（帶快取）與冲突探測互不依賴，並發執行；
+            # 任一失敗（如 token 無效）時取消另一個，避免探測繼續用無效 token 輪詢 getUpdates
+            me_task = asyncio.ensure_future(self._get_me_cached(bot, token))
+            probe_task = asyncio.ensure_future(
+                self._detect_bot_conflicts(bot, bot_id, probe_timeout=conflict_probe_timeout)
+            )
             try:
-                await bot.delete_webhook(drop_pending_updates=True)
-                logger.info(f"Bot {bot_id} webhook 已清除")
-                
-                # 等待一段时间，让 Telegram 服务器完全释放连接
-                # 如果其他实例正在运行，它们的连接会在几秒后超时
-                await asyncio.sleep(5)  # 增加到5秒，给其他实例更多时间释放连接
-                
-                # 再次检查 webhook 是否已清除
+                done, pending = await asyncio.wait({me_task, probe_task}, return_when=asyncio.FIRST_EXCEPTION)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+                for task in done:
+                    if task.exception() is not None:
+                        raise task.exception()
+                me = me_task.result()
+                conflict_info = probe_task.result()
+            except BaseException:
+                for task in (me_task, probe_task):
+                    task.cancel()
                 try:
-                    webhook_info = await bot.get_webhook_info()
-                    if webhook_info.url and webhook_info.url.strip():
-                        logger.warning(f"Bot {bot_id} webhook 仍然存在: {webhook_info.url}，再次尝试删除...")
-                        await bot.delete_webhook(drop_pending_updates=True)
-                        await asyncio.sleep(3)  # 再次等待3秒
-                except Exception as check_e:
-                    logger.warning(f"Bot {bot_id} 检查 webhook 状态时出错: {check_e}")
-                
-                # 尝试测试是否可以获取更新（检测是否还有其他实例在运行）
+                    await bot.session.close()
+                except Exception:  # noqa: BLE001
+                    pass
+                raise
+            bot_name = getattr(me, "first_name", None) or "Unknown"
+            username = getattr(me, "username", None)
+
+            # 如果检测到严重冲突（其他实例正在运行），不启动 bot，返回错误
+            if conflict_info["has_conflict"] and conflict_info["conflict_type"] == "other_instance_running":
                 try:
-                    # 使用非常短的超时，避免触发冲突
-                    test_updates = await bot.get_updates(limit=1, timeout=0.1, offset=-1)
-                    logger.debug(f"Bot {bot_id} 测试获取更新成功")
-                except Exception as test_e:
-                    error_msg = str(test_e)
-                    if "Conflict" in error_msg or "terminated by other getUpdates" in error_msg:
-                        # 检测到冲突，说明其他实例仍在运行
-                        logger.warning(f"Bot {bot_id} 检测到其他实例正在运行: {error_msg}")
-                        conflict_info["has_conflict"] = True
-                        conflict_info["conflict_type"] = "other_instance_running"
-                        conflict_info["conflict_details"] = f"检测到其他实例正在使用此 bot token: {error_msg}"
-                    else:
-                        # 其他错误，可能是网络问题，不视为冲突
-                        logger.debug(f"Bot {bot_id} 测试获取更新时出错（可能是正常的）: {test_e}")
-            except Exception as e:
-                logger.warning(f"delete_webhook failed for bot {bot_id}: {e}")
-                # 如果删除 webhook 失败，记录冲突信息
-                if not conflict_info["has_conflict"]:
-                    conflict_info["has_conflict"] = True
-                    conflict_info["conflict_type"] = "webhook_delete_failed"
-                    conflict_info["conflict_details"] = f"无法删除 webhook: {str(e)}"
+                    await bot.session.close()
+                except Exception:  # noqa: BLE001
+                    pass
+                # 抛出异常，让调用方知道有冲突
+                raise RuntimeError(
+                    f"Bot {bot_id} 无法启动：检测到其他实例正在运行。"
+                    f"请确保同一 bot token 只在一个环境中运行。"
+                    f"详情: {conflict_info['conflict_details']}"
+                )
 
-            # 為此 Bot 建立獨立 Dispatcher 與其路由
-            dp = Dispatcher(storage=MemoryStorage())
-            if router_factory is not None:
-                dp.include_router(router_factory())
-            else:
-                # 預設：複用主 router 的邏輯（注意：不能直接附加同一個實例）
-                r = Router()
-                dp.include_router(r)
+            if not self._router_attached:
+                logger.warning(f"Bot {bot_id} 啟動時尚未掛載共用 router，update 將不會被處理")
 
-            context = BotContext(bot=bot, dispatcher=dp, brand=brand, proxy=proxy)
+            context = BotContext(bot=bot, brand=brand, proxy=proxy)
             context.bot_id = bot_id
+            context.me = me
 
             # 啟動任務（心跳、週期任務、polling）
             if heartbeat_coro_factory:
                 context.tasks.append(asyncio.create_task(heartbeat_coro_factory(bot)))
             if periodic_coro_factory:
                 context.tasks.append(asyncio.create_task(periodic_coro_factory(bot)))
-            context.tasks.append(asyncio.create_task(dp.start_polling(bot)))
+            context.tasks.append(asyncio.create_task(self._poll_updates(context)))
 
             # 可選：啟動閒置監視（None 表示不監視、永不自動停用）
             if max_idle_seconds is not None:
                 context.tasks.append(asyncio.create_task(self._idle_watchdog(bot_id, max_idle_seconds=max_idle_seconds, check_interval=idle_check_interval)))
 
-            # 如果检测到严重冲突（其他实例正在运行），不启动 bot，返回错误
-            if conflict_info["has_conflict"] and conflict_info["conflict_type"] == "other_instance_running":
-                # 关闭临时 session
-                try:
-                    await bot.session.close()
-                except Exception:  # noqa: BLE001
-                    pass
-                # 抛出异常，让调用方知道有冲突
-                raise RuntimeError(
-                    f"Bot {bot_id} 无法启动：检测到其他实例正在运行。"
-                    f"请确保同一 bot token 只在一个环境中运行。"
-                    f"详情: {conflict_info['conflict_details']}"
-                )
-            
             self._contexts[bot_id] = context
             logger.info(f"Registered and started new bot: {bot_id} ({brand})")
             
@@ -266,7 +416,7 @@ class BotManager:
             }
             
             # 如果有其他类型的冲突（非严重冲突），添加警告信息
-            if conflict_info["has_conflict"] and conflict_info["conflict_type"] != "other_instance_running":
+            if conflict_info["has_conflict"]:
                 result["conflict_warning"] = {
                     "type": conflict_info["conflict_type"],
                     "details": conflict_info["conflict_details"]
@@ -305,16 +455,12 @@ class BotManager:
         返回: {"success": bool, "bot_id": int or None, "message": str}
         """
         try:
-            # 创建临时 bot 实例来获取 bot_id
-            temp_bot = Bot(token=token)
-            try:
-                me = await temp_bot.get_me()
-                bot_id = me.id
-            finally:
-                try:
-                    await temp_bot.session.close()
-                except Exception:
-                    pass
+            # bot_id 可直接由 token 解析，無需建立臨時 bot 或呼叫 get_me
+            bot_id = extract_bot_id(token)
+            ctx = self._contexts.get(bot_id)
+            if ctx and ctx.bot.token != token:
+                # token 與運行中的 bot 不符，視同無效 token
+                return {"success": False, "bot_id": None, "message": "Invalid bot token"}
             
             # 使用 bot_id 停止 bot（stop_bot 内部已经有锁保护）
             stopped = await self.stop_bot(bot_id)
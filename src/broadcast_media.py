@@ -0,0 +1,108 @@
+import asyncio
+import io
+import logging
+from typing import Awaitable, Callable, Optional, Union
+
+import aiohttp
+from aiogram.types import BufferedInputFile, Message
+from PIL import Image
+
+
+logger = logging.getLogger(__name__)
+
+# Telegram sendPhoto 限制：檔案 ≤ 10MB，寬+高 ≤ 10000，長寬比 ≤ 20
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+PHOTO_MAX_DIMENSION_SUM = 10000
+PHOTO_MAX_RATIO = 20
+
+
+def _normalize_photo(data: bytes, max_bytes: int = PHOTO_MAX_BYTES) -> bytes:
+    """驗證圖片；超出 Telegram 照片限制時縮放並重新壓縮為 JPEG，否則原樣返回。"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+        img = Image.open(io.BytesIO(data))
+    except Exception as e:
+        raise ValueError(f"Invalid image: {e}") from e
+
+    width, height = img.size
+    if max(width, height) > PHOTO_MAX_RATIO * min(width, height):
+        raise ValueError(f"Image aspect ratio too large: {width}x{height}")
+    if len(data) <= max_bytes and width + height <= PHOTO_MAX_DIMENSION_SUM:
+        return data
+
+    if width + height > PHOTO_MAX_DIMENSION_SUM:
+        scale = PHOTO_MAX_DIMENSION_SUM / float(width + height)
+        img = img.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    quality = 90
+    while True:
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality, optimize=True)
+        out = buf.getvalue()
+        if len(out) <= max_bytes or quality <= 40:
+            break
+        quality -= 10
+    if len(out) > max_bytes:
+        raise ValueError(f"Image too large after recompression: {len(out)} bytes")
+    logger.info(f"圖片已重新壓縮: {len(data)} -> {len(out)} bytes, {width}x{height} -> {img.size[0]}x{img.size[1]}")
+    return out
+
+
+class BroadcastMedia:
+    """
+    一次廣播共用的圖片：
+    - 只下載一次到記憶體並驗證/壓縮，不落地臨時檔
+    - 第一次上傳成功後記下 file_id，其餘頻道直接引用，不再重複上傳
+    - 並發發送時只有一個請求在上傳，其他請求等待 file_id
+    """
+
+    def __init__(self, data: bytes, filename: str = "image.jpg"):
+        self.data = data
+        self.filename = filename
+        self.file_id: Optional[str] = None
+        self._uploading: Optional[asyncio.Event] = None
+
+    @classmethod
+    async def fetch(cls, url: str, *, session: Optional[aiohttp.ClientSession] = None,
+                    timeout: float = 30.0) -> "BroadcastMedia":
+        """下載並驗證圖片；失敗時拋出異常。"""
+        async def _get(s: aiohttp.ClientSession) -> bytes:
+            async with s.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                if resp.status != 200:
+                    raise RuntimeError(f"Image fetch error {resp.status}")
+                return await resp.read()
+
+        if session is not None:
+            raw = await _get(session)
+        else:
+            async with aiohttp.ClientSession() as s:
+                raw = await _get(s)
+        data = await asyncio.to_thread(_normalize_photo, raw)
+        name = url.rsplit("/", 1)[-1].split("?", 1)[0] or "image.jpg"
+        if data is not raw:
+            name = name.rsplit(".", 1)[0] + ".jpg"
+        logger.info(f"廣播圖片已載入: {url} ({len(data)} bytes)")
+        return cls(data, name)
+
+    async def send(self, send_photo: Callable[[Union[str, BufferedInputFile]], Awaitable[Message]]) -> Message:
+        """以 file_id 或記憶體中的位元組呼叫 send_photo(photo)。"""
+        while True:
+            if self.file_id:
+                return await send_photo(self.file_id)
+            if self._uploading is None:
+                break
+            await self._uploading.wait()
+
+        self._uploading = asyncio.Event()
+        try:
+            message = await send_photo(BufferedInputFile(self.data, filename=self.filename))
+            if message is not None and getattr(message, "photo", None):
+                self.file_id = message.photo[-1].file_id
+            return message
+        finally:
+            # 上傳失敗時 file_id 仍為空，等待者中的下一個會接手上傳
+            event, self._uploading = self._uploading, None
+            event.set()
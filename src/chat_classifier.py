@@ -0,0 +1,164 @@
+import asyncio
+import html
+import logging
+import re
+import time
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+from socials_snapshot import SocialsSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+# Telegram 支持的 HTML 標籤
+_VALID_TAG_RE = re.compile(
+    r"<(/?)(a|b|strong|i|em|u|ins|s|strike|del|code|pre|blockquote|tg-spoiler)(\s[^>]*)?>",
+    re.IGNORECASE,
+)
+_HREF_URL_RE = re.compile(r'href=["\'](https?://[^"\']+)["\']')
+_PLAIN_URL_RE = re.compile(r'(https?://[^\s<>")\]]+)')
+
+
+def extract_first_url(text: str) -> Optional[str]:
+    """提取 referral link（兼容 <a href> 或純文本連結，並去除尾隨標點符號）"""
+    m = _HREF_URL_RE.search(text)
+    if m:
+        return m.group(1).strip()
+    m = _PLAIN_URL_RE.search(text)
+    if m:
+        # 去除常見尾隨標點
+        return m.group(1).rstrip('.,;!?)"\']}').strip()
+    return None
+
+
+def sanitize_html_for_telegram(text: str) -> str:
+    """清理 HTML：轉義非標準標籤的尖括號（如 <UID>），保留有效的 HTML 標籤"""
+    out = []
+    pos = 0
+    for m in _VALID_TAG_RE.finditer(text):
+        out.append(html.escape(text[pos:m.start()]))
+        out.append(m.group(0))
+        pos = m.end()
+    out.append(html.escape(text[pos:]))
+    return "".join(out)
+
+
+class ChatClassification:
+    """chat_id 的分類結果：是否資訊群、是否驗證群，以及驗證群的歡迎語模板與語言。"""
+
+    __slots__ = ("chat_id", "is_social", "is_verify_group", "welcome_template", "referral_link", "lang")
+
+    def __init__(self, chat_id: str, *, is_social: bool = False, is_verify_group: bool = False,
+                 welcome_template: Optional[str] = None, referral_link: Optional[str] = None,
+                 lang: Optional[str] = None):
+        self.chat_id = chat_id
+        self.is_social = is_social
+        self.is_verify_group = is_verify_group
+        # 已清理的 HTML，保留 @{username} 占位符
+        self.welcome_template = welcome_template
+        self.referral_link = referral_link
+        self.lang = lang
+
+
+class ChatClassifier:
+    """
+    入群事件用的群組分類快取：
+    - 資訊群判斷來自共享的 SOCIAL_API 快照（SocialsIndex.social_groups）
+    - 驗證群/歡迎語來自 WELCOME_API，按 (brand, chat_id) 快取：
+      命中 ttl 秒；非驗證群 negative_ttl 秒；接口出錯 error_ttl 秒，避免出錯時每次入群都打上游
+    - 同一群同時只有一個 WELCOME_API 請求（single-flight）
+    快取溫熱時 classify() 不做任何網路 I/O。
+    """
+
+    def __init__(self, welcome_url: Optional[str], socials: SocialsSnapshot, *,
+                 ttl: float = 600.0, negative_ttl: float = 120.0, error_ttl: float = 30.0):
+        self._welcome_url = welcome_url
+        self._socials = socials
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._error_ttl = error_ttl
+        # {(brand, chat_id): (info, expires_at)}
+        self._verify_cache: Dict[Tuple[str, str], Tuple[dict, float]] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def invalidate(self, chat_id=None) -> None:
+        """清除單個群（或全部）的驗證群快取，例如 bot 被加入/移出群組時。"""
+        if chat_id is None:
+            self._verify_cache.clear()
+            return
+        for key in [k for k in self._verify_cache if k[1] == str(chat_id)]:
+            self._verify_cache.pop(key, None)
+
+    def cleanup(self) -> None:
+        now = time.time()
+        for key in [k for k, (_, exp) in self._verify_cache.items() if exp <= now]:
+            self._verify_cache.pop(key, None)
+
+    async def classify(self, chat_id, brand: str) -> ChatClassification:
+        chat_id = str(chat_id)
+        index = await self._socials.get_index()
+        info = await self._verify_info(chat_id, brand)
+        return ChatClassification(
+            chat_id,
+            is_social=index is not None and chat_id in index.social_groups,
+            is_verify_group=info["is_verify_group"],
+            welcome_template=info.get("welcome_template"),
+            referral_link=info.get("referral_link"),
+            lang=info.get("lang"),
+        )
+
+    async def _verify_info(self, chat_id: str, brand: str) -> dict:
+        key = (brand, chat_id)
+        item = self._verify_cache.get(key)
+        if item and item[1] > time.time():
+            return item[0]
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._fetch_verify_info(chat_id, brand))
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        info, ttl = await asyncio.shield(fut)
+        self._verify_cache[key] = (info, time.time() + ttl)
+        return info
+
+    async def _fetch_verify_info(self, chat_id: str, brand: str) -> Tuple[dict, float]:
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        payload = {"verifyGroup": chat_id, "brand": brand, "type": "TELEGRAM"}
+        negative = {"is_verify_group": False}
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(self._welcome_url, headers=headers, data=payload) as response:
+                    resp_json = await response.json()
+                    logger.info(f"查询验证群 {chat_id}，返回数据: {resp_json}")
+                    if response.status != 200:
+                        error_msg = resp_json.get("message", "Unknown error")
+                        logger.error(f"验证群接口返回失败 {resp_json}，状态码: {response.status}, 错误信息: {error_msg}")
+                        # 如果返回 500 且错误信息是 "Telegram social not found"，可能是配置问题，按非验证群缓存
+                        if response.status == 500 and "Telegram social not found" in str(error_msg):
+                            logger.warning(f"验证群 {chat_id} 可能未在后端配置，跳过欢迎消息处理")
+                            return negative, self._negative_ttl
+                        return negative, self._error_ttl
+        except Exception as e:
+            logger.error(f"调用验证群接口时出错: {e}, 群组ID: {chat_id}, 品牌: {brand}")
+            return negative, self._error_ttl
+
+        data_obj = resp_json.get("data")
+        if not data_obj:
+            logger.info(f"群组 {chat_id} 不是验证群")
+            return negative, self._negative_ttl
+        if isinstance(data_obj, dict):
+            # 兼容 data.msg / data.lang
+            welcome_message = data_obj.get("msg") or ""
+            lang = data_obj.get("lang") or resp_json.get("lang")
+        else:
+            # 字串格式
+            welcome_message = str(data_obj)
+            lang = resp_json.get("lang")
+        return {
+            "is_verify_group": True,
+            "welcome_template": sanitize_html_for_telegram(welcome_message),
+            "referral_link": extract_first_url(welcome_message),
+            "lang": str(lang) if lang else None,
+        }, self._ttl
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Tuple, Union
+
+from aiogram import Bot
+
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = ("administrator", "creator")
+
+
+class BotAdminCache:
+    """
+    Bot 在群內是否為管理員（能否建立邀請連結）的快取，按 (bot_id, chat_id)：
+    - 是管理員快取 ttl 秒，不是管理員快取 negative_ttl 秒；查詢出錯不快取
+    - 同一群同時只有一個 get_chat_member 請求（single-flight）
+    - my_chat_member 事件帶有新狀態，直接 set_status() 更新，不必等過期
+    """
+
+    def __init__(self, *, ttl: float = 600.0, negative_ttl: float = 60.0):
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        # {(bot_id, chat_id): (is_admin, expires_at)}
+        self._cache: Dict[Tuple[int, str], Tuple[bool, float]] = {}
+        self._inflight: Dict[Tuple[int, str], asyncio.Future] = {}
+
+    def set_status(self, bot_id: int, chat_id: Union[int, str], status: str) -> None:
+        is_admin = status in ADMIN_STATUSES
+        self._cache[(bot_id, str(chat_id))] = (is_admin, time.time() + (self._ttl if is_admin else self._negative_ttl))
+
+    def cleanup(self) -> None:
+        now = time.time()
+        for key in [k for k, (_, exp) in self._cache.items() if exp <= now]:
+            self._cache.pop(key, None)
+
+    async def is_admin(self, bot: Bot, chat_id: Union[int, str]) -> bool:
+        """查詢失敗時拋出異常（例如群組不存在、bot 不在群內）。"""
+        key = (bot.id, str(chat_id))
+        item = self._cache.get(key)
+        if item and item[1] > time.time():
+            return item[0]
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(bot.get_chat_member(int(chat_id), bot.id))
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        member = await asyncio.shield(fut)
+        logger.info(f"[bot_admin] Bot {bot.id} status in chat {chat_id}: {member.status}")
+        self.set_status(bot.id, chat_id, member.status)
+        return member.status in ADMIN_STATUSES
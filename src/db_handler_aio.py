@@ -1,30 +1,133 @@
 import os
 import asyncio
 import logging
-from sqlalchemy import Column, Integer, String, DateTime, select, Boolean, delete, update, func
+import time
+from sqlalchemy import Column, Integer, String, DateTime, select, Boolean, delete, update, func, text, Index, UniqueConstraint, bindparam
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from datetime import datetime, timezone, timedelta
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 from dotenv import load_dotenv
-from sqlalchemy.exc import IntegrityError
-
-MAX_OVERFLOW = 30
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from db_pool_monitor import InstrumentedPool, install_pool_hooks, pool_stats
+from verification_index import VerificationIndex
 
 load_dotenv()
+
+# 连接池配置（环境变量可覆盖）
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '30'))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '30'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+# 小于 MySQL wait_timeout，连接在被服务端断开前主动回收
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+# 取连接时先 ping，闲置被断开的连接会透明重连，而不是在业务查询时报错
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+pool_stats.slow_checkout_ms = float(os.getenv('DB_POOL_SLOW_CHECKOUT_MS', '500'))
+
 Base = declarative_base()
-database_url = os.getenv('DATABASE_URI_SWAP')
-engine = create_async_engine(
-    database_url,
-    echo=False,
-    future=True,
-    pool_size=30,
-    max_overflow=MAX_OVERFLOW
-)
-Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+_engine = None
+_session_factory = None
+
+def _is_sqlite(url) -> bool:
+    return str(url).startswith("sqlite")
+
+def configure_engine(url=None, **engine_kwargs):
+    """
+    建立（或替换）数据库引擎。url 默认取 DATABASE_URI_SWAP。
+    - MySQL：使用环境变量配置的连接池（InstrumentedPool + pre-ping + recycle）
+    - sqlite+aiosqlite：本地测试/压测用，文件库走同样的连接池指标，:memory: 使用单连接 StaticPool；
+      表结构用 init_schema() 按模型建立
+    engine_kwargs 覆盖默认参数。调用前应先 dispose_engine() 释放旧引擎。
+    """
+    global _engine, _session_factory
+    url = url or os.getenv('DATABASE_URI_SWAP')
+    if not url:
+        raise RuntimeError("DATABASE_URI_SWAP 未配置")
+    if _is_sqlite(url) and ":memory:" in str(url):
+        kwargs = dict(poolclass=StaticPool, connect_args={"check_same_thread": False})
+    elif _is_sqlite(url):
+        kwargs = dict(poolclass=InstrumentedPool, pool_size=5, max_overflow=0, pool_timeout=POOL_TIMEOUT)
+    else:
+        kwargs = dict(
+            poolclass=InstrumentedPool,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=POOL_PRE_PING,
+        )
+    kwargs.update(engine_kwargs)
+    _engine = create_async_engine(url, echo=False, future=True, **kwargs)
+    install_pool_hooks(_engine)
+    _session_factory = sessionmaker(bind=_engine, class_=AsyncSession, expire_on_commit=False)
+    return _engine
+
+def get_engine():
+    """返回数据库引擎，首次调用时才按 DATABASE_URI_SWAP 建立（导入本模块不需要数据库）。"""
+    if _engine is None:
+        configure_engine()
+    return _engine
+
+def Session() -> AsyncSession:
+    """新建 AsyncSession（用法同 sessionmaker：async with Session() as session）。"""
+    if _session_factory is None:
+        get_engine()
+    return _session_factory()
+
+async def dispose_engine() -> None:
+    """关闭连接池（进程退出或切换数据库时）。"""
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = None
+    _session_factory = None
+
+async def init_schema() -> None:
+    """按模型建立缺少的表和索引（sqlite 本地库首次使用；对已有的 MySQL 表不做修改）。"""
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+def _dialect_name() -> str:
+    return get_engine().dialect.name
+
+class MissingTableError(RuntimeError):
+    """表不存在（MySQL 未执行 schema_migrations.py apply），重试不会成功。"""
+
+def _is_missing_table(error: BaseException) -> bool:
+    # MySQL 1146 = ER_NO_SUCH_TABLE；sqlite 为 "no such table"
+    if isinstance(error, DBAPIError):
+        args = getattr(error.orig, "args", ())
+        if args and args[0] == 1146:
+            return True
+    return "no such table" in str(error)
+
+def _upsert(model, values, conflict_key, updates):
+    """
+    按方言生成单语句 upsert：MySQL 为 INSERT ... ON DUPLICATE KEY UPDATE，sqlite 为 ON CONFLICT DO UPDATE。
+    conflict_key 为唯一键列名（复合唯一键传列名列表）；
+    updates(new) 返回要更新的列，new 为待插入行（MySQL 的 VALUES() / sqlite 的 excluded）。
+    """
+    if _dialect_name() == "sqlite":
+        keys = [conflict_key] if isinstance(conflict_key, str) else list(conflict_key)
+        stmt = sqlite_insert(model).values(values)
+        return stmt.on_conflict_do_update(index_elements=keys, set_=updates(stmt.excluded))
+    stmt = mysql_insert(model).values(values)
+    return stmt.on_duplicate_key_update(**updates(stmt.inserted))
+
+# verified_users 的記憶體索引，由 warm_verification_index() 載入，add_verified_user 寫穿；
+# 停用/刪除由其他進程完成（經 /api/verification_index/invalidate 通知），未通知時記錄最多 VERIFY_INDEX_TTL 秒後失效
+verification_index = VerificationIndex(ttl=float(os.getenv("VERIFY_INDEX_TTL", "120")))
 
 class Group(Base):
     __tablename__ = 'groups'
+    __table_args__ = (
+        # get_active_groups
+        Index('ix_groups_is_active', 'is_active'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     chat_id = Column(String(50), unique=True, nullable=False)
@@ -54,6 +157,15 @@ class Group(Base):
 
 class VerifyUser(Base):
     __tablename__ = 'verified_users'
+    # 与查询条件对应的复合索引，已有数据库用 schema_migrations.py 补建
+    __table_args__ = (
+        # is_user_verified 全局 UID 检查；cleanup_duplicate_verify_codes 按 verify_code 分组
+        Index('ix_verified_users_code_active', 'verify_code', 'is_active'),
+        # is_user_verified 群组 UID 检查
+        Index('ix_verified_users_group_code_active', 'verify_group_id', 'verify_code', 'is_active'),
+        # get_verified_user / get_verified_user_ids
+        Index('ix_verified_users_user_info_active', 'user_id', 'info_group_id', 'is_active'),
+    )
 
     utc_plus_8 = timezone(timedelta(hours=8))
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -76,47 +188,146 @@ class VerifyUser(Base):
             'is_active': self.is_active,
         }
 
+class BotGroupMembership(Base):
+    """各 bot 所在的群组（多 bot 部署时判断哪个 bot 能发到哪个群）"""
+    __tablename__ = 'bot_group_memberships'
+    __table_args__ = (
+        UniqueConstraint('bot_id', 'chat_id', name='uq_bot_group_memberships_bot_chat'),
+        Index('ix_bot_group_memberships_chat', 'chat_id'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    bot_id = Column(String(50), nullable=False)
+    chat_id = Column(String(50), nullable=False)
+    is_member = Column(Boolean, default=True, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
 async def insert_or_update_group(chat_id, title, group_type, username=None, description=None, member_count=None):
-    """插入或更新群組資訊"""
+    """插入或更新群組資訊（單條 upsert，見 _upsert）"""
     utc_plus_8 = timezone(timedelta(hours=8))
+    now = datetime.now(utc_plus_8)
+    stmt = _upsert(
+        Group,
+        dict(
+            chat_id=str(chat_id),
+            title=title,
+            type=group_type,
+            username=username,
+            description=description,
+            member_count=member_count,
+            is_active=True,
+            join_date=now,
+        ),
+        'chat_id',
+        lambda new: dict(
+            title=new.title,
+            type=new.type,
+            username=new.username,
+            description=new.description,
+            member_count=new.member_count,
+            is_active=True,
+            join_date=new.join_date,
+            leave_date=None,
+        ),
+    )
     async with Session() as session:
         try:
             async with session.begin():
-                # 先檢查是否已存在相同 chat_id 的群組
-                existing_group = await session.execute(
-                    select(Group).where(Group.chat_id == str(chat_id))
-                )
-                existing_group = existing_group.scalar_one_or_none()
-
-                if existing_group:
-                    # 如果群組已存在，更新資訊
-                    existing_group.title = title
-                    existing_group.type = group_type
-                    existing_group.username = username
-                    existing_group.description = description
-                    existing_group.member_count = member_count
-                    existing_group.is_active = True
-                    existing_group.join_date = datetime.now(utc_plus_8)
-                    existing_group.leave_date = None
-                else:
-                    # 創建新的群組記錄
-                    new_group = Group(
-                        chat_id=str(chat_id),
-                        title=title,
-                        type=group_type,
-                        username=username,
-                        description=description,
-                        member_count=member_count
-                    )
-                    session.add(new_group)
-
-            await session.commit()
+                await session.execute(stmt)
             return True
         except Exception as e:
             logging.error(f"插入/更新群組時發生錯誤: {e}")
             await session.rollback()
             return False
 
+async def bulk_upsert_groups(groups, chunk_size: int = 500) -> int:
+    """
+    批量同步群組資訊：每批一條多值 upsert。
+    groups 為 dict 列表，必須包含 chat_id、type，可選 title / username / description / member_count；
+    未提供（None）的欄位保留資料庫中的原值。所有群組標記為活躍。
+    返回寫入的群組數，失敗返回 0。
+    """
+    utc_plus_8 = timezone(timedelta(hours=8))
+    now = datetime.now(utc_plus_8)
+    rows = [
+        {
+            "chat_id": str(g["chat_id"]),
+            "title": g.get("title"),
+            "type": g["type"],
+            "username": g.get("username"),
+            "description": g.get("description"),
+            "member_count": g.get("member_count"),
+            "is_active": True,
+            "join_date": now,
+        }
+        for g in groups
+    ]
+    if not rows:
+        return 0
+    async with Session() as session:
+        try:
+            async with session.begin():
+                for i in range(0, len(rows), chunk_size):
+                    stmt = _upsert(
+                        Group,
+                        rows[i:i + chunk_size],
+                        'chat_id',
+                        lambda new: dict(
+                            title=func.coalesce(new.title, Group.title),
+                            type=new.type,
+                            username=func.coalesce(new.username, Group.username),
+                            description=func.coalesce(new.description, Group.description),
+                            member_count=func.coalesce(new.member_count, Group.member_count),
+                            is_active=True,
+                            leave_date=None,
+                        ),
+                    )
+                    await session.execute(stmt)
+            return len(rows)
+        except Exception as e:
+            logging.error(f"批量同步群組時發生錯誤: {e}")
+            return 0
+
+async def bulk_update_group_metadata(groups, chunk_size: int = 500) -> int:
+    """
+    只更新已存在群組的標題/類型/用戶名/成員數（群組資訊背景刷新用），不新增群組，也不改 is_active / leave_date，
+    已停用的群組保持停用。groups 為 dict 列表，必須包含 chat_id，其餘欄位為 None 時保留原值。
+    返回提交的群組數，失敗返回 0。
+    """
+    rows = [
+        {
+            "b_chat_id": str(g["chat_id"]),
+            "b_title": g.get("title"),
+            "b_type": g.get("type"),
+            "b_username": g.get("username"),
+            "b_member_count": g.get("member_count"),
+        }
+        for g in groups
+    ]
+    if not rows:
+        return 0
+    table = Group.__table__
+    stmt = (
+        update(table)
+        .where(table.c.chat_id == bindparam("b_chat_id"))
+        .values(
+            title=func.coalesce(bindparam("b_title"), table.c.title),
+            type=func.coalesce(bindparam("b_type"), table.c.type),
+            username=func.coalesce(bindparam("b_username"), table.c.username),
+            member_count=func.coalesce(bindparam("b_member_count"), table.c.member_count),
+        )
+    )
+    async with Session() as session:
+        try:
+            async with session.begin():
+                for i in range(0, len(rows), chunk_size):
+                    # executemany：每批一次往返
+                    await session.execute(stmt, rows[i:i + chunk_size])
+            return len(rows)
+        except Exception as e:
+            logging.error(f"批量更新群組資訊時發生錯誤: {e}")
+            return 0
+
 async def deactivate_group(chat_id):
     """停用群組（當 Bot 被移除）"""
     utc_plus_8 = timezone(timedelta(hours=8))
@@ -152,45 +363,145 @@ async def get_active_groups():
             logging.error(f"獲取活躍群組時發生錯誤: {e}")
             return []
 
+async def iter_active_group_ids(page_size: int = 1000):
+    """按页流式读取活跃群组 ID（服务端游标），每次 yield 一页 chat_id 列表。"""
+    async with Session() as session:
+        stmt = select(Group.chat_id).where(Group.is_active == True).execution_options(yield_per=page_size)
+        result = await session.stream(stmt)
+        async for page in result.partitions(page_size):
+            yield [str(row[0]) for row in page]
+
+async def iter_bot_memberships(page_size: int = 1000):
+    """按页流式读取 bot 所在群组，每次 yield 一页 (bot_id, chat_id) 列表。"""
+    async with Session() as session:
+        stmt = (
+            select(BotGroupMembership.bot_id, BotGroupMembership.chat_id)
+            .where(BotGroupMembership.is_member == True)
+            .execution_options(yield_per=page_size)
+        )
+        result = await session.stream(stmt)
+        async for page in result.partitions(page_size):
+            yield [(int(row[0]), str(row[1])) for row in page]
+
+async def bulk_deactivate_groups(chat_ids, chunk_size: int = 500) -> bool:
+    """批量停用群组（deactivate_group 的批量版本）"""
+    chat_ids = [str(c) for c in chat_ids]
+    if not chat_ids:
+        return True
+    utc_plus_8 = timezone(timedelta(hours=8))
+    now = datetime.now(utc_plus_8)
+    async with Session() as session:
+        try:
+            async with session.begin():
+                for i in range(0, len(chat_ids), chunk_size):
+                    await session.execute(
+                        update(Group)
+                        .where(Group.chat_id.in_(chat_ids[i:i + chunk_size]))
+                        .values(is_active=False, leave_date=now)
+                    )
+            return True
+        except Exception as e:
+            logging.error(f"批量停用群組時發生錯誤: {e}")
+            return False
+
+async def bulk_upsert_bot_memberships(rows, chunk_size: int = 500) -> bool:
+    """批量写入 bot 所在群组，rows 为 (bot_id, chat_id, is_member) 列表；表不存在时抛出 MissingTableError"""
+    utc_plus_8 = timezone(timedelta(hours=8))
+    now = datetime.now(utc_plus_8)
+    values = [
+        {"bot_id": str(bot_id), "chat_id": str(chat_id), "is_member": bool(is_member), "updated_at": now}
+        for bot_id, chat_id, is_member in rows
+    ]
+    if not values:
+        return True
+    async with Session() as session:
+        try:
+            async with session.begin():
+                for i in range(0, len(values), chunk_size):
+                    stmt = _upsert(
+                        BotGroupMembership,
+                        values[i:i + chunk_size],
+                        ['bot_id', 'chat_id'],
+                        lambda new: dict(is_member=new.is_member, updated_at=new.updated_at),
+                    )
+                    await session.execute(stmt)
+            return True
+        except Exception as e:
+            if _is_missing_table(e):
+                raise MissingTableError(f"{BotGroupMembership.__tablename__} 表不存在") from e
+            logging.error(f"批量寫入 bot 群組關係時發生錯誤: {e}")
+            return False
+
 async def add_verified_user(user_id: str, verify_group_id: str, info_group_id: str, verify_code:int):
-    """将已验证用户添加到数据库中"""
+    """
+    将已验证用户添加到数据库中（单条 upsert，按 user_id 唯一键）。
+    返回 True 表示新用户插入，False 表示已存在并已更新。
+    """
     utc_plus_8 = timezone(timedelta(hours=8))
+    is_mysql = _dialect_name() == "mysql"
+
+    def _verified_at(new):
+        if not is_mysql:
+            return new.verified_at
+        # 驱动开启了 CLIENT_FOUND_ROWS，行未变化时影响行数也是 1，与插入无法区分；verified_at 只到秒，
+        # 同一秒内重复验证时顺延 1 秒，保证更新必定改动该行：影响行数 1 = 新插入，2 = 已存在并更新
+        return func.if_(
+            VerifyUser.verified_at == new.verified_at,
+            func.timestampadd(text("SECOND"), 1, VerifyUser.verified_at),
+            new.verified_at,
+        )
+
+    stmt = _upsert(
+        VerifyUser,
+        dict(
+            user_id=user_id,
+            verify_group_id=verify_group_id,
+            info_group_id=info_group_id,
+            verify_code=verify_code,
+            # 截到秒：与 DATETIME 列精度一致，避免 MySQL 对小数秒四舍五入后比较不等
+            verified_at=datetime.now(utc_plus_8).replace(microsecond=0),
+            is_active=True,
+        ),
+        'user_id',
+        lambda new: dict(
+            verify_group_id=new.verify_group_id,
+            info_group_id=new.info_group_id,
+            verify_code=new.verify_code,
+            verified_at=_verified_at(new),
+            is_active=True,
+        ),
+    )
     async with Session() as session:
         try:
             async with session.begin():
-                # 检查是否存在
-                stmt = select(VerifyUser).where(VerifyUser.user_id == user_id)
+                existed = None
+                if not is_mysql:
+                    # sqlite 的影响行数不区分插入/更新；写入本就串行，同一事务内先查一次
+                    existed = (await session.execute(
+                        select(VerifyUser.id).where(VerifyUser.user_id == user_id)
+                    )).first() is not None
                 result = await session.execute(stmt)
-                existing_user = result.scalar_one_or_none()
-
-                if existing_user:
-                    # 更新现有记录
-                    stmt_update = (
-                        update(VerifyUser)
-                        .where(VerifyUser.user_id == user_id)
-                        .values(
-                            verify_group_id=verify_group_id,
-                            info_group_id=info_group_id,
-                            verify_code=verify_code,
-                            verified_at=datetime.now(utc_plus_8),
-                            is_active=True
-                        )
-                    )
-                    await session.execute(stmt_update)
-                    return False  # 用户已存在
-                else:
-                    # 添加新用户
-                    new_user = VerifyUser(user_id=user_id, verify_group_id=verify_group_id, info_group_id=info_group_id, verify_code=verify_code, verified_at=datetime.now(utc_plus_8), is_active=True)
-                    session.add(new_user)
-                    return True  # 新用户插入成功
         except IntegrityError:
             await session.rollback()
             raise
+    is_new = result.rowcount == 1 if is_mysql else not existed
+    # 事务提交后再写穿索引，回滚的写入不会进入索引
+    verification_index.upsert(user_id, verify_group_id, info_group_id, verify_code)
+    return is_new
 
 async def is_user_verified(user_id: str, verify_group_id: str, verify_code: str) -> str:
-    """检查用户是否已验证，带重试机制处理数据库连接问题"""
-    max_retries = 3
-    retry_delay = 1  # 秒
+    """
+    检查用户是否已验证，带重试机制处理数据库连接问题。
+    索引命中（UID 有未过期的有效记录）直接返回，未命中才查库；其他进程停用的记录在收到失效通知或
+    VERIFY_INDEX_TTL 到期前仍按有效处理。
+    """
+    cached = verification_index.check_code(user_id, verify_code)
+    if cached is not None:
+        return cached
+
+    # 已开启 pool_pre_ping，闲置断开的连接在取出时就会被替换，这里只需应对查询中途断开
+    max_retries = 2
+    retry_delay = 0.5  # 秒
     
     for attempt in range(max_retries):
         try:
@@ -202,6 +513,11 @@ async def is_user_verified(user_id: str, verify_group_id: str, verify_code: str)
                 )
                 global_result = await session.execute(global_uid_stmt)
                 global_records = global_result.scalars().all()
+                # 以查库结果刷新该 UID 的索引：回填其他进程写入的记录，移除已停用/删除的记录
+                verification_index.sync_code(
+                    verify_code,
+                    [(r.user_id, r.verify_group_id, r.info_group_id) for r in global_records],
+                )
 
                 if global_records:
                     # 检查是否有其他用户使用了这个UID
@@ -232,58 +548,80 @@ async def is_user_verified(user_id: str, verify_group_id: str, verify_code: str)
                 # 如果没有匹配的记录，返回未验证
                 return "not_verified"
                 
-        except Exception as e:
-            logging.error(f"检查用户是否已验证时发生错误 (尝试 {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                logging.info(f"等待 {retry_delay} 秒后重试...")
-                await asyncio.sleep(retry_delay)
-                retry_delay *= 2  # 指数退避
-            else:
-                logging.error(f"所有重试尝试都失败了，返回错误状态")
+        except DBAPIError as e:
+            # 只有连接在查询中途被断开（已从池中作废）才值得重试，重试会拿到新连接；
+            # 其他数据库错误（包括取连接超时）重试只会加重负载，直接返回错误
+            if not e.connection_invalidated or attempt >= max_retries - 1:
+                logging.error(f"检查用户是否已验证时发生错误 (尝试 {attempt + 1}/{max_retries}): {e}")
                 return "error"
+            logging.warning(f"检查用户是否已验证时连接断开，{retry_delay} 秒后重试 (尝试 {attempt + 1}/{max_retries}): {e}")
+            await asyncio.sleep(retry_delay)
+        except Exception as e:
+            logging.error(f"检查用户是否已验证时发生错误: {e}")
+            return "error"
         
-async def cleanup_duplicate_verify_codes():
-    """清理重复的验证码记录，保留最新的记录"""
-    async with Session() as session:
-        try:
+# 每个 verify_code 只保留最新一条（verified_at 最新，相同时取 id 最大），删除本区间内其余记录。
+# 排名在包含本区间 verify_code 的全部记录上计算，区间边界两侧的重复也能正确处理。
+_RANKED_VERIFY_CODES_SQL = """
+    SELECT id, ROW_NUMBER() OVER (
+        PARTITION BY verify_code ORDER BY verified_at DESC, id DESC
+    ) AS rn
+    FROM verified_users
+    WHERE verify_code IN (
+        SELECT verify_code FROM verified_users WHERE id BETWEEN :lo AND :hi
+    )
+"""
+# MySQL 不允许在 DELETE 的 WHERE 子查询中引用目标表，改用 JOIN 派生表
+_DELETE_DUPLICATE_VERIFY_CODES_SQL = {
+    "mysql": text(f"""
+        DELETE v FROM verified_users AS v
+        JOIN ({_RANKED_VERIFY_CODES_SQL}) AS ranked ON ranked.id = v.id AND ranked.rn > 1
+        WHERE v.id BETWEEN :lo AND :hi
+    """),
+    "sqlite": text(f"""
+        DELETE FROM verified_users
+        WHERE id BETWEEN :lo AND :hi
+          AND id IN (SELECT id FROM ({_RANKED_VERIFY_CODES_SQL}) WHERE rn > 1)
+    """),
+}
+
+async def cleanup_duplicate_verify_codes(chunk_size: int = 50000):
+    """
+    清理重复的验证码记录，保留最新的记录。
+    以单条集合式 DELETE 完成，表很大时按主键区间分批（每批一个短事务）。
+    返回 (删除条数, 耗时秒数)。
+    """
+    started = time.monotonic()
+    cleaned_count = 0
+    try:
+        async with Session() as session:
             async with session.begin():
-                # 查找重复的verify_code
-                duplicate_stmt = (
-                    select(VerifyUser.verify_code)
-                    .group_by(VerifyUser.verify_code)
-                    .having(func.count(VerifyUser.verify_code) > 1)
-                )
-                duplicate_result = await session.execute(duplicate_stmt)
-                duplicate_codes = duplicate_result.scalars().all()
-                
-                cleaned_count = 0
-                for verify_code in duplicate_codes:
-                    # 对每个重复的verify_code，保留最新的记录，删除其他记录
-                    stmt = (
-                        select(VerifyUser)
-                        .where(VerifyUser.verify_code == verify_code)
-                        .order_by(VerifyUser.verified_at.desc())
+                result = await session.execute(select(func.min(VerifyUser.id), func.max(VerifyUser.id)))
+                min_id, max_id = result.one()
+            if min_id is None:
+                return 0, time.monotonic() - started
+            for lo in range(min_id, max_id + 1, chunk_size):
+                async with session.begin():
+                    result = await session.execute(
+                        _DELETE_DUPLICATE_VERIFY_CODES_SQL[_dialect_name()],
+                        {"lo": lo, "hi": lo + chunk_size - 1},
                     )
-                    result = await session.execute(stmt)
-                    records = result.scalars().all()
-                    
-                    # 保留第一条（最新的），删除其他
-                    if len(records) > 1:
-                        for record in records[1:]:
-                            await session.delete(record)
-                            cleaned_count += 1
-                
-                if cleaned_count > 0:
-                    logging.info(f"清理了 {cleaned_count} 条重复的验证码记录")
-                return cleaned_count
-        except Exception as e:
-            logging.error(f"清理重复验证码记录时发生错误: {e}")
-            return 0
+                    cleaned_count += result.rowcount or 0
+    except Exception as e:
+        logging.error(f"清理重复验证码记录时发生错误（已删除 {cleaned_count} 条）: {e}")
+    elapsed = time.monotonic() - started
+    if cleaned_count > 0:
+        logging.info(f"清理了 {cleaned_count} 条重复的验证码记录，耗时 {elapsed:.2f}s")
+        # 被删除的旧记录可能仍在索引中，重新载入
+        await warm_verification_index()
+    return cleaned_count, elapsed
 
 async def get_verified_user(user_id: str, info_group_id: str) -> bool:
     """
     检查用户是否已验证，并确认用户的 info_group_id 是否与当前群组 ID 匹配。
     """
+    if verification_index.is_verified_in(user_id, info_group_id):
+        return True
     async with Session() as session:
         try:
             stmt = select(VerifyUser).where(
@@ -293,7 +631,111 @@ async def get_verified_user(user_id: str, info_group_id: str) -> bool:
             )
             result = await session.execute(stmt)
             user = result.scalar_one_or_none()
+            if user is not None:
+                verification_index.upsert(user.user_id, user.verify_group_id, user.info_group_id, user.verify_code)
+            elif verification_index.info_group_of(user_id) == str(info_group_id):
+                # 索引记录已过期且库中已无有效记录（被停用或删除）
+                verification_index.remove(user_id)
             return user is not None  # 如果找到匹配记录，则返回 True，否则返回 False
         except Exception as e:
             logging.error(f"检查用户是否已验证时发生错误: {e}")
             return False
+
+async def get_verified_user_ids(user_ids, info_group_id: str, chunk_size: int = 500) -> set:
+    """
+    get_verified_user 的批量版本：一次查詢一批用户，返回其中已验证且 info_group_id 匹配的 user_id 集合。
+    """
+    verified = set()
+    missing = []
+    for uid in user_ids:
+        uid = str(uid)
+        # 索引命中的直接算通过，只查未命中的部分
+        if verification_index.is_verified_in(uid, info_group_id):
+            verified.add(uid)
+        else:
+            missing.append(uid)
+    if not missing:
+        return verified
+    async with Session() as session:
+        try:
+            for i in range(0, len(missing), chunk_size):
+                stmt = select(VerifyUser).where(
+                    VerifyUser.user_id.in_(missing[i:i + chunk_size]),
+                    VerifyUser.info_group_id == str(info_group_id),
+                    VerifyUser.is_active == True
+                )
+                result = await session.execute(stmt)
+                for user in result.scalars().all():
+                    verification_index.upsert(user.user_id, user.verify_group_id, user.info_group_id, user.verify_code)
+                    verified.add(user.user_id)
+            for uid in missing:
+                if uid not in verified and verification_index.info_group_of(uid) == str(info_group_id):
+                    verification_index.remove(uid)
+        except Exception as e:
+            logging.error(f"批量检查用户是否已验证时发生错误: {e}")
+    return verified
+
+async def warm_verification_index(page_size: int = 5000) -> int:
+    """
+    全量载入 verified_users（is_active）到 verification_index，按 id 分页避免一次拉取过大。
+    返回载入的记录数；失败时保留原索引。
+    """
+    verification_index.begin_warm()
+    rows = []
+    last_id = 0
+    try:
+        async with Session() as session:
+            while True:
+                stmt = (
+                    select(VerifyUser.id, VerifyUser.user_id, VerifyUser.verify_group_id,
+                           VerifyUser.info_group_id, VerifyUser.verify_code)
+                    .where(VerifyUser.id > last_id, VerifyUser.is_active == True)
+                    .order_by(VerifyUser.id)
+                    .limit(page_size)
+                )
+                result = await session.execute(stmt)
+                page = result.all()
+                if not page:
+                    break
+                rows.extend((r.user_id, r.verify_group_id, r.info_group_id, r.verify_code) for r in page)
+                last_id = page[-1].id
+    except Exception as e:
+        verification_index.abort_warm()
+        logging.error(f"载入验证用户索引时发生错误: {e}")
+        return 0
+    verification_index.finish_warm(rows)
+    logging.info(f"验证用户索引已载入 {len(rows)} 条记录")
+    return len(rows)
+
+async def ping_database() -> float:
+    """执行 SELECT 1，返回往返耗时（毫秒）；失败时抛出异常。"""
+    started = time.perf_counter()
+    async with get_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    return (time.perf_counter() - started) * 1000
+
+def pool_status() -> dict:
+    """连接池当前状态与累计指标（/api/health/db）；config 取自当前引擎的连接池实际配置。"""
+    db_engine = get_engine()
+    pool = db_engine.pool
+    config = {
+        "pool_class": type(pool).__name__,
+        "pool_recycle": pool._recycle,
+        "pool_pre_ping": pool._pre_ping,
+    }
+    # StaticPool（sqlite :memory:）没有容量概念
+    if isinstance(pool, QueuePool):
+        config.update(pool_size=pool.size(), max_overflow=pool._max_overflow, pool_timeout=pool._timeout)
+    status = {
+        "dialect": db_engine.dialect.name,
+        "config": config,
+        "stats": pool_stats.snapshot(),
+    }
+    if isinstance(pool, QueuePool):
+        status["pool"] = {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+    return status
@@ -0,0 +1,159 @@
+import contextvars
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """
+    連接池運行指標：取連接等待時間、使用中連接數、建立/失效連接數與連接錯誤。
+    checkout_timeouts 只計等待空閒連接超過 pool_timeout；取連接時新建連接失敗計入 connect_errors。
+    由 InstrumentedPool 與 install_pool_hooks() 掛上的事件更新，供 /api/health/db 查詢。
+    """
+
+    def __init__(self, window: int = 1000, slow_checkout_ms: float = 500.0):
+        self.slow_checkout_ms = slow_checkout_ms
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.connect_errors = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.disconnect_errors = 0
+        self.errors = 0
+        self.queries = 0
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+        # 最近 window 次取連接的等待時間，用於估算 p95
+        self._recent_waits: Deque[float] = deque(maxlen=window)
+
+    def record_wait(self, wait_ms: float) -> None:
+        self._wait_total_ms += wait_ms
+        self._wait_max_ms = max(self._wait_max_ms, wait_ms)
+        self._recent_waits.append(wait_ms)
+        if wait_ms >= self.slow_checkout_ms:
+            logger.warning(f"[db_pool] 取得連接等待 {wait_ms:.0f}ms，連接池可能不足（使用中 {self.in_use}）")
+
+    def record_error(self, error: BaseException, *, is_disconnect: bool) -> None:
+        self.errors += 1
+        if is_disconnect:
+            self.disconnect_errors += 1
+        self.last_error = f"{type(error).__name__}: {error}"[:300]
+        self.last_error_at = time.time()
+
+    def snapshot(self) -> dict:
+        waits = sorted(self._recent_waits)
+        p95 = waits[int(len(waits) * 0.95) - 1] if waits else 0.0
+        return {
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "connect_errors": self.connect_errors,
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "queries": self.queries,
+            "errors": self.errors,
+            "disconnect_errors": self.disconnect_errors,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+            "wait_ms": {
+                "avg": round(self._wait_total_ms / self.checkouts, 2) if self.checkouts else 0.0,
+                "p95_recent": round(p95, 2),
+                "max": round(self._wait_max_ms, 2),
+            },
+        }
+
+
+pool_stats = PoolStats()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+
+_query_counter: contextvars.ContextVar[Optional[QueryCounter]] = contextvars.ContextVar("query_counter", default=None)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """
+    統計區塊內（當前 task）發出的 SQL 語句數，用於檢查單個操作的查詢次數：
+        with count_queries() as counter:
+            await get_verified_user(...)
+        counter.count
+    """
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """記錄每次從池中取連接所花的時間（含等待空閒連接與新建連接）。"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            # 等待超過 pool_timeout
+            pool_stats.checkout_timeouts += 1
+            raise
+        except Exception:
+            # 建立連接失敗（資料庫不可達、認證失敗等）
+            pool_stats.connect_errors += 1
+            raise
+        pool_stats.record_wait((time.perf_counter() - started) * 1000)
+        return conn
+
+
+def install_pool_hooks(engine) -> None:
+    """在 AsyncEngine 上掛載連接池/連接錯誤事件，更新 pool_stats。"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        pool_stats.connects += 1
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        pool_stats.checkouts += 1
+        pool_stats.in_use += 1
+        pool_stats.peak_in_use = max(pool_stats.peak_in_use, pool_stats.in_use)
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        pool_stats.in_use = max(0, pool_stats.in_use - 1)
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _on_invalidate(dbapi_conn, record, exception):
+        pool_stats.invalidations += 1
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        pool_stats.queries += 1
+        counter = _query_counter.get()
+        if counter is not None:
+            counter.count += 1
+            counter.statements.append(statement)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _on_error(context):
+        pool_stats.record_error(context.original_exception, is_disconnect=context.is_disconnect)
@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+
+from rate_limiter import call_with_limit, get_rate_limiter
+
+
+logger = logging.getLogger(__name__)
+
+# (due_ts, seq, bot_id, chat_id, message_id, first_due_ts)；重試時 due_ts 後移，first_due_ts 保持原到期時間
+_Item = Tuple[float, int, int, int, int, float]
+
+# Telegram deleteMessages 單次最多 100 條
+MAX_DELETE_BATCH = 100
+
+
+class DeletionScheduler:
+    """
+    定時刪除消息（取代每條消息一個 sleep 任務）：
+    - 所有待刪除消息放在一個按到期時間排序的堆裡，由 run() 一個計時循環處理
+    - 到期的消息按 (bot, chat) 合併，用 delete_messages 批量刪除，經 rate_limiter 限速
+    - 設定 store_path 時佇列會持久化（先寫臨時檔再 rename），重啟後 load() 恢復；
+      超過 max_overdue 秒的消息 Telegram 已不允許刪除，載入時丟棄
+    bot_resolver 用於找回重啟後恢復的消息所屬的 Bot；暫時找不到（如代理 bot 尚未啟動）時每 retry_delay 秒重試，
+    距原到期時間超過 max_overdue 後放棄。
+    """
+
+    def __init__(self, bot_resolver: Callable[[int], Optional[Bot]], *, store_path: Optional[str] = None,
+                 persist_interval: float = 5.0, max_overdue: float = 47 * 3600, retry_delay: float = 30.0):
+        self._bot_resolver = bot_resolver
+        self._store_path = os.path.abspath(store_path) if store_path else None
+        self._persist_interval = persist_interval
+        self._max_overdue = max_overdue
+        self._retry_delay = retry_delay
+        self._heap: List[_Item] = []
+        self._seq = itertools.count()
+        self._bots: Dict[int, Bot] = {}
+        self._dirty = False
+        self._last_persist = 0.0
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    # -------------------- 排程 --------------------
+    def schedule(self, bot: Bot, chat_id: int, message_id: int, delay: float) -> None:
+        """delay 秒後刪除消息；只改記憶體，不需要 await。"""
+        self._bots[bot.id] = bot
+        self._push(time.time() + max(0.0, float(delay)), bot.id, int(chat_id), int(message_id))
+
+    def _push(self, due: float, bot_id: int, chat_id: int, message_id: int, first_due: Optional[float] = None) -> None:
+        item = (due, next(self._seq), bot_id, chat_id, message_id, due if first_due is None else first_due)
+        heapq.heappush(self._heap, item)
+        # 新消息最早到期，或需要安排持久化時喚醒計時循環
+        if self._heap[0] is item or (self._store_path and not self._dirty):
+            self._wakeup.set()
+        self._dirty = True
+
+    def _resolve(self, bot_id: int) -> Optional[Bot]:
+        bot = self._bots.get(bot_id)
+        if bot is None:
+            bot = self._bot_resolver(bot_id)
+            if bot is not None:
+                self._bots[bot_id] = bot
+        return bot
+
+    # -------------------- 刪除 --------------------
+    async def _delete_due(self) -> int:
+        now = time.time()
+        batches: Dict[Tuple[int, int], List[int]] = {}
+        retry: List[_Item] = []
+        while self._heap and self._heap[0][0] <= now:
+            item = heapq.heappop(self._heap)
+            _, _, bot_id, chat_id, message_id, first_due = item
+            if now - first_due >= self._max_overdue:
+                logger.warning(f"[deletion] 消息 {chat_id}/{message_id} 已超過可刪除時限，放棄刪除")
+                self._dirty = True
+                continue
+            if self._resolve(bot_id) is None:
+                retry.append(item)
+                continue
+            batches.setdefault((bot_id, chat_id), []).append(message_id)
+        for _, _, bot_id, chat_id, message_id, first_due in retry:
+            heapq.heappush(self._heap, (now + self._retry_delay, next(self._seq), bot_id, chat_id, message_id, first_due))
+        if not batches and not retry:
+            return 0
+        self._dirty = True
+        await asyncio.gather(*(self._delete_batch(key, ids) for key, ids in batches.items()))
+        return sum(len(ids) for ids in batches.values())
+
+    async def _delete_batch(self, key: Tuple[int, int], message_ids: List[int]) -> None:
+        bot_id, chat_id = key
+        bot = self._bots[bot_id]
+        limiter = get_rate_limiter(bot_id)
+        for i in range(0, len(message_ids), MAX_DELETE_BATCH):
+            chunk = message_ids[i:i + MAX_DELETE_BATCH]
+            try:
+                await call_with_limit(limiter, chat_id, lambda: bot.delete_messages(chat_id=chat_id, message_ids=chunk))
+                logger.info(f"消息已成功删除，Chat ID: {chat_id}, Message IDs: {chunk}")
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"删除消息时发生错误: {e}，Chat ID: {chat_id}, Message IDs: {chunk}")
+
+    # -------------------- 持久化 --------------------
+    def load(self) -> int:
+        """從 store_path 恢復待刪除消息（過期太久的丟棄），返回恢復的條數。"""
+        if not self._store_path or not os.path.exists(self._store_path):
+            return 0
+        try:
+            with open(self._store_path, "r", encoding="utf-8") as f:
+                entries = json.load(f) or []
+        except Exception as e:
+            logger.error(f"load deletion queue failed: {e}")
+            return 0
+        now = time.time()
+        restored = 0
+        for entry in entries:
+            try:
+                due = float(entry["due"])
+                first_due = float(entry.get("first_due", due))
+                if now - first_due >= self._max_overdue:
+                    continue
+                self._push(due, int(entry["bot_id"]), int(entry["chat_id"]), int(entry["message_id"]), first_due)
+                restored += 1
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"skip malformed deletion entry: {entry!r}")
+        logger.info(f"從 {self._store_path} 恢復了 {restored} 條待刪除消息")
+        return restored
+
+    def _write_snapshot(self, entries: List[dict]) -> None:
+        os.makedirs(os.path.dirname(self._store_path), exist_ok=True)
+        tmp_path = f"{self._store_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._store_path)
+
+    async def flush(self) -> None:
+        """把目前的佇列寫入 store_path（未設定時不做任何事）。"""
+        if not self._store_path or not self._dirty:
+            return
+        entries = [
+            {"due": due, "first_due": first_due, "bot_id": bot_id, "chat_id": chat_id, "message_id": message_id}
+            for due, _, bot_id, chat_id, message_id, first_due in sorted(self._heap)
+        ]
+        self._dirty = False
+        try:
+            await asyncio.to_thread(self._write_snapshot, entries)
+            self._last_persist = time.time()
+        except Exception as e:
+            # 寫入失敗時保留 dirty，下一輪重試
+            self._dirty = True
+            logger.error(f"save deletion queue failed: {e}")
+
+    def _next_timeout(self) -> Optional[float]:
+        now = time.time()
+        timeouts = []
+        if self._heap:
+            timeouts.append(self._heap[0][0] - now)
+        if self._store_path and self._dirty:
+            timeouts.append(self._last_persist + self._persist_interval - now)
+        return max(0.0, min(timeouts)) if timeouts else None
+
+    async def run(self) -> None:
+        """計時循環：睡到最早的消息到期（或有更早的新消息）時批量刪除，並按 persist_interval 寫出佇列。"""
+        try:
+            while True:
+                # 不用 wait_for：事件已觸發時它可能吞掉取消信號
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=self._next_timeout())
+                finally:
+                    waiter.cancel()
+                self._wakeup.clear()
+                await self._delete_due()
+                if time.time() - self._last_persist >= self._persist_interval:
+                    await self.flush()
+        except asyncio.CancelledError:
+            # 退出前寫出佇列，重啟後繼續刪除
+            try:
+                await self.flush()
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"final deletion queue flush failed: {e}")
+            raise
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+
+logger = logging.getLogger(__name__)
+
+# (brand, botUsername, verifyGroup)；沒有 verifyGroup 時為空字串
+DetailKey = Tuple[str, str, str]
+
+
+class DetailCache:
+    """
+    DETAIL_API_BY_BOT 結果快取（verifyGroup / socialGroup / lang），按 (brand, botUsername, verifyGroup)：
+    - data 為物件時快取 ttl 秒；data 不是物件（如後端返回錯誤文字）快取 negative_ttl 秒
+    - 請求失敗（網路錯誤、非 JSON）不快取，異常拋給呼叫方
+    - 同一 key 同時只有一個請求（single-flight）
+    - 後台修改配置或 bot 進出群組時用 invalidate() 清除
+    返回值為接口原始 JSON，呼叫方只讀不改。
+    """
+
+    def __init__(self, url: Optional[str], *, ttl: float = 600.0, negative_ttl: float = 60.0):
+        self._url = url
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        # {key: (detail, expires_at)}
+        self._cache: Dict[DetailKey, Tuple[dict, float]] = {}
+        self._inflight: Dict[DetailKey, asyncio.Future] = {}
+
+    def invalidate(self, brand: Optional[str] = None, bot_username: Optional[str] = None) -> int:
+        """清除符合條件的快取（都不傳時清除全部），返回清除的條數。"""
+        keys = [
+            k for k in self._cache
+            if (brand is None or k[0] == brand) and (bot_username is None or k[1] == bot_username)
+        ]
+        for key in keys:
+            self._cache.pop(key, None)
+        return len(keys)
+
+    def cleanup(self) -> None:
+        now = time.time()
+        for key in [k for k, (_, exp) in self._cache.items() if exp <= now]:
+            self._cache.pop(key, None)
+
+    def peek(self, brand: str, bot_username: str, verify_group: Optional[str] = None) -> Optional[dict]:
+        """只讀快取，不發請求；沒有或已過期時返回 None。"""
+        item = self._cache.get((brand, bot_username, str(verify_group or "")))
+        if item and item[1] > time.time():
+            return item[0]
+        return None
+
+    async def get(self, brand: str, bot_username: str, verify_group: Optional[str] = None) -> dict:
+        key = (brand, bot_username, str(verify_group or ""))
+        item = self._cache.get(key)
+        if item and item[1] > time.time():
+            return item[0]
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._fetch(key))
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        return await asyncio.shield(fut)
+
+    async def _fetch(self, key: DetailKey) -> dict:
+        brand, bot_username, verify_group = key
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        payload = {
+            "brand": brand,
+            "type": "TELEGRAM",
+            "botUsername": bot_username,
+        }
+        if verify_group:
+            payload["verifyGroup"] = verify_group
+        async with aiohttp.ClientSession() as session:
+            async with session.post(self._url, headers=headers, data=payload) as response:
+                detail = await response.json()
+        logger.info(f"[detail_cache] DETAIL_API_BY_BOT {payload} -> {detail}")
+        ttl = self._ttl if isinstance(detail.get("data"), dict) else self._negative_ttl
+        self._cache[key] = (detail, time.time() + ttl)
+        return detail
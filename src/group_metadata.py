@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+from aiogram import Bot
+
+from rate_limiter import call_with_limit, get_rate_limiter
+
+
+logger = logging.getLogger(__name__)
+
+ChatId = Union[int, str]
+
+
+class GroupMetadata:
+    """群組的標題/類型/用戶名與成員數，fetched_at 為從 Telegram 取得的時間。"""
+
+    __slots__ = ("chat_id", "title", "type", "username", "member_count", "fetched_at")
+
+    def __init__(self, chat_id: int, *, title: Optional[str], type: Optional[str],
+                 username: Optional[str], member_count: Optional[int], fetched_at: float):
+        self.chat_id = chat_id
+        self.title = title
+        self.type = type
+        self.username = username
+        self.member_count = member_count
+        self.fetched_at = fetched_at
+
+    def to_dict(self) -> dict:
+        return {
+            "chat_id": self.chat_id,
+            "title": self.title,
+            "type": self.type,
+            "username": self.username,
+            "member_count": self.member_count,
+            "fetched_at": self.fetched_at,
+        }
+
+
+class GroupMetadataCache:
+    """
+    群組資訊快取（/api/get_member_count 等查詢用）：
+    - ttl 內直接返回記憶體中的結果；過期但未超過 max_age 時先返回舊值，背景刷新
+    - 沒有快取時同一群同時只有一個請求在拉取（single-flight），並發數受 concurrency 限制
+    - run() 週期性刷新所有活躍群組，並通過 persist（如 bulk_update_group_metadata）寫回 groups 表
+    - bot_resolver(chat_id) 選擇在該群內的 bot 發請求（主 bot 不在群內時用代理 bot），找不到時用 bot；
+      請求經該 bot 的 rate_limiter 限速
+    """
+
+    def __init__(self, bot: Bot, *, ttl: float = 300.0, max_age: float = 3600.0,
+                 refresh_interval: float = 600.0, concurrency: int = 5,
+                 persist: Optional[Callable[[List[dict]], Awaitable[int]]] = None,
+                 bot_resolver: Optional[Callable[[int], Optional[Bot]]] = None):
+        self._bot = bot
+        self._bot_resolver = bot_resolver
+        self._ttl = ttl
+        self._max_age = max_age
+        self._refresh_interval = refresh_interval
+        self._sem = asyncio.Semaphore(concurrency)
+        self._persist = persist
+        self._entries: Dict[int, GroupMetadata] = {}
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+    def invalidate(self, chat_id: ChatId) -> None:
+        self._entries.pop(int(chat_id), None)
+
+    def cleanup(self) -> None:
+        """移除超過 max_age 未刷新的群組（例如 bot 已離開、不再被查詢）。"""
+        now = time.time()
+        for chat_id in [k for k, v in self._entries.items() if now - v.fetched_at > self._max_age]:
+            self._entries.pop(chat_id, None)
+
+    async def get(self, chat_id: ChatId, *, force: bool = False) -> GroupMetadata:
+        """返回群組資訊；沒有可用快取且拉取失敗時拋出異常。"""
+        chat_id = int(chat_id)
+        entry = self._entries.get(chat_id)
+        if entry is not None and not force:
+            age = time.time() - entry.fetched_at
+            if age < self._ttl:
+                return entry
+            if age < self._max_age:
+                # 先返回舊值，背景刷新
+                self._refresh(chat_id)
+                return entry
+        return await asyncio.shield(self._refresh(chat_id))
+
+    async def get_many(self, chat_ids: Iterable[ChatId]) -> Dict[int, Union[GroupMetadata, Exception]]:
+        """批量查詢，單個群組失敗時對應值為異常，不影響其他群組。"""
+        ids = list(dict.fromkeys(int(c) for c in chat_ids))
+        results = await asyncio.gather(*(self.get(c) for c in ids), return_exceptions=True)
+        return dict(zip(ids, results))
+
+    def _refresh(self, chat_id: int) -> asyncio.Future:
+        fut = self._inflight.get(chat_id)
+        if fut is None:
+            fut = asyncio.ensure_future(self._fetch(chat_id))
+            self._inflight[chat_id] = fut
+            fut.add_done_callback(lambda f: self._on_fetched(chat_id, f))
+        return fut
+
+    def _on_fetched(self, chat_id: int, fut: asyncio.Future) -> None:
+        self._inflight.pop(chat_id, None)
+        if fut.cancelled():
+            return
+        exc = fut.exception()
+        if exc is not None:
+            logger.warning(f"[group_metadata] 獲取群組 {chat_id} 資訊失敗: {exc}")
+
+    async def _fetch(self, chat_id: int) -> GroupMetadata:
+        bot = (self._bot_resolver(chat_id) if self._bot_resolver else None) or self._bot
+        limiter = get_rate_limiter(bot.id)
+        async with self._sem:
+            chat, member_count = await asyncio.gather(
+                call_with_limit(limiter, chat_id, lambda: bot.get_chat(chat_id)),
+                call_with_limit(limiter, chat_id, lambda: bot.get_chat_member_count(chat_id)),
+            )
+        entry = GroupMetadata(
+            chat_id,
+            title=chat.title,
+            type=chat.type,
+            username=chat.username,
+            member_count=member_count,
+            fetched_at=time.time(),
+        )
+        self._entries[chat_id] = entry
+        return entry
+
+    async def refresh_all(self, chat_ids: Iterable[ChatId]) -> int:
+        """刷新指定群組並寫回數據庫，返回成功刷新的群組數。"""
+        ids = list(dict.fromkeys(int(c) for c in chat_ids))
+        results = await asyncio.gather(*(self.get(c, force=True) for c in ids), return_exceptions=True)
+        rows = [
+            {
+                "chat_id": meta.chat_id,
+                "title": meta.title,
+                "type": meta.type,
+                "username": meta.username,
+                "member_count": meta.member_count,
+            }
+            for meta in results if isinstance(meta, GroupMetadata)
+        ]
+        if rows and self._persist is not None:
+            await self._persist(rows)
+        return len(rows)
+
+    async def run(self, chat_ids_provider: Callable[[], Iterable[ChatId]]) -> None:
+        """背景刷新：每 refresh_interval 秒刷新一次 chat_ids_provider() 返回的群組。"""
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    chat_ids = list(chat_ids_provider())
+                    refreshed = await self.refresh_all(chat_ids)
+                    logger.info(
+                        f"[group_metadata] 已刷新 {refreshed}/{len(chat_ids)} 個群組資訊，"
+                        f"耗時 {time.monotonic() - started:.1f}s"
+                    )
+                except Exception as e:  # noqa: BLE001
+                    logger.error(f"[group_metadata] 刷新群組資訊失敗: {e}")
+                await asyncio.sleep(self._refresh_interval)
+        except asyncio.CancelledError:
+            logger.info("群组资讯刷新任务被取消，正在退出...")
+            raise
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+import db_handler_aio as db
+
+
+logger = logging.getLogger(__name__)
+
+
+class GroupRegistry:
+    """
+    Bot 所在群組的記憶體註冊表（取代每次全量重載的 group_chat_ids）：
+    - 啟動時按頁流式載入活躍群組與各 bot 的群組關係
+    - my_chat_member 事件只改記憶體，DB 寫入排入佇列，由 run() 在短暫延遲後批量寫出
+    - 記錄每個 bot 所在的群組：某個 bot 離開時，只有沒有其他 bot 留在群內才停用該群
+    """
+
+    def __init__(self, *, page_size: int = 1000, flush_delay: float = 2.0, flush_interval: float = 60.0):
+        self._page_size = page_size
+        self._flush_delay = flush_delay
+        self._flush_interval = flush_interval
+        self._active: Set[str] = set()
+        self._by_bot: Dict[int, Set[str]] = {}
+        self._by_chat: Dict[str, Set[int]] = {}
+        # 待寫入：chat_id -> 群組 upsert 行（None 表示停用）；(bot_id, chat_id) -> 是否在群內
+        self._pending_groups: Dict[str, Optional[dict]] = {}
+        self._pending_members: Dict[Tuple[int, str], bool] = {}
+        # bot_group_memberships 表不存在時不再寫入（關係仍保存在記憶體中）
+        self._members_table_missing = False
+        self._wakeup = asyncio.Event()
+
+    # -------------------- 查詢 --------------------
+    def __contains__(self, chat_id) -> bool:
+        return str(chat_id) in self._active
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._active))
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    def bots_for(self, chat_id) -> Set[int]:
+        """已知在此群內的 bot id（不詢問 Telegram）。"""
+        return set(self._by_chat.get(str(chat_id), ()))
+
+    def chats_for(self, bot_id: int) -> Set[str]:
+        return set(self._by_bot.get(bot_id, ()))
+
+    # -------------------- 載入 --------------------
+    async def load(self) -> int:
+        """從數據庫按頁載入；失敗時保留已載入的部分。返回活躍群組數。"""
+        started = time.monotonic()
+        try:
+            async for page in db.iter_active_group_ids(self._page_size):
+                self._active.update(page)
+        except Exception as e:
+            logger.error(f"加载活跃群组失败: {e}")
+        try:
+            async for page in db.iter_bot_memberships(self._page_size):
+                for bot_id, chat_id in page:
+                    self._add_member(bot_id, chat_id)
+        except Exception as e:
+            logger.error(f"加载 bot 群组关系失败: {e}")
+        logger.info(
+            f"从数据库加载了{len(self._active)}个活跃群组、{sum(len(v) for v in self._by_bot.values())} 条 bot 群组关系，"
+            f"耗时 {time.monotonic() - started:.2f}s"
+        )
+        return len(self._active)
+
+    # -------------------- 變更 --------------------
+    def joined(self, bot_id: int, chat_id, *, title: Optional[str], group_type: str,
+               username: Optional[str] = None) -> None:
+        chat_id = str(chat_id)
+        self._active.add(chat_id)
+        self._add_member(bot_id, chat_id)
+        self._pending_groups[chat_id] = {
+            "chat_id": chat_id,
+            "title": title,
+            "type": group_type,
+            "username": username,
+        }
+        self._pending_members[(bot_id, chat_id)] = True
+        self._wakeup.set()
+
+    def left(self, bot_id: int, chat_id) -> bool:
+        """bot 離開群組；返回 True 表示已沒有已知的 bot 在群內，群組被停用。"""
+        chat_id = str(chat_id)
+        members = self._by_chat.get(chat_id)
+        if members is not None:
+            members.discard(bot_id)
+            if not members:
+                self._by_chat.pop(chat_id, None)
+        bot_chats = self._by_bot.get(bot_id)
+        if bot_chats is not None:
+            bot_chats.discard(chat_id)
+        self._pending_members[(bot_id, chat_id)] = False
+        deactivated = chat_id not in self._by_chat
+        if deactivated:
+            self._active.discard(chat_id)
+            self._pending_groups[chat_id] = None
+        self._wakeup.set()
+        return deactivated
+
+    def _add_member(self, bot_id: int, chat_id: str) -> None:
+        self._by_bot.setdefault(bot_id, set()).add(chat_id)
+        self._by_chat.setdefault(chat_id, set()).add(bot_id)
+
+    # -------------------- 背景寫入 --------------------
+    async def flush(self) -> None:
+        """批量寫出佇列中的變更；失敗的部分放回佇列（不覆蓋之後的新變更），下一輪重試。"""
+        groups, self._pending_groups = self._pending_groups, {}
+        members, self._pending_members = self._pending_members, {}
+
+        upserts = [row for row in groups.values() if row is not None]
+        deactivations = [chat_id for chat_id, row in groups.items() if row is None]
+        ok_upsert = not upserts or await db.bulk_upsert_groups(upserts) == len(upserts)
+        ok_deactivate = await db.bulk_deactivate_groups(deactivations)
+        ok_members = True
+        if not self._members_table_missing:
+            try:
+                ok_members = await db.bulk_upsert_bot_memberships(
+                    [(bot_id, chat_id, is_member) for (bot_id, chat_id), is_member in members.items()]
+                )
+            except db.MissingTableError as e:
+                # 永久性錯誤：丟棄而不是放回佇列無限重試
+                self._members_table_missing = True
+                logger.error(
+                    f"[group_registry] {e}，停止寫入 bot 群組關係；請在 src 目錄執行 python schema_migrations.py apply 後重啟"
+                )
+
+        for chat_id, row in groups.items():
+            if (ok_deactivate if row is None else ok_upsert):
+                continue
+            self._pending_groups.setdefault(chat_id, row)
+        if not ok_members:
+            for key, is_member in members.items():
+                self._pending_members.setdefault(key, is_member)
+        if groups or members:
+            logger.info(
+                f"[group_registry] 写入 {len(upserts)} 个群组更新、{len(deactivations)} 个停用、"
+                f"{len(members)} 条 bot 群组关系"
+                + ("" if ok_upsert and ok_deactivate and ok_members else "（部分失败，稍后重试）")
+            )
+
+    async def run(self) -> None:
+        """背景寫入任務：有變更時等待 flush_delay 秒把同一批事件合併寫出；失敗的變更每 flush_interval 秒重試。"""
+        try:
+            while True:
+                # 不用 wait_for：事件已觸發時它可能吞掉取消信號
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=self._flush_interval)
+                finally:
+                    waiter.cancel()
+                self._wakeup.clear()
+                await asyncio.sleep(self._flush_delay)
+                if self._pending_groups or self._pending_members:
+                    await self.flush()
+        except asyncio.CancelledError:
+            # 退出前盡量寫出剩餘變更
+            try:
+                await self.flush()
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"final group registry flush failed: {e}")
+            raise
@@ -7,6 +7,7 @@ from aiohttp import web
 from dotenv import load_dotenv
 from aiogram.types import FSInputFile
 from multilingual_utils import apply_rtl_if_needed
+from socials_snapshot import socials_snapshot
 import aiofiles
 import tempfile
 from PIL import Image, ImageDraw, ImageFont
@@ -111,41 +112,30 @@ async def get_push_targets(trader_uid: str, signal_type: str = "copy") -> list:
         list: [(chat_id, topic_id, jump, lang), ...] 其中 lang 為標準化模板語言碼
     """
     try:
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        payload = {"brand": "BYD", "type": "TELEGRAM"}
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(SOCIAL_API, headers=headers, data=payload) as resp:
-                if resp.status != 200:
-                    logger.error(f"獲取 socials 數據失敗: {resp.status}")
-                    return []
-                    
-                social_data = await resp.json()
+        # 社群配置走共享快照，按 (類型, traderUid) 索引查表
+        socials_index = await socials_snapshot.get_index()
+        if socials_index is None:
+            logger.error("獲取 socials 數據失敗")
+            return []
         
         def collect(filter_type: str):
             collected = []
-            for social in social_data.get("data", []):
+            for social, chat in socials_index.chat_type(filter_type or "copy", trader_uid):
                 chat_id = social.get("socialGroup")
                 group_lang = _normalize_template_lang(social.get("lang"))
-                for chat in social.get("chats", []):
-                    if (
-                        str(chat.get("type", "")).lower() == str(filter_type or "copy").lower()
-                        and chat.get("enable")
-                        and str(chat.get("traderUid")) == str(trader_uid)
-                    ):
-                        topic_id = chat.get("chatId")
-                        raw_jump = chat.get("jump", "0")
-                        if isinstance(raw_jump, bool):
-                            jump = "1" if raw_jump else "0"
-                        elif isinstance(raw_jump, (int, float)):
-                            jump = "1" if int(raw_jump) == 1 else "0"
-                        elif isinstance(raw_jump, str):
-                            val = raw_jump.strip().lower()
-                            jump = "1" if val in {"1", "true", "yes", "y", "on"} else "0"
-                        else:
-                            jump = "0"
-                        if chat_id and topic_id:
-                            collected.append((chat_id, int(topic_id), jump, group_lang))
+                topic_id = chat.get("chatId")
+                raw_jump = chat.get("jump", "0")
+                if isinstance(raw_jump, bool):
+                    jump = "1" if raw_jump else "0"
+                elif isinstance(raw_jump, (int, float)):
+                    jump = "1" if int(raw_jump) == 1 else "0"
+                elif isinstance(raw_jump, str):
+                    val = raw_jump.strip().lower()
+                    jump = "1" if val in {"1", "true", "yes", "y", "on"} else "0"
+                else:
+                    jump = "0"
+                if chat_id and topic_id:
+                    collected.append((chat_id, int(topic_id), jump, group_lang))
             if collected:
                 unique = {}
                 for chat_id, topic_id, jump, group_lang in collected:
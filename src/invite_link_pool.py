@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+
+logger = logging.getLogger(__name__)
+
+ChatId = Union[int, str]
+# (bot_id, chat_id)：連結由哪個 bot 建立，就由哪個 bot 補充（需是該群管理員）
+PoolKey = Tuple[int, int]
+
+# 建立連結時表示 bot 已無權限或群組不存在的 400 錯誤（小寫比對）；其他錯誤視為暫時性
+_PERMANENT_BAD_REQUEST = ("chat not found", "not enough rights", "chat_admin_required", "need administrator rights",
+                          "bot is not a member", "peer_id_invalid", "channel_private")
+
+
+def _is_permanent_error(error: Exception) -> bool:
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    if isinstance(error, TelegramBadRequest):
+        text = str(error).lower()
+        return any(marker in text for marker in _PERMANENT_BAD_REQUEST)
+    return False
+
+
+class InviteAssignment:
+    """一條連結發給了誰；joined_by/joined_at 在有人經此連結入群時填上。"""
+
+    __slots__ = ("url", "chat_id", "user_id", "assigned_at", "joined_by", "joined_at")
+
+    def __init__(self, url: str, chat_id: int, user_id: int, assigned_at: float):
+        self.url = url
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.assigned_at = assigned_at
+        self.joined_by: Optional[int] = None
+        self.joined_at: Optional[float] = None
+
+
+class InviteLinkPool:
+    """
+    資訊群邀請連結池（按 (bot_id, chat_id)），避免驗證高峰時逐個 create_chat_invite_link 觸發 429：
+    - 預先建立 size 條單次可用（member_limit）或需審批（join_request）的連結，驗證成功時直接取出
+    - 取出後低於 low_watermark 即喚醒 run() 背景補充；池空時才即時建立一條
+    - 同一群建立連結至少間隔 create_interval 秒，遇 429 按 retry_after 暫停該群
+    - bot 失去權限或群組不存在時丟棄該群的池；其他錯誤（網路等）該群暫停補充 error_backoff 秒
+    - 連結帶 expire_date（link_ttl 秒），剩餘有效期不足 min_remaining 的不再發出
+    - 記錄每條連結發給了哪個用戶（最多 max_assignments 條，先進先出淘汰）
+    """
+
+    def __init__(self, *, size: int = 20, low_watermark: int = 5, member_limit: Optional[int] = 1,
+                 join_request: bool = False, link_ttl: float = 86400.0, min_remaining: float = 3600.0,
+                 create_interval: float = 1.0, max_wait: float = 10.0, idle_ttl: float = 86400.0,
+                 check_interval: float = 300.0, name_prefix: str = "verify", max_assignments: int = 10000,
+                 error_backoff: float = 60.0):
+        self._size = size
+        self._low_watermark = low_watermark
+        # Telegram 不允許 creates_join_request 與 member_limit 同時設置
+        self._member_limit = None if join_request else member_limit
+        self._join_request = join_request
+        self._link_ttl = link_ttl
+        self._min_remaining = min_remaining
+        self._create_interval = create_interval
+        self._max_wait = max_wait
+        self._idle_ttl = idle_ttl
+        self._check_interval = check_interval
+        self._name_prefix = name_prefix
+        self._max_assignments = max_assignments
+        self._error_backoff = error_backoff
+        # 池中連結：(url, expire_at)，按建立時間排序
+        self._pools: Dict[PoolKey, Deque[Tuple[str, float]]] = {}
+        self._bots: Dict[PoolKey, Bot] = {}
+        self._last_used: Dict[PoolKey, float] = {}
+        self._next_create: Dict[PoolKey, float] = {}
+        # 暫時性錯誤後背景補充的恢復時間（monotonic），不影響 acquire() 即時建立
+        self._refill_after: Dict[PoolKey, float] = {}
+        self._locks: Dict[PoolKey, asyncio.Lock] = {}
+        self._assignments: "OrderedDict[str, InviteAssignment]" = OrderedDict()
+        self._by_user: Dict[Tuple[int, int], str] = {}
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+
+    # -------------------- 取用 --------------------
+    async def acquire(self, bot: Bot, chat_id: ChatId, user_id: int) -> str:
+        """取出一條連結並記錄給 user_id；池空時即時建立，建立失敗（如 bot 非管理員）時拋出異常。"""
+        key = (bot.id, int(chat_id))
+        self._bots[key] = bot
+        self._last_used[key] = time.time()
+        pool = self._pools.setdefault(key, deque())
+        url = self._take(pool)
+        if url is None:
+            url = await self._create(key, max_wait=self._max_wait, pool=pool)
+            logger.info(f"[invite_pool] 群 {chat_id} 的連結池為空，已即時建立連結")
+        if len(pool) < self._low_watermark:
+            self._wakeup.set()
+        self._record(url, key[1], user_id)
+        return url
+
+    def _take(self, pool: Deque[Tuple[str, float]]) -> Optional[str]:
+        deadline = time.time() + self._min_remaining
+        while pool:
+            url, expire_at = pool.popleft()
+            if expire_at > deadline:
+                return url
+        return None
+
+    def _record(self, url: str, chat_id: int, user_id: int) -> None:
+        self._assignments[url] = InviteAssignment(url, chat_id, user_id, time.time())
+        self._by_user[(chat_id, user_id)] = url
+        while len(self._assignments) > self._max_assignments:
+            _, old = self._assignments.popitem(last=False)
+            if self._by_user.get((old.chat_id, old.user_id)) == old.url:
+                self._by_user.pop((old.chat_id, old.user_id), None)
+        logger.info(f"[invite_pool] 連結 {url} 發給用戶 {user_id}（群 {chat_id}）")
+
+    # -------------------- 追蹤 --------------------
+    def assignment(self, url: str) -> Optional[InviteAssignment]:
+        return self._assignments.get(url)
+
+    def link_for_user(self, chat_id: ChatId, user_id: int) -> Optional[str]:
+        """最近一次發給該用戶的連結。"""
+        return self._by_user.get((int(chat_id), user_id))
+
+    def joined(self, url: str, user_id: int) -> Optional[InviteAssignment]:
+        """有人經連結入群（chat_member 事件的 invite_link）；不是發給此人的連結時記錄警告。"""
+        item = self._assignments.get(url)
+        if item is None:
+            return None
+        item.joined_by = user_id
+        item.joined_at = time.time()
+        if item.user_id != user_id:
+            logger.warning(f"[invite_pool] 連結 {url} 發給用戶 {item.user_id}，但由用戶 {user_id} 使用入群")
+        return item
+
+    def invalidate(self, bot_id: int, chat_id: ChatId) -> None:
+        """bot 離開群組或失去管理員權限：丟棄池中連結，停止補充。"""
+        key = (bot_id, int(chat_id))
+        self._pools.pop(key, None)
+        self._bots.pop(key, None)
+        self._last_used.pop(key, None)
+        self._next_create.pop(key, None)
+        self._refill_after.pop(key, None)
+        self._locks.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "pools": {f"{bot_id}:{chat_id}": len(pool) for (bot_id, chat_id), pool in self._pools.items()},
+            "assignments": len(self._assignments),
+        }
+
+    # -------------------- 建立 --------------------
+    async def _create(self, key: PoolKey, *, max_wait: Optional[float] = None,
+                      pool: Optional[Deque[Tuple[str, float]]] = None) -> str:
+        """
+        按群限速建立一條連結；需等待超過 max_wait 秒時拋出 RuntimeError（None 表示一直等）。
+        傳入 pool 時，拿到鎖後先看背景補充是否已放入連結，有則直接取用。
+        """
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if pool:
+                url = self._take(pool)
+                if url is not None:
+                    return url
+            wait = self._next_create.get(key, 0.0) - time.monotonic()
+            if wait > 0:
+                if max_wait is not None and wait > max_wait:
+                    raise RuntimeError(f"invite link creation for chat {key[1]} is rate limited for {wait:.0f}s")
+                await asyncio.sleep(wait)
+            self._seq += 1
+            expire_at = time.time() + self._link_ttl
+            try:
+                link = await self._bots[key].create_chat_invite_link(
+                    chat_id=key[1],
+                    name=f"{self._name_prefix}-{self._seq}"[:32],
+                    expire_date=int(expire_at),
+                    member_limit=self._member_limit,
+                    creates_join_request=self._join_request or None,
+                )
+            except TelegramRetryAfter as e:
+                self._next_create[key] = time.monotonic() + e.retry_after
+                raise
+            self._next_create[key] = time.monotonic() + self._create_interval
+            return link.invite_link
+
+    async def _refill(self, key: PoolKey) -> int:
+        pool = self._pools.get(key)
+        if pool is None or key not in self._bots:
+            return 0
+        if self._refill_after.get(key, 0.0) > time.monotonic():
+            return 0
+        # 丟棄快到期的連結
+        deadline = time.time() + self._min_remaining
+        while pool and pool[0][1] <= deadline:
+            pool.popleft()
+        created = 0
+        while len(pool) < self._size and self._pools.get(key) is pool:
+            try:
+                url = await self._create(key)
+            except TelegramRetryAfter as e:
+                logger.warning(f"[invite_pool] 群 {key[1]} 建立連結觸發限流，{e.retry_after}s 後再補充")
+                break
+            except Exception as e:  # noqa: BLE001
+                if _is_permanent_error(e):
+                    # bot 已不是管理員、群組不存在：丟棄池並停止補充，下次取用時再嘗試
+                    logger.error(f"[invite_pool] 群 {key[1]} 建立連結失敗，停止補充: {e}")
+                    self.invalidate(*key)
+                else:
+                    # 暫時性錯誤：保留池中連結，稍後再補充
+                    logger.warning(f"[invite_pool] 群 {key[1]} 建立連結失敗，{self._error_backoff:.0f}s 後再補充: {e}")
+                    self._refill_after[key] = time.monotonic() + self._error_backoff
+                break
+            pool.append((url, time.time() + self._link_ttl))
+            created += 1
+        return created
+
+    async def run(self) -> None:
+        """背景補充任務：被取用喚醒或每 check_interval 秒檢查一次，把各群的池補滿；長時間未取用的群不再補充。"""
+        try:
+            while True:
+                # 不用 wait_for：事件已觸發時它可能吞掉取消信號
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=self._check_interval)
+                finally:
+                    waiter.cancel()
+                self._wakeup.clear()
+                now = time.time()
+                for key in [k for k, ts in self._last_used.items() if now - ts > self._idle_ttl]:
+                    self.invalidate(*key)
+                results = await asyncio.gather(*(self._refill(key) for key in list(self._pools)), return_exceptions=True)
+                created = sum(r for r in results if isinstance(r, int))
+                if created:
+                    logger.info(f"[invite_pool] 已補充 {created} 條邀請連結，{len(self._pools)} 個群")
+        except asyncio.CancelledError:
+            logger.info("邀请链接池补充任务被取消，正在退出...")
+            raise
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set
+
+
+logger = logging.getLogger(__name__)
+
+
+class JoinAggregator:
+    """
+    入群事件聚合：按 key（通常是群組）緩衝一小段時間再整批處理。
+    - 第一個事件到達後開始計時，window 秒後整批交給 flush(key, items)
+    - 累積到 max_batch 立即送出，限制單批人數（長度等限制由 flush 自行處理）
+    - 不同 key 的批次互不影響，可並行處理
+    """
+
+    def __init__(self, flush: Callable[[Hashable, List[Any]], Awaitable[None]], *,
+                 window: float = 2.0, max_batch: int = 50, name: str = "join"):
+        self._flush = flush
+        self._window = window
+        self._max_batch = max_batch
+        self._name = name
+        self._pending: Dict[Hashable, List[Any]] = {}
+        self._timers: Dict[Hashable, asyncio.Task] = {}
+        self._running: Set[asyncio.Task] = set()
+
+    def add(self, key: Hashable, item: Any) -> None:
+        batch = self._pending.setdefault(key, [])
+        batch.append(item)
+        if len(batch) >= self._max_batch:
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            self._dispatch(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: Hashable) -> None:
+        await asyncio.sleep(self._window)
+        self._timers.pop(key, None)
+        self._dispatch(key)
+
+    def _dispatch(self, key: Hashable) -> None:
+        items = self._pending.pop(key, None)
+        if not items:
+            return
+        task = asyncio.create_task(self._run(key, items))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, key: Hashable, items: List[Any]) -> None:
+        try:
+            await self._flush(key, items)
+        except Exception as e:  # noqa: BLE001
+            logger.error(f"[{self._name}] 處理 {key} 的 {len(items)} 個入群事件失敗: {e}")
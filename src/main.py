@@ -7,6 +7,7 @@ import tempfile
 import time
 import aiofiles
 import re
+import html
 from aiohttp import web
 from typing import Optional
 from functools import partial
@@ -24,7 +25,7 @@ from aiogram.exceptions import TelegramBadRequest
 
 # 導入 Group 相關函數
 from db_handler_aio import *
-from unpublished_posts_handler import fetch_unpublished_posts, publish_posts
+from unpublished_posts_handler import ArticlePublisher
 from handlers.copy_signal_handler import handle_send_copy_signal
 from handlers.weekly_report_handler import handle_weekly_report
 from handlers.scalp_update_handler import handle_scalp_update
@@ -32,7 +33,23 @@ from handlers.holding_report_handler import handle_holding_report
 from handlers.trade_summary_handler import handle_trade_summary
 from handlers.common import cleanup_dedup_cache
 from multilingual_utils import apply_rtl_if_needed, get_preferred_language
-from bot_manager import BotManager
+from bot_manager import BotContext, BotContextMiddleware, BotManager
+from agent_registry import AgentRegistry
+from announcement_broadcaster import AnnouncementBroadcaster
+from announcement_content import prepare_announcements
+from broadcast_media import BroadcastMedia
+from rate_limiter import get_rate_limiter
+from socials_snapshot import socials_snapshot
+from chat_classifier import ChatClassifier
+from deletion_scheduler import DeletionScheduler
+from detail_cache import DetailCache
+from chat_permissions import BotAdminCache
+from group_metadata import GroupMetadata, GroupMetadataCache
+from group_registry import GroupRegistry
+import schema_migrations
+from invite_link_pool import InviteLinkPool
+from join_aggregator import JoinAggregator
+from verify_throttle import VerifyThrottle, record_reply
 
 logging.basicConfig(
     level=logging.INFO,
@@ -518,29 +535,31 @@ async def _fetch_lang_from_verify_api_group(message: types.Message, chat_id: Uni
         return None
 
 async def _fetch_lang_from_detail_by_bot(bot: Bot, current_brand: str) -> Optional[str]:
-    """從 DETAIL_API_BY_BOT 取語言（兜底）。
+    """取 bot 語言（兜底）：優先讀 BotContext 快照，尚未載入時才請求 DETAIL_API_BY_BOT。"""
+    ctx = bot_manager.peek_context(bot.id)
+    if ctx is not None and ctx.detail_lang_ts and ctx.brand == current_brand:
+        return ctx.detail_lang
+    return await _load_lang_from_detail_by_bot(bot, current_brand)
+
+def invalidate_bot_detail(brand: Optional[str] = None, bot_username: Optional[str] = None) -> int:
+    """清除 DETAIL 快取並讓對應 bot 的語言快照過期（後台修改配置、bot 進出群組時）。返回清除的快取條數。"""
+    removed = detail_cache.invalidate(brand, bot_username)
+    bot_manager.expire_detail_lang(brand=brand, username=bot_username)
+    return removed
+
+async def _load_lang_from_detail_by_bot(bot: Bot, current_brand: str) -> Optional[str]:
+    """從 DETAIL_API_BY_BOT 取語言（BotContextMiddleware 的快照來源，經 detail_cache）。
     回傳 data.lang 或根級 lang；失敗回 None。
     """
     try:
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
         bot_name_for_api = await get_bot_display_name(bot)
-        payload = {
-            "brand": current_brand,
-            "type": "TELEGRAM",
-            "botUsername": bot_name_for_api,
-        }
-        async with aiohttp.ClientSession() as session_http:
-            async with session_http.post(DETAIL_API_BY_BOT, headers=headers, data=payload) as resp:
-                try:
-                    data = await resp.json()
-                except Exception:
-                    return None
-                lang = None
-                if isinstance(data.get("data"), dict):
-                    lang = data.get("data", {}).get("lang")
-                if not lang:
-                    lang = data.get("lang")
-                return lang
+        data = await detail_cache.get(current_brand, bot_name_for_api)
+        lang = None
+        if isinstance(data.get("data"), dict):
+            lang = data.get("data", {}).get("lang")
+        if not lang:
+            lang = data.get("lang")
+        return lang
     except Exception:
         return None
 
@@ -551,15 +570,57 @@ DETAIL_API_BY_BOT = os.getenv("DETAIL_API_BY_BOT")
 
 bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
 dp = Dispatcher(storage=MemoryStorage())
+# 公告廣播：主 Bot 的限速器與其他發送路徑共用
+announcement_broadcaster = AnnouncementBroadcaster(get_rate_limiter(bot.id))
+# 入群事件的群組分類快取（資訊群 / 驗證群 / 歡迎語）
+chat_classifier = ChatClassifier(
+    WELCOME_API,
+    socials_snapshot,
+    ttl=float(os.getenv("CHAT_CLASSIFY_TTL", "600")),
+    negative_ttl=float(os.getenv("CHAT_CLASSIFY_NEGATIVE_TTL", "120")),
+)
+# DETAIL_API_BY_BOT 結果快取（verifyGroup / socialGroup / lang），同一 bot 每個 TTL 週期最多請求一次
+detail_cache = DetailCache(
+    DETAIL_API_BY_BOT,
+    ttl=float(os.getenv("DETAIL_CACHE_TTL", "600")),
+    negative_ttl=float(os.getenv("DETAIL_CACHE_NEGATIVE_TTL", "60")),
+)
+# 文章發布：推送觸發 + 兜底輪詢
+article_publisher = ArticlePublisher(
+    bot,
+    MESSAGE_API_URL,
+    UPDATE_MESSAGE_API_URL,
+    min_interval=float(os.getenv("POSTS_POLL_MIN_INTERVAL", "30")),
+    max_interval=float(os.getenv("POSTS_POLL_MAX_INTERVAL", "600")),
+)
+# 批量成員數查詢單次最多的 chat_id 數量
+MAX_MEMBER_COUNT_BATCH = 200
 
 # 停止信号事件
 stop_event = asyncio.Event()
 router = Router()
 # 从环境变量读取最大 bot 数量限制，默认 200（如果不需要限制，可以设置为很大的数字，如 1000）
 MAX_BOTS_LIMIT = int(os.getenv("MAX_BOTS_LIMIT", "200"))
-bot_manager = BotManager(shared_router=router, max_bots=MAX_BOTS_LIMIT)
+bot_manager = BotManager(max_bots=MAX_BOTS_LIMIT)
 logger.info(f"BotManager initialized with max_bots limit: {MAX_BOTS_LIMIT}")
-group_chat_ids = set()
+# Bot 所在群組（含各 bot 的群組關係），DB 寫入由 group_registry.run() 批量完成
+group_registry = GroupRegistry(flush_delay=float(os.getenv("GROUP_REGISTRY_FLUSH_DELAY", "2")))
+# bot 在各群是否為管理員（驗證流程生成邀請連結前檢查），my_chat_member 事件直接更新
+bot_admin_cache = BotAdminCache(ttl=float(os.getenv("BOT_ADMIN_CACHE_TTL", "600")))
+# 私聊驗證節流：同一用戶的重複請求合併/直接重發結果，並限制驗證頻率
+verify_throttle = VerifyThrottle(
+    result_ttl=float(os.getenv("VERIFY_RESULT_TTL", "30")),
+    max_attempts=int(os.getenv("VERIFY_MAX_ATTEMPTS", "5")),
+    window=float(os.getenv("VERIFY_ATTEMPT_WINDOW", "60")),
+)
+# 資訊群邀請連結池：驗證成功時直接取出預建的單次連結，背景補充
+invite_link_pool = InviteLinkPool(
+    size=int(os.getenv("INVITE_POOL_SIZE", "20")),
+    low_watermark=int(os.getenv("INVITE_POOL_LOW_WATERMARK", "5")),
+    join_request=os.getenv("INVITE_POOL_JOIN_REQUEST", "false").lower() in ("1", "true", "yes"),
+    link_ttl=float(os.getenv("INVITE_LINK_TTL", "86400")),
+    create_interval=float(os.getenv("INVITE_POOL_CREATE_INTERVAL", "1")),
+)
 verified_users = {}
 
 ALLOWED_ADMIN_IDS = [7067100466, 7257190337, 7182693065]
@@ -618,6 +679,9 @@ async def get_bot_display_name(bot: Bot) -> str:
         bid = bot.id
     except Exception:
         return "unknown"
+    ctx = bot_manager.peek_context(bid)
+    if ctx is not None and ctx.me is not None:
+        return ctx.display_name
     name = _BOT_NAME_CACHE.get(bid)
     if name:
         return name
@@ -632,64 +696,67 @@ async def get_bot_display_name(bot: Bot) -> str:
 # -------------------- 動態 Bot 持久化（重啟自動恢復） --------------------
 _AGENTS_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "run", "bots.json")
 
-def _load_agents_store() -> list:
-    try:
-        path = os.path.abspath(_AGENTS_STORE_PATH)
-        if not os.path.exists(path):
-            return []
-        import json
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f) or []
-    except Exception as e:
-        logger.error(f"load agents store failed: {e}")
-        return []
+agent_registry = AgentRegistry(_AGENTS_STORE_PATH)
+
+def _resolve_bot(bot_id: int) -> Optional[Bot]:
+    """按 bot_id 找回 Bot 實例（主 Bot 或已啟動的代理 bot）。"""
+    if bot_id == bot.id:
+        return bot
+    ctx = bot_manager.peek_context(bot_id)
+    return ctx.bot if ctx is not None else None
+
+# MySQL 缺少模型宣告的表時是否在啟動時自動建立（false 時拒絕啟動，需先執行 schema_migrations.py apply）
+DB_AUTO_CREATE_TABLES = os.getenv("DB_AUTO_CREATE_TABLES", "true").lower() in ("1", "true", "yes")
 
-def _save_agents_store(items: list) -> None:
+async def ensure_schema() -> None:
+    """啟動時檢查表結構：缺表時按 DB_AUTO_CREATE_TABLES 建立或拒絕啟動；缺索引只記錄警告。"""
     try:
-        path = os.path.abspath(_AGENTS_STORE_PATH)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        import json
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(items, f, ensure_ascii=False, indent=2)
+        missing = await schema_migrations.missing_tables()
+        missing_ix = await schema_migrations.missing_indexes()
     except Exception as e:
-        logger.error(f"save agents store failed: {e}")
+        logger.error(f"检查数据库表结构失败: {e}")
+        return
+    if missing:
+        if not DB_AUTO_CREATE_TABLES:
+            raise RuntimeError(f"数据库缺少表 {missing}，请在 src 目录执行 python schema_migrations.py apply")
+        created = await schema_migrations.apply_tables()
+        logger.warning(f"数据库缺少表，已自动建立: {created}")
+    if missing_ix:
+        logger.warning(f"数据库缺少索引 {missing_ix}，请在 src 目录执行 python schema_migrations.py apply")
+
+def _bot_for_chat(chat_id) -> Optional[Bot]:
+    """選一個在群內的 bot：優先主 Bot，其次已啟動的代理 bot；都不知道時返回 None。"""
+    bot_ids = group_registry.bots_for(chat_id)
+    if bot.id in bot_ids:
+        return bot
+    for bot_id in bot_ids:
+        found = _resolve_bot(bot_id)
+        if found is not None:
+            return found
+    return None
+
+# 群組資訊/成員數快取：查詢接口讀記憶體，背景定期刷新並寫回 groups 表（只更新資訊欄位，不改啟用狀態）
+group_metadata = GroupMetadataCache(
+    bot,
+    ttl=float(os.getenv("GROUP_META_TTL", "300")),
+    refresh_interval=float(os.getenv("GROUP_META_REFRESH_INTERVAL", "600")),
+    persist=bulk_update_group_metadata,
+    bot_resolver=_bot_for_chat,
+)
+
+# 定時刪除消息：單一計時循環批量刪除，佇列持久化到 run/deletions.json，重啟後繼續
+deletion_scheduler = DeletionScheduler(
+    _resolve_bot,
+    store_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "run", "deletions.json"),
+)
 
 def _persist_agent(token: str, brand: str, proxy: Optional[str], bot_name: Optional[str] = None, bot_username: Optional[str] = None) -> None:
-    items = _load_agents_store()
-    # 去重（以 token 為鍵）
-    exists = False
-    for it in items:
-        if it.get("token") == token:
-            it["brand"] = brand
-            it["proxy"] = proxy
-            it["enabled"] = True
-            if bot_name:
-                it["bot_name"] = bot_name
-            if bot_username:
-                it["bot_username"] = bot_username
-            exists = True
-            break
-    if not exists:
-        item = {
-            "token": token,
-            "brand": brand,
-            "proxy": proxy,
-            "enabled": True,
-        }
-        if bot_name:
-            item["bot_name"] = bot_name
-        if bot_username:
-            item["bot_username"] = bot_username
-        items.append(item)
-    _save_agents_store(items)
+    # 只更新記憶體並排入日誌，由背景任務寫盤，不阻塞事件循環
+    agent_registry.upsert(token, brand, proxy, bot_name, bot_username)
 
 def _remove_agent(token: str) -> bool:
     """从持久化存储中删除 bot（通过 token）"""
-    items = _load_agents_store()
-    original_count = len(items)
-    items = [it for it in items if it.get("token") != token]
-    if len(items) < original_count:
-        _save_agents_store(items)
+    if agent_registry.remove(token):
         logger.info(f"Removed bot from persistent store (token: {token[:10]}...{token[-4:] if len(token) > 14 else ''})")
         return True
     return False
@@ -715,8 +782,8 @@ def _build_agent_router() -> Router:
     return r
 
 async def start_persisted_agents(manager: BotManager):
-    path = os.path.abspath(_AGENTS_STORE_PATH)
-    items = _load_agents_store()
+    path = agent_registry.store_path
+    items = agent_registry.load()
     if not items:
         logger.info(f"No persisted agents to restore (checked: {path})")
         return
@@ -749,16 +816,15 @@ async def start_persisted_agents(manager: BotManager):
                 periodic_coro_factory=None,
                 max_idle_seconds=None,
                 idle_check_interval=3600,
-                router_factory=_build_agent_router,
             )
             logger.info(f"Restored agent bot for brand={brand}")
         except Exception as e:
             logger.error(f"Restore agent failed: {e}")
 @router.callback_query()
-async def handle_inline_callbacks(callback: types.CallbackQuery):
+async def handle_inline_callbacks(callback: types.CallbackQuery, bot_ctx: BotContext):
     try:
         data = callback.data or ""
-        bot_name = await get_bot_display_name(callback.bot)
+        bot_name = bot_ctx.display_name
         src_text = getattr(callback.message, "text", None) or getattr(callback.message, "caption", "")
         logger.info(f"[callback] bot={bot_name}({callback.bot.id}) user={callback.from_user.id} data={data} msg_text={src_text!r}")
         if data.startswith("verify|"):
@@ -775,9 +841,8 @@ async def handle_inline_callbacks(callback: types.CallbackQuery):
             
             # 多語言提示：請輸入 UID（優先用 /start 緩存，其次查詢）
             try:
-                current_brand = bot_manager.get_brand_by_bot_id(callback.bot.id, DEFAULT_BRAND)
-                # 強兜底優先：detail_by_bot（以群配置為準）
-                lang_hint = await _fetch_lang_from_detail_by_bot(callback.bot, current_brand)
+                # 強兜底優先：detail_by_bot（以群配置為準，讀 BotContext 快照）
+                lang_hint = bot_ctx.detail_lang
                 if not lang_hint:
                     lang_hint = _get_user_lang(str(callback.from_user.id))
                 if not lang_hint:
@@ -806,127 +871,155 @@ async def handle_inline_callbacks(callback: types.CallbackQuery):
         import traceback
         logger.error(f"详细错误信息: {traceback.format_exc()}")
 
+async def _get_user_status(bot: Bot, chat_id: int, user_id: int, tag: str) -> Optional[str]:
+    """用户在群内的状态（kicked / member ...）；查询失败返回 None。"""
+    try:
+        user_member = await bot.get_chat_member(chat_id, user_id)
+    except Exception as e:
+        # 继续执行，可能是用户不在群组中
+        logger.warning(f"[{tag}] Could not check user member status: {e}")
+        return None
+    logger.info(f"[{tag}] User member status: {user_member.status}")
+    return user_member.status
+
+async def _prefetch_invite_target(bot: Bot, current_brand: str, bot_name_for_api: str, verify_group_id: Optional[str],
+                                  user_id: Optional[int], tag: str) -> dict:
+    """
+    預取生成邀請連結所需的資訊：DETAIL_API_BY_BOT 返回的群組與語言（經 detail_cache），拿到 socialGroup 後
+    查詢 bot 是否為管理員（bot_admin_cache）；傳入 user_id 時並發查詢用戶在群內的狀態。
+    不傳 user_id 時只涉及群組配置，可與 VERIFY 請求並行（用户狀態在驗證成功後用 _get_user_status 查）。
+    返回 dict：detail_data / info_group_chat_id / lang / admin_error / user_status
+    """
+    detail_data = await detail_cache.get(current_brand, bot_name_for_api, verify_group_id)
+    logger.info(f"[{tag}] Detail API response: {detail_data}")
+
+    target = {"detail_data": detail_data, "info_group_chat_id": None, "lang": None, "admin_error": None, "user_status": None}
+    data = detail_data.get("data")
+    if not isinstance(data, dict):
+        logger.warning(f"[{tag}] Detail API returned string data: {data}")
+        return target
+    target["lang"] = data.get("lang")
+    info_group_chat_id = data.get("socialGroup")
+    if not info_group_chat_id:
+        return target
+    target["info_group_chat_id"] = str(info_group_chat_id)
+    try:
+        chat_id = int(info_group_chat_id)
+    except (TypeError, ValueError) as e:
+        target["admin_error"] = e
+        return target
+
+    checks = [bot_admin_cache.is_admin(bot, chat_id)]
+    if user_id is not None:
+        checks.append(_get_user_status(bot, chat_id, user_id, tag))
+    results = await asyncio.gather(*checks, return_exceptions=True)
+    is_admin = results[0]
+    if isinstance(is_admin, Exception):
+        target["admin_error"] = is_admin
+    elif not is_admin:
+        logger.warning(f"[{tag}] Bot is not admin in chat {chat_id}")
+        target["admin_error"] = Exception(f"Bot is not administrator in chat {chat_id}")
+    if user_id is not None:
+        target["user_status"] = results[1]
+    return target
+
+def _discard_tasks(*tasks: Optional[asyncio.Future]) -> None:
+    """取消未用到的預取任務；已完成的取走異常，避免 'exception was never retrieved' 警告。"""
+    for task in tasks:
+        if task is None:
+            continue
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            task.exception()
+
+def _build_invite_error_message(msg_text: Optional[str], lang_hint: Optional[str], from_user: types.User) -> str:
+    """驗證成功但無法生成邀請連結：使用後端返回的消息，{Approval Link} 替換為本地化的錯誤提示。"""
+    error_note = _get_localized_invite_link_error_msg(lang_hint)
+    if re.search(r"\{\s*Approval\s+Link\s*\}", msg_text or "", re.IGNORECASE):
+        message_text = re.sub(r"\{\s*Approval\s+Link\s*\}", f"\n\n{error_note}", msg_text or "", flags=re.IGNORECASE)
+    else:
+        # 如果消息中没有 {Approval Link}，则在末尾添加错误提示
+        message_text = (msg_text or "") + f"\n\n{error_note}"
+    # 替换用户名占位符
+    message_text = message_text.replace("@{username}", f"@{from_user.full_name}")
+    message_text = _replace_placeholders(
+        message_text,
+        link=None,
+        user_mention=f'<a href="tg://user?id={from_user.id}">{from_user.full_name}</a>',
+        admin_mention="@admin",
+    )
+    return apply_rtl_if_needed(message_text)
+
 async def _generate_invite_link_for_verified_user(message: types.Message, verify_group_id: Optional[str], current_brand: str):
     """为已验证用户生成新的邀请链接"""
     try:
         logger.info(f"[verified_user] Generating invite link for verified user: {message.from_user.id}")
         
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
         bot_name_for_api = await get_bot_display_name(message.bot)
         
-        # 调用DETAIL_API获取群组信息
-        detail_payload = {
-            "brand": current_brand,
-            "type": "TELEGRAM",
-            "botUsername": bot_name_for_api,
-        }
-        if verify_group_id:
-            detail_payload["verifyGroup"] = verify_group_id
-        
-        logger.info(f"[verified_user] detail_payload: {detail_payload}")
-        logger.info(f"[verified_user] About to call DETAIL_API_BY_BOT: {DETAIL_API_BY_BOT}")
-        
-        async with aiohttp.ClientSession() as session_http:
-            async with session_http.post(DETAIL_API_BY_BOT, headers=headers, data=detail_payload) as detail_response:
-                detail_data = await detail_response.json()
-                logger.info(f"[verified_user] Detail API response: {detail_data}")
+        # 获取群组信息（DETAIL_API），并发检查机器人权限与用户状态
+        target = await _prefetch_invite_target(
+            message.bot, current_brand, bot_name_for_api, verify_group_id, message.from_user.id, "verified_user"
+        )
+        info_group_chat_id = target["info_group_chat_id"]
+
+        if info_group_chat_id:
+            logger.info(f"[verified_user] info_group_chat_id: {info_group_chat_id}")
+            if target["admin_error"] is not None:
+                logger.error(f"[verified_user] Chat check failed: {target['admin_error']}")
+                raise target["admin_error"]
+
+            # 检查用户是否被ban
+            if target["user_status"] == "kicked":
+                logger.warning(f"[verified_user] User {message.from_user.id} is banned in chat {info_group_chat_id}")
+                await message.bot.send_message(
+                    chat_id=message.chat.id,
+                    text="⚠️ You are currently banned from the group. Please contact an administrator to be unbanned first.",
+                    parse_mode=None
+                )
+                return
+            
+            # 生成邀请链接
+            try:
+                invite_link = await message.bot.create_chat_invite_link(
+                    chat_id=int(info_group_chat_id),
+                    name=f"Re-invite for {message.from_user.full_name}",
+                    # 不设置member_limit，允许重复使用
+                    # 不设置expire_date，创建永久链接
+                )
+                logger.info(f"[verified_user] Successfully created invite link: {invite_link.invite_link}")
                 
-                # 处理API响应格式
-                if isinstance(detail_data.get("data"), dict):
-                    verify_group_chat_id = detail_data.get("data", {}).get("verifyGroup")
-                    info_group_chat_id = detail_data.get("data", {}).get("socialGroup")
-                else:
-                    logger.warning(f"[verified_user] Detail API returned string data: {detail_data.get('data')}")
-                    verify_group_chat_id = None
-                    info_group_chat_id = None
-
-                if info_group_chat_id:
-                    logger.info(f"[verified_user] info_group_chat_id: {info_group_chat_id}, type: {type(info_group_chat_id)}")
-                    chat_id_str = str(info_group_chat_id) if info_group_chat_id else None
-                    if not chat_id_str:
-                        raise ValueError("Invalid chat ID received from API")
-                    
-                    # 检查群组和机器人权限
-                    try:
-                        logger.info(f"[verified_user] Checking chat info for chat_id: {int(chat_id_str)}")
-                        chat_info = await message.bot.get_chat(int(chat_id_str))
-                        logger.info(f"[verified_user] Chat info: {chat_info.title}, type: {chat_info.type}")
-                        
-                        bot_member = await message.bot.get_chat_member(int(chat_id_str), message.bot.id)
-                        logger.info(f"[verified_user] Bot member status: {bot_member.status}")
-                        
-                        if bot_member.status not in ['administrator', 'creator']:
-                            logger.warning(f"[verified_user] Bot is not admin in chat {int(chat_id_str)}, status: {bot_member.status}")
-                            raise Exception(f"Bot is not administrator in chat {int(chat_id_str)}")
-                        
-                    except Exception as chat_check_error:
-                        logger.error(f"[verified_user] Chat check failed: {chat_check_error}")
-                        raise chat_check_error
-                    
-                    # 检查用户是否被ban
-                    try:
-                        user_member = await message.bot.get_chat_member(int(chat_id_str), message.from_user.id)
-                        logger.info(f"[verified_user] User member status: {user_member.status}")
-                        
-                        if user_member.status == "kicked":
-                            logger.warning(f"[verified_user] User {message.from_user.id} is banned in chat {int(chat_id_str)}")
-                            await message.bot.send_message(
-                                chat_id=message.chat.id,
-                                text="⚠️ You are currently banned from the group. Please contact an administrator to be unbanned first.",
-                                parse_mode=None
-                            )
-                            return
-                    except Exception as member_check_error:
-                        logger.warning(f"[verified_user] Could not check user member status: {member_check_error}")
-                        # 继续执行，可能是用户不在群组中
-                    
-                    # 生成邀请链接
+                # 发送成功消息（多語言）
+                # 優先使用 detail 的 lang，其次使用 /start 緩存，再兜底 detail_by_bot，再回退 en
+                lang_hint = target["lang"] or _get_user_lang(str(message.from_user.id))
+                if not lang_hint:
                     try:
-                        invite_link = await message.bot.create_chat_invite_link(
-                            chat_id=int(chat_id_str),
-                            name=f"Re-invite for {message.from_user.full_name}",
-                            # 不设置member_limit，允许重复使用
-                            # 不设置expire_date，创建永久链接
-                        )
-                        logger.info(f"[verified_user] Successfully created invite link: {invite_link.invite_link}")
-                        
-                        # 发送成功消息（多語言）
-                        # 優先使用 detail 的 lang，其次使用 /start 緩存，再兜底 detail_by_bot，再回退 en
+                        lang_hint = await _fetch_lang_from_detail_by_bot(message.bot, current_brand)
+                    except Exception:
                         lang_hint = None
-                        try:
-                            if isinstance(detail_data.get("data"), dict):
-                                lang_hint = detail_data.get("data", {}).get("lang")
-                        except Exception:
-                            lang_hint = None
-                        if not lang_hint:
-                            lang_hint = _get_user_lang(str(message.from_user.id))
-                        if not lang_hint:
-                            try:
-                                lang_hint = await _fetch_lang_from_detail_by_bot(message.bot, current_brand)
-                            except Exception:
-                                lang_hint = None
-                        lang_key = _coalesce_lang_for_templates(lang_hint or "en")
-                        tpl = _WELCOME_BACK_TEMPLATES.get(lang_key, _WELCOME_BACK_TEMPLATES["en"])
-                        # 将 {name} 替换为HTML格式的用户链接，使其可点击
-                        user_mention_html = f'<a href="tg://user?id={message.from_user.id}">{message.from_user.full_name}</a>'
-                        success_message = tpl.format(name=user_mention_html, link=invite_link.invite_link)
-                        success_message = apply_rtl_if_needed(success_message)
-                        await message.bot.send_message(chat_id=message.chat.id, text=success_message, parse_mode="HTML")
-                        
-                    except Exception as invite_error:
-                        logger.error(f"[verified_user] Failed to create invite link: {invite_error}")
-                        await message.bot.send_message(
-                            chat_id=message.chat.id,
-                            text="✅ You are already verified, but unable to generate invitation link at this time. Please contact support for group access.",
-                            parse_mode=None
-                        )
-                else:
-                    logger.warning(f"[verified_user] No group information available")
-                    await message.bot.send_message(
-                        chat_id=message.chat.id,
-                        text="✅ You are already verified, but no group information is available. Please contact support.",
-                        parse_mode=None
-                    )
+                lang_key = _coalesce_lang_for_templates(lang_hint or "en")
+                tpl = _WELCOME_BACK_TEMPLATES.get(lang_key, _WELCOME_BACK_TEMPLATES["en"])
+                # 将 {name} 替换为HTML格式的用户链接，使其可点击
+                user_mention_html = f'<a href="tg://user?id={message.from_user.id}">{message.from_user.full_name}</a>'
+                success_message = tpl.format(name=user_mention_html, link=invite_link.invite_link)
+                success_message = apply_rtl_if_needed(success_message)
+                await message.bot.send_message(chat_id=message.chat.id, text=success_message, parse_mode="HTML")
+                
+            except Exception as invite_error:
+                logger.error(f"[verified_user] Failed to create invite link: {invite_error}")
+                await message.bot.send_message(
+                    chat_id=message.chat.id,
+                    text="✅ You are already verified, but unable to generate invitation link at this time. Please contact support for group access.",
+                    parse_mode=None
+                )
+        else:
+            logger.warning(f"[verified_user] No group information available")
+            await message.bot.send_message(
+                chat_id=message.chat.id,
+                text="✅ You are already verified, but no group information is available. Please contact support.",
+                parse_mode=None
+            )
                     
     except Exception as e:
         logger.error(f"_generate_invite_link_for_verified_user error: {e}")
@@ -941,19 +1034,44 @@ async def _generate_invite_link_for_verified_user(message: types.Message, verify
         except Exception as send_error:
             logger.error(f"Failed to send error message: {send_error}")
 
+async def _send_verify_reply(message: types.Message, text: str, *, parse_mode: Optional[str] = None,
+                             cacheable: bool = True) -> None:
+    """發送私聊驗證流程的回覆，並記錄到 verify_throttle，供重複請求直接重發。"""
+    await message.bot.send_message(chat_id=message.chat.id, text=text, parse_mode=parse_mode)
+    record_reply(text, parse_mode, cacheable=cacheable)
+
+async def _throttled_private_verify(message: types.Message, verify_group_id: Optional[str], verify_code: str, current_brand: str):
+    """私聊驗證入口：同一用戶的重複 /verify 或重發 UID 合併為一次驗證，短時間內直接重發上次的結果。"""
+    key = (message.bot.id, message.from_user.id)
+    status, replies = await verify_throttle.run(
+        key,
+        (verify_code, verify_group_id),
+        lambda: _perform_private_verify_flow(message, verify_group_id, verify_code, current_brand),
+    )
+    if status == "limited":
+        await message.bot.send_message(
+            chat_id=message.chat.id,
+            text="⚠️ Too many verification attempts. Please wait a minute and try again.",
+            parse_mode=None
+        )
+    elif status != "fresh":
+        logger.info(f"[verify_throttle] user={message.from_user.id} UID={verify_code} 使用{'合併' if status == 'coalesced' else '快取'}的驗證結果")
+        for text, parse_mode, _ in replies:
+            await message.bot.send_message(chat_id=message.chat.id, text=text, parse_mode=parse_mode)
+
 async def _perform_private_verify_flow(message: types.Message, verify_group_id: Optional[str], verify_code: str, current_brand: str):
     """執行私聊驗證流程（PRIVATE 模式）。
     - 若無 verify_group_id，僅以 botId/botName 與後端溝通，由後端映射到對應群組
+    - DETAIL 與 bot 管理員權限檢查不依賴驗證結果，與 VERIFY 並行預取
+    - 用戶在群內的狀態（是否被封禁）在驗證成功後才查詢，之後取出邀請連結
     """
     try:
         logger.info(f"[verify_flow] Starting verification for user: {message.from_user.id}, UID: {verify_code}, verify_group_id: {verify_group_id}")
         logger.info(f"[verify_flow] UID type: {type(verify_code)}, value: {verify_code}")
         user_id = str(message.from_user.id)
-        user_mention = f'<a href="tg://user?id={user_id}">{message.from_user.full_name}</a>'
 
         # 统一走验证接口，由后端判断是否已验证
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        admin_mention = "admin"
         bot_name_for_api = await get_bot_display_name(message.bot)
         logger.info(f"[verify_flow] bot_name_for_api: {bot_name_for_api}, type: {type(bot_name_for_api)}")
         
@@ -972,167 +1090,85 @@ async def _perform_private_verify_flow(message: types.Message, verify_group_id:
         logger.info(f"[verify_flow] About to call VERIFY_API_BY_BOT: {VERIFY_API_BY_BOT}")
         
         async with aiohttp.ClientSession() as session_http:
-            async with session_http.post(VERIFY_API_BY_BOT, headers=headers, data=verify_payload) as response:
-                logger.info(f"[verify_flow] VERIFY_API_BY_BOT response status: {response.status}")
-                response_data = await response.json()
+            prefetch = asyncio.ensure_future(
+                # 只预取群组配置与 bot 权限；用户状态在验证成功后再查
+                _prefetch_invite_target(message.bot, current_brand, bot_name_for_api, verify_group_id, None, "verify_flow")
+            )
+            try:
+                async with session_http.post(VERIFY_API_BY_BOT, headers=headers, data=verify_payload) as response:
+                    logger.info(f"[verify_flow] VERIFY_API_BY_BOT response status: {response.status}")
+                    response_data = await response.json()
                 logger.info(f"[verify_flow] VERIFY_API_BY_BOT response data: {response_data}")
                 
                 # 检查服务不可用的情况
                 if response.status == 500 and "Load balancer does not have available server" in str(response_data):
                     logger.error(f"[verify_flow] Backend service unavailable: {response_data}")
-                    await message.bot.send_message(
-                        chat_id=message.chat.id,
-                        text="⚠️ Verification service is temporarily unavailable. Please try again later or contact the administrator.",
-                        parse_mode=None
+                    await _send_verify_reply(
+                        message,
+                        "⚠️ Verification service is temporarily unavailable. Please try again later or contact the administrator.",
+                        cacheable=False,
                     )
                     return
                 
                 msg_text = _get_api_message_text(response_data)
                 logger.info(f"[verify_flow] Original API message text (before replacement): {msg_text!r}")
                 # 成功判斷：200 且包含英文成功詞或帶有 {Approval Link} 佔位（多語成功必帶）
-                import re as _re
                 _msg_lower = (msg_text or "").lower()
                 _has_success_token = "verification successful" in _msg_lower
-                _has_approval_placeholder = bool(_re.search(r"\{\s*approval\s+link\s*\}", msg_text or "", _re.I))
+                _has_approval_placeholder = bool(re.search(r"\{\s*approval\s+link\s*\}", msg_text or "", re.I))
                 if response.status == 200 and (_has_success_token or _has_approval_placeholder):
-                    logger.info(f"[verify_flow] Verification successful, calling DETAIL_API_BY_BOT")
-                    detail_payload = {
-                        "brand": current_brand,
-                        "type": "TELEGRAM",
-                        "botUsername": bot_name_for_api,
-                    }
-                    if verify_group_id:
-                        detail_payload["verifyGroup"] = verify_group_id
-                    
-                    logger.info(f"[verify_flow] detail_payload: {detail_payload}")
-                    logger.info(f"[verify_flow] About to call DETAIL_API_BY_BOT: {DETAIL_API_BY_BOT}")
-                    
-                    async with session_http.post(DETAIL_API_BY_BOT, headers=headers, data=detail_payload) as detail_response:
-                        detail_data = await detail_response.json()
-                        logger.info(f"[verify_flow] Detail API response: {detail_data}")
-                        
-                        # 处理API响应格式
-                        if isinstance(detail_data.get("data"), dict):
-                            verify_group_chat_id = detail_data.get("data", {}).get("verifyGroup")
-                            info_group_chat_id = detail_data.get("data", {}).get("socialGroup")
-                            # 从 detail API 响应中提取语言并更新缓存
-                            lang_from_detail = detail_data.get("data", {}).get("lang")
-                            if lang_from_detail:
-                                _set_user_lang(str(message.from_user.id), str(lang_from_detail))
-                                logger.info(f"[verify_flow] Updated user lang cache from detail API: uid={message.from_user.id} lang={lang_from_detail}")
-                        else:
-                            # 如果data是字符串，尝试从其他地方获取群组信息
-                            logger.warning(f"[verify_flow] Detail API returned string data: {detail_data.get('data')}")
-                            verify_group_chat_id = None
-                            info_group_chat_id = None
+                    logger.info(f"[verify_flow] Verification successful, waiting for prefetched detail")
+                    target = await prefetch
+                    info_group_chat_id = target["info_group_chat_id"]
+                    # 从 detail API 响应中提取语言并更新缓存
+                    if target["lang"]:
+                        _set_user_lang(user_id, str(target["lang"]))
+                        logger.info(f"[verify_flow] Updated user lang cache from detail API: uid={user_id} lang={target['lang']}")
+                    lang_hint = target["lang"] or _get_user_lang(user_id)
 
                     # 验证记录由后端管理，不需要前端保存到数据库
                     try:
                         if info_group_chat_id:
-                            logger.info(f"[verify_flow] info_group_chat_id: {info_group_chat_id}, type: {type(info_group_chat_id)}")
-                            # 确保chat_id是字符串类型
-                            chat_id_str = str(info_group_chat_id) if info_group_chat_id else None
-                            if not chat_id_str:
-                                raise ValueError("Invalid chat ID received from API")
+                            logger.info(f"[verify_flow] info_group_chat_id: {info_group_chat_id}")
+                            # 机器人需为群组管理员（结果已预取）
+                            if target["admin_error"] is not None:
+                                logger.error(f"[verify_flow] Chat check failed: {target['admin_error']}")
+                                raise target["admin_error"]
                             
-                            # 先检查群组是否存在和机器人权限
-                            try:
-                                logger.info(f"[verify_flow] Checking chat info for chat_id: {int(chat_id_str)}")
-                                chat_info = await message.bot.get_chat(int(chat_id_str))
-                                logger.info(f"[verify_flow] Chat info: {chat_info.title}, type: {chat_info.type}")
-                                
-                                # 检查机器人是否为群组管理员
-                                bot_member = await message.bot.get_chat_member(int(chat_id_str), message.bot.id)
-                                logger.info(f"[verify_flow] Bot member status: {bot_member.status}")
-                                
-                                if bot_member.status not in ['administrator', 'creator']:
-                                    logger.warning(f"[verify_flow] Bot is not admin in chat {int(chat_id_str)}, status: {bot_member.status}")
-                                    raise Exception(f"Bot is not administrator in chat {int(chat_id_str)}")
-                                
-                            except Exception as chat_check_error:
-                                logger.error(f"[verify_flow] Chat check failed: {chat_check_error}")
-                                raise chat_check_error
+                            # 检查用户是否被ban（验证成功后才查询用户状态）
+                            user_status = await _get_user_status(
+                                message.bot, int(info_group_chat_id), message.from_user.id, "verify_flow"
+                            )
+                            if user_status == "kicked":
+                                logger.warning(f"[verify_flow] User {user_id} is banned in chat {info_group_chat_id}")
+                                await _send_verify_reply(
+                                    message,
+                                    "⚠️ You are currently banned from the group. Please contact an administrator to be unbanned first.",
+                                )
+                                return
                             
-                            # 检查用户是否被ban
+                            logger.info(f"[verify_flow] Acquiring invite link from pool for chat_id: {info_group_chat_id}")
                             try:
-                                user_member = await message.bot.get_chat_member(int(chat_id_str), message.from_user.id)
-                                logger.info(f"[verify_flow] User member status: {user_member.status}")
-                                
-                                if user_member.status == "kicked":
-                                    logger.warning(f"[verify_flow] User {message.from_user.id} is banned in chat {int(chat_id_str)}")
-                                    await message.bot.send_message(
-                                        chat_id=message.chat.id,
-                                        text="⚠️ You are currently banned from the group. Please contact an administrator to be unbanned first.",
-                                        parse_mode=None
-                                    )
-                                    return
-                            except Exception as member_check_error:
-                                logger.warning(f"[verify_flow] Could not check user member status: {member_check_error}")
-                                # 继续执行，可能是用户不在群组中
-                            
-                            logger.info(f"[verify_flow] About to call create_chat_invite_link with chat_id: {int(chat_id_str)}")
-                            try:
-                                invite_link = await message.bot.create_chat_invite_link(
-                                    chat_id=int(chat_id_str),  # Telegram API需要整数类型
-                                    name=f"Invite for {message.from_user.full_name}",
-                                    member_limit=1,  # 單次可用
-                                )
-                                logger.info(f"[verify_flow] Successfully created invite link: {invite_link.invite_link}")
-                                
-                                # 验证记录由后端管理，不需要前端保存到数据库
-                                logger.info(f"[verify_flow] Original API response: {response_data['data']}")
-                                logger.info(f"[verify_flow] User full name: {message.from_user.full_name}")
+                                # 從連結池取出單次可用的連結，池空時才即時建立
+                                invite_url = await invite_link_pool.acquire(message.bot, info_group_chat_id, message.from_user.id)
+                                logger.info(f"[verify_flow] Acquired invite link: {invite_url}")
                                 
                                 msg_text = _replace_placeholders(
                                     msg_text or "",
-                                    link=invite_link.invite_link,
+                                    link=invite_url,
                                     user_mention=f"@{message.from_user.full_name}",
                                     admin_mention="@admin",
                                 )
                                 logger.info(f"[verify_flow] Final message after replacement: {msg_text!r}")
-                                logger.info(f"[verify_flow] Final message length: {len(msg_text)}")
-                                await message.bot.send_message(chat_id=message.chat.id, text=msg_text, parse_mode="HTML")
+                                await _send_verify_reply(message, msg_text, parse_mode="HTML")
                             except Exception as invite_error:
                                 logger.error(f"[verify_flow] Failed to create invite link: {invite_error}")
-                                # 验证记录由后端管理，不需要前端保存到数据库
-                                
-                                # 使用后端返回的消息，但替换 {Approval Link} 为本地化的错误提示
-                                import re
-                                # 获取语言提示
-                                lang_hint = None
-                                try:
-                                    if isinstance(detail_data.get("data"), dict):
-                                        lang_hint = detail_data.get("data", {}).get("lang")
-                                except Exception:
-                                    pass
-                                if not lang_hint:
-                                    lang_hint = _get_user_lang(str(message.from_user.id))
-                                
-                                # 获取本地化的错误提示
-                                error_note = _get_localized_invite_link_error_msg(lang_hint)
-                                
-                                # 替换 {Approval Link} 为错误提示
-                                success_message = re.sub(
-                                    r"\{\s*Approval\s+Link\s*\}", 
-                                    f"\n\n{error_note}", 
-                                    msg_text or "", 
-                                    flags=re.IGNORECASE
-                                )
-                                
-                                # 如果消息中没有 {Approval Link}，则在末尾添加错误提示
-                                if not re.search(r"\{\s*Approval\s+Link\s*\}", msg_text or "", re.IGNORECASE):
-                                    success_message = (msg_text or "") + f"\n\n{error_note}"
-                                
-                                # 替换用户名占位符
-                                success_message = success_message.replace("@{username}", f"@{message.from_user.full_name}")
-                                success_message = _replace_placeholders(
-                                    success_message,
-                                    link=None,
-                                    user_mention=f'<a href="tg://user?id={message.from_user.id}">{message.from_user.full_name}</a>',
-                                    admin_mention="@admin",
+                                await _send_verify_reply(
+                                    message,
+                                    _build_invite_error_message(msg_text, lang_hint, message.from_user),
+                                    parse_mode="HTML",
+                                    cacheable=False,
                                 )
-                                success_message = apply_rtl_if_needed(success_message)
-                                await message.bot.send_message(chat_id=message.chat.id, text=success_message, parse_mode="HTML")
                         else:
                             # 如果没有群组信息，只发送验证成功消息
                             logger.warning(f"[verify_flow] No group information available, sending success message only")
@@ -1142,46 +1178,15 @@ async def _perform_private_verify_flow(message: types.Message, verify_group_id:
                                 user_mention=f'<a href="tg://user?id={message.from_user.id}">{message.from_user.full_name}</a>',
                                 admin_mention="@admin",
                             )
-                            await message.bot.send_message(chat_id=message.chat.id, text=msg_text, parse_mode="HTML")
+                            await _send_verify_reply(message, msg_text, parse_mode="HTML")
                     except Exception as e:
                         logger.error(f"[pverify] 生成邀请链接失败: {e}")
-                        # 使用后端返回的消息，但替换 {Approval Link} 为本地化的错误提示
-                        import re
-                        # 获取语言提示
-                        lang_hint = None
-                        try:
-                            if isinstance(detail_data.get("data"), dict):
-                                lang_hint = detail_data.get("data", {}).get("lang")
-                        except Exception:
-                            pass
-                        if not lang_hint:
-                            lang_hint = _get_user_lang(str(message.from_user.id))
-                        
-                        # 获取本地化的错误提示
-                        error_note = _get_localized_invite_link_error_msg(lang_hint)
-                        
-                        # 替换 {Approval Link} 为错误提示
-                        success_message = re.sub(
-                            r"\{\s*Approval\s+Link\s*\}", 
-                            f"\n\n{error_note}", 
-                            msg_text or "", 
-                            flags=re.IGNORECASE
-                        )
-                        
-                        # 如果消息中没有 {Approval Link}，则在末尾添加错误提示
-                        if not re.search(r"\{\s*Approval\s+Link\s*\}", msg_text or "", re.IGNORECASE):
-                            success_message = (msg_text or "") + f"\n\n{error_note}"
-                        
-                        # 替换用户名占位符
-                        success_message = success_message.replace("@{username}", f"@{message.from_user.full_name}")
-                        success_message = _replace_placeholders(
-                            success_message,
-                            link=None,
-                            user_mention=f'<a href="tg://user?id={message.from_user.id}">{message.from_user.full_name}</a>',
-                            admin_mention="@admin",
+                        await _send_verify_reply(
+                            message,
+                            _build_invite_error_message(msg_text, lang_hint, message.from_user),
+                            parse_mode="HTML",
+                            cacheable=False,
                         )
-                        success_message = apply_rtl_if_needed(success_message)
-                        await message.bot.send_message(chat_id=message.chat.id, text=success_message, parse_mode="HTML")
                 else:
                     error_message = _get_api_message_text(response_data)
                     if not error_message:
@@ -1197,20 +1202,21 @@ async def _perform_private_verify_flow(message: types.Message, verify_group_id:
                         admin_mention="@admin",
                     )
                     # 清理HTML标签并发送错误消息
-                    import re
                     clean_error = re.sub(r'<[^>]*>', '', error_message)
                     clean_error = re.sub(r'https://[^\s]+', r'<a href="\g<0>">\g<0></a>', clean_error)
-                    await message.bot.send_message(chat_id=message.chat.id, text=clean_error, parse_mode="HTML")
+                    await _send_verify_reply(message, clean_error, parse_mode="HTML")
+            finally:
+                _discard_tasks(prefetch)
     except Exception as e:
         logger.error(f"_perform_private_verify_flow error: {e}")
         logger.error(f"_perform_private_verify_flow error type: {type(e)}")
         import traceback
         logger.error(f"_perform_private_verify_flow traceback: {traceback.format_exc()}")
         try:
-            await message.bot.send_message(
-                chat_id=message.chat.id,
-                text="Verification failed due to an error. Please try again later.",
-                parse_mode=None
+            await _send_verify_reply(
+                message,
+                "Verification failed due to an error. Please try again later.",
+                cacheable=False,
             )
         except Exception as send_error:
             logger.error(f"Failed to send error message: {send_error}")
@@ -1233,24 +1239,14 @@ def handle_stop_signal():
     stop_event.set()
 
 async def load_active_groups():
-
-    global group_chat_ids
-
-    # 使用 set 来避免重复元素
-    group_chat_ids.clear()
-
+    """启动时按页载入活跃群组与 bot 群组关系"""
     try:
         # 添加超時處理
-        active_groups = await asyncio.wait_for(get_active_groups(), timeout=10.0)
-        group_chat_ids.update(active_groups)
-        logger.info(f"从数据库加载了{len(active_groups)}个活跃群组")
-
+        await asyncio.wait_for(group_registry.load(), timeout=30.0)
     except asyncio.TimeoutError:
-        logger.error("加载活跃群组超时，使用空列表")
-        group_chat_ids.update([])
+        logger.error(f"加载活跃群组超时，已载入 {len(group_registry)} 个")
     except Exception as e:
-        logger.error(f"加载活跃群组异常：{e}，使用空列表")
-        group_chat_ids.update([])
+        logger.error(f"加载活跃群组异常：{e}")
 
 @router.my_chat_member()
 async def handle_my_chat_member(event: ChatMemberUpdated):
@@ -1273,22 +1269,31 @@ async def handle_my_chat_member(event: ChatMemberUpdated):
         logger.info(f"Old Status: {old_status}")
         logger.info(f"New Status: {new_status}")
 
+        # Bot 進出群組時，群組配置可能已在後台變更，重新分類
+        chat_classifier.invalidate(chat.id)
+        group_metadata.invalidate(chat.id)
+        invalidate_bot_detail(bot_username=await get_bot_display_name(event.bot))
+        if new_status:
+            bot_admin_cache.set_status(event.bot.id, chat.id, new_status)
+            if new_status not in ("administrator", "creator"):
+                invite_link_pool.invalidate(event.bot.id, chat.id)
+
+        # 只改記憶體，DB 寫入由 group_registry 背景批量完成
         if new_status in ['kicked', 'left']:
-            group_chat_ids.discard(str(chat.id))
-            await deactivate_group(chat.id)
-            logger.warning(f"Bot 被移除或離開群組: {chat.id}")
+            deactivated = group_registry.left(event.bot.id, chat.id)
+            logger.warning(f"Bot {event.bot.id} 被移除或離開群組: {chat.id}" + ("，群組已停用" if deactivated else "，仍有其他 bot 在群內"))
 
         elif new_status == 'member' or new_status == "administrator":
-            await insert_or_update_group(
-                chat_id=chat.id,
+            group_registry.joined(
+                event.bot.id,
+                chat.id,
                 title=chat.title,
                 group_type=chat.type,
-                username=chat.username
+                username=chat.username,
             )
-            group_chat_ids.add(str(chat.id))
-            logger.info(f"Bot 加入新群組: {chat.id}")
+            logger.info(f"Bot {event.bot.id} 加入新群組: {chat.id}")
 
-        logger.info(f"目前追蹤的群組數量: {len(group_chat_ids)}")
+        logger.info(f"目前追蹤的群組數量: {len(group_registry)}")
 
     except Exception as e:
         logger.error(f"處理群組事件時發生錯誤: {e}")
@@ -1296,9 +1301,9 @@ async def handle_my_chat_member(event: ChatMemberUpdated):
 @router.message(Command("groups"))
 async def list_groups(message: types.Message):
     """列出目前追蹤的群組"""
-    groups_list = "\n".join([str(group_id) for group_id in group_chat_ids])
+    groups_list = "\n".join([str(group_id) for group_id in group_registry])
     logger.info(f"目前追蹤的群組ID:\n{groups_list or '無群組'}")
-    await message.reply(f"目前追蹤的群組數量: {len(group_chat_ids)}")
+    await message.reply(f"目前追蹤的群組數量: {len(group_registry)}")
 
 async def generate_invite_link(bot: Bot, chat_id: int) -> str:
     """
@@ -1313,31 +1318,16 @@ async def generate_invite_link(bot: Bot, chat_id: int) -> str:
         logging.error(f"生成邀请链接失败: {e}")
         return None
 
-async def delete_message_after_delay(bot: Bot, chat_id: int, message_id: int, delay: int):
-    """延迟删除指定消息（使用傳入的 Bot 實例）"""
-    try:
-        await asyncio.sleep(delay)
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-        logger.info(f"消息已成功删除，Chat ID: {chat_id}, Message ID: {message_id}")
-    except Exception as e:
-        logger.error(f"删除消息时发生错误: {e}")
-
 @router.message(Command("verify"))
-async def handle_verify_command(message: types.Message):
+async def handle_verify_command(message: types.Message, bot_ctx: BotContext):
     """处理 /verify 指令，并调用 verify 接口"""
 
     try:
-        # 記錄活動
-        try:
-            bot_manager.record_activity(message.bot.id)
-        except Exception:
-            pass
-
         # 分割指令以提取验证码
         command_parts = message.text.split()
         if len(command_parts) < 2:
             # 获取语言并显示本地化的提示消息
-            current_brand = bot_manager.get_brand_by_bot_id(message.bot.id, DEFAULT_BRAND)
+            current_brand = bot_ctx.brand
             lang_hint = None
             
             # 如果是群聊，尝试获取群组语言
@@ -1367,10 +1357,7 @@ async def handle_verify_command(message: types.Message):
             else:
                 lang_hint = _get_user_lang(str(message.from_user.id))
                 if not lang_hint:
-                    try:
-                        lang_hint = await _fetch_lang_from_detail_by_bot(message.bot, current_brand)
-                    except Exception:
-                        lang_hint = None
+                    lang_hint = bot_ctx.detail_lang
             
             # 获取本地化的提示消息
             prompt_msg = _get_localized_verify_code_prompt(lang_hint)
@@ -1383,7 +1370,7 @@ async def handle_verify_command(message: types.Message):
             return
 
         verify_code = command_parts[1]
-        current_brand = bot_manager.get_brand_by_bot_id(message.bot.id, DEFAULT_BRAND)
+        current_brand = bot_ctx.brand
         
         # 防呆：如果是私聊，统一走私聊验证流程（VERIFY_API_BY_BOT）
         if message.chat.type == "private":
@@ -1391,7 +1378,7 @@ async def handle_verify_command(message: types.Message):
             # 获取 verify_group_id（如果有的话，从 pending 状态或从 /start 时获取）
             verify_group_id = _PENDING_VERIFY_GID.get(str(message.from_user.id))
             # 调用私聊验证流程
-            await _perform_private_verify_flow(message, verify_group_id, verify_code, current_brand)
+            await _throttled_private_verify(message, verify_group_id, verify_code, current_brand)
             # 清除 pending 状态
             if str(message.from_user.id) in _PENDING_VERIFY_GID:
                 _PENDING_VERIFY_GID.pop(str(message.from_user.id), None)
@@ -1472,16 +1459,13 @@ async def handle_verify_command(message: types.Message):
                         if not chat_id_int:
                             raise ValueError("Invalid chat ID received from API")
                         
-                        invite_link = await message.bot.create_chat_invite_link(
-                            chat_id=chat_id_int,
-                            name=f"Invite for {message.from_user.full_name}",
-                            member_limit=1,  # 單次可用
-                        )
+                        # 從連結池取出單次可用的連結，池空時才即時建立
+                        invite_url = await invite_link_pool.acquire(message.bot, chat_id_int, message.from_user.id)
 
                         # 验证记录由后端管理，不需要前端保存到数据库
                         msg_text = _replace_placeholders(
                             msg_text or "",
-                            link=invite_link.invite_link,
+                            link=invite_url,
                             user_mention=user_mention,
                             admin_mention=admin_mention,
                         )
@@ -1491,8 +1475,8 @@ async def handle_verify_command(message: types.Message):
                             text=msg_text,
                             parse_mode="HTML"
                         )
-                        asyncio.create_task(delete_message_after_delay(message.bot, response_message.chat.id, response_message.message_id, 60))
-                        logger.info(f"消息已发送并将在 10 分钟后自动删除，消息 ID: {response_message.message_id}")
+                        deletion_scheduler.schedule(message.bot, response_message.chat.id, response_message.message_id, 60)
+                        logger.info(f"消息已发送并将在 60 秒后自动删除，消息 ID: {response_message.message_id}")
 
                     except Exception as e:
                         logger.error(f"生成邀请链接失败: {e}")
@@ -1539,10 +1523,7 @@ async def handle_verify_command(message: types.Message):
                     # 将接口的返回数据直接返回给用户（兼容 data/msg 結構）；若無則本地多語兜底
                     error_message = _get_api_message_text(response_data)
                     if not error_message:
-                        try:
-                            lang_hint = await _fetch_lang_from_detail_by_bot(message.bot, current_brand)
-                        except Exception:
-                            lang_hint = None
+                        lang_hint = bot_ctx.detail_lang
                         if not lang_hint:
                             # 先用群語言緩存
                             lang_hint = _get_group_lang(str(message.chat.id))
@@ -1574,14 +1555,9 @@ async def handle_verify_command(message: types.Message):
         )
 
 @router.message(Command("pverify"))
-async def handle_private_verify_command(message: types.Message):
+async def handle_private_verify_command(message: types.Message, bot_ctx: BotContext):
     """私聊驗證：/pverify <verify_group_id> <code>，僅允許在私聊使用。"""
     try:
-        # 記錄活動
-        try:
-            bot_manager.record_activity(message.bot.id)
-        except Exception:
-            pass
         if message.chat.type != "private":
             await message.reply("This command can only be used in private chat.")
             return
@@ -1593,7 +1569,7 @@ async def handle_private_verify_command(message: types.Message):
 
         verify_group_id = parts[1]
         verify_code = parts[2]
-        current_brand = bot_manager.get_brand_by_bot_id(message.bot.id, DEFAULT_BRAND)
+        current_brand = bot_ctx.brand
 
         user_id = str(message.from_user.id)
         user_mention = f'<a href="tg://user?id={user_id}">{message.from_user.full_name}</a>'
@@ -1602,7 +1578,7 @@ async def handle_private_verify_command(message: types.Message):
         admin_mention = "@admin"  # 私聊情境無法取得群擁有者
 
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        bot_name_for_api = await get_bot_display_name(message.bot)
+        bot_name_for_api = bot_ctx.display_name
         verify_payload = {
             "code": verify_code,
             "brand": current_brand,
@@ -1629,23 +1605,15 @@ async def handle_private_verify_command(message: types.Message):
                 _has_success_token = "verification successful" in _msg_lower
                 _has_approval_placeholder = bool(_re.search(r"\{\s*approval\s+link\s*\}", msg_text or "", _re.I))
                 if response.status == 200 and (_has_success_token or _has_approval_placeholder):
-                    detail_payload = {
-                        "brand": current_brand,
-                        "type": "TELEGRAM",
-                        "botUsername": bot_name_for_api,
-                    }
-                    if verify_group_id:
-                        detail_payload["verifyGroup"] = verify_group_id
-                    async with session_http.post(DETAIL_API_BY_BOT, headers=headers, data=detail_payload) as detail_response:
-                        detail_data = await detail_response.json()
-                        verify_group_chat_id = detail_data.get("data").get("verifyGroup")
-                        info_group_chat_id = detail_data.get("data").get("socialGroup")
-                        # 从 detail API 响应中提取语言并更新用户语言缓存
-                        if isinstance(detail_data.get("data"), dict):
-                            lang_from_detail = detail_data.get("data", {}).get("lang")
-                            if lang_from_detail:
-                                _set_user_lang(str(message.from_user.id), str(lang_from_detail))
-                                logger.info(f"[pverify] Updated user lang cache from detail API: uid={message.from_user.id} lang={lang_from_detail}")
+                    detail_data = await detail_cache.get(current_brand, bot_name_for_api, verify_group_id)
+                    verify_group_chat_id = detail_data.get("data").get("verifyGroup")
+                    info_group_chat_id = detail_data.get("data").get("socialGroup")
+                    # 从 detail API 响应中提取语言并更新用户语言缓存
+                    if isinstance(detail_data.get("data"), dict):
+                        lang_from_detail = detail_data.get("data", {}).get("lang")
+                        if lang_from_detail:
+                            _set_user_lang(str(message.from_user.id), str(lang_from_detail))
+                            logger.info(f"[pverify] Updated user lang cache from detail API: uid={message.from_user.id} lang={lang_from_detail}")
 
                     try:
                         # 确保chat_id是整数类型
@@ -1653,16 +1621,13 @@ async def handle_private_verify_command(message: types.Message):
                         if not chat_id_int:
                             raise ValueError("Invalid chat ID received from API")
                         
-                        invite_link = await message.bot.create_chat_invite_link(
-                            chat_id=chat_id_int,
-                            name=f"Invite for {message.from_user.full_name}",
-                            member_limit=1,  # 單次可用
-                        )
+                        # 從連結池取出單次可用的連結，池空時才即時建立
+                        invite_url = await invite_link_pool.acquire(message.bot, chat_id_int, message.from_user.id)
 
                         # 验证记录由后端管理，不需要前端保存到数据库
                         msg_text = _replace_placeholders(
                             msg_text or "",
-                            link=invite_link.invite_link,
+                            link=invite_url,
                             user_mention=user_mention,
                             admin_mention="@admin",
                         )
@@ -1715,10 +1680,7 @@ async def handle_private_verify_command(message: types.Message):
                 else:
                     error_message = _get_api_message_text(response_data)
                     if not error_message:
-                        try:
-                            lang_hint = await _fetch_lang_from_detail_by_bot(message.bot, current_brand)
-                        except Exception:
-                            lang_hint = None
+                        lang_hint = bot_ctx.detail_lang
                         error_message = _get_localized_verify_failed_msg(lang_hint)
                     error_message = _replace_placeholders(
                         error_message,
@@ -1742,11 +1704,6 @@ async def handle_private_verify_command(message: types.Message):
 async def handle_verify_shortcut(message: types.Message):
     """允許在私聊使用 /verify <code> 作為快速驗證入口（兼容需求）。"""
     try:
-        try:
-            bot_manager.record_activity(message.bot.id)
-        except Exception:
-            pass
-
         if message.chat.type != "private":
             return  # 保留原本群組 /verify
 
@@ -1773,24 +1730,19 @@ async def show_menu(message: types.Message):
 
 
 @router.message(Command("start"))
-async def handle_start(message: types.Message):
+async def handle_start(message: types.Message, bot_ctx: BotContext):
     """私聊點擊 /start 時給歡迎語與一鍵驗證按鈕。"""
     try:
         if message.chat.type != "private":
             return
-        try:
-            bot_manager.record_activity(message.bot.id)
-        except Exception:
-            pass
-
-        current_brand = bot_manager.get_brand_by_bot_id(message.bot.id, DEFAULT_BRAND)
+        current_brand = bot_ctx.brand
 
         # 先嘗試私聊模式的歡迎語：使用新的 by_bot 接口
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         chosen_verify_group = None
         welcome_message = None
         try:
-            bot_name_for_api = await get_bot_display_name(message.bot)
+            bot_name_for_api = bot_ctx.display_name
             payload_private = {
                 "brand": current_brand,
                 "type": "TELEGRAM",
@@ -1816,11 +1768,8 @@ async def handle_start(message: types.Message):
                             # 優先從 welcome 回應取語言
                             lang_hint = _lang_from_welcome_response(data)
                             if not lang_hint:
-                                # 兜底：detail_by_bot
-                                try:
-                                    lang_hint = await _fetch_lang_from_detail_by_bot(message.bot, current_brand)
-                                except Exception:
-                                    lang_hint = None
+                                # 兜底：detail_by_bot 快照
+                                lang_hint = bot_ctx.detail_lang
                             if lang_hint:
                                 _set_user_lang(str(message.from_user.id), lang_hint)
                                 logger.info(f"[start] cached user lang: uid={message.from_user.id} lang={lang_hint}")
@@ -1840,7 +1789,7 @@ async def handle_start(message: types.Message):
         inline_kb = InlineKeyboardMarkup(
             inline_keyboard=[[InlineKeyboardButton(text="Verify", callback_data=verify_callback)]]
         )
-        bot_name = await get_bot_display_name(message.bot)
+        bot_name = bot_ctx.display_name
         logger.info(f"[start] bot={bot_name}({message.bot.id}) built verify button with callback={verify_callback}")
 
         # 替換 username 並修正不合法的 HTML 標籤
@@ -1863,7 +1812,7 @@ async def handle_start(message: types.Message):
 
 
 @router.message()
-async def handle_private_free_text(message: types.Message):
+async def handle_private_free_text(message: types.Message, bot_ctx: BotContext):
     """
     私聊自由輸入處理：
     1) /verify <digits> 視為驗證請求（已由 handle_verify_shortcut 引導，這裡防禦性處理）
@@ -1884,11 +1833,6 @@ async def handle_private_free_text(message: types.Message):
         if text.startswith("/") and not text.lower().startswith("/verify") and not text.lower().startswith("/pverify"):
             return
 
-        try:
-            bot_manager.record_activity(message.bot.id)
-        except Exception:
-            pass
-
         # 若是我們用 ForceReply 彈出的提示，則更友善地解析
         is_forced_reply = message.reply_to_message and message.reply_to_message.text and _VERIFY_PROMPT_MARKER in message.reply_to_message.text
 
@@ -1907,14 +1851,14 @@ async def handle_private_free_text(message: types.Message):
             logger.warning(f"Invalid UID length: {len(code)} for code: {code}")
         
         logger.info(f"[free_text] Detected UID: {code}, user: {message.from_user.id}, pending_gid: {pending_gid}")
-        current_brand = bot_manager.get_brand_by_bot_id(message.bot.id, DEFAULT_BRAND)
+        current_brand = bot_ctx.brand
         
         # 统一处理：所有回复框消息都直接调用验证API
         try:
             # 获取verify_group_id（如果有的话）
             verify_group_id = pending_gid if pending_gid else None
             logger.info(f"[free_text] Starting verification flow for UID: {code}, verify_group_id: {verify_group_id}")
-            await _perform_private_verify_flow(message, verify_group_id, code, current_brand)
+            await _throttled_private_verify(message, verify_group_id, code, current_brand)
         except Exception as e:
             logger.error(f"[free_text] Error in verification flow: {e}")
             await message.bot.send_message(
@@ -1933,10 +1877,6 @@ async def handle_private_free_text(message: types.Message):
 async def unban_user(message: types.Message):
     """解除特定用户的 ban 状态"""
     try:
-        try:
-            bot_manager.record_activity(message.bot.id)
-        except Exception:
-            pass
         # 检查是否为允许使用该命令的管理员
         if message.from_user.id not in ALLOWED_ADMIN_IDS:
             await message.reply("❌ You do not have permission to use this command.")
@@ -1984,10 +1924,6 @@ async def unban_user(message: types.Message):
 @router.message(Command("getid"))
 async def get_user_id(message: types.Message):
     """返回用户的 Telegram ID"""
-    try:
-        bot_manager.record_activity(message.bot.id)
-    except Exception:
-        pass
     user_id = message.from_user.id  # 获取发送者的用户 ID
     full_name = message.from_user.full_name  # 获取发送者的全名
     username = message.from_user.username  # 获取发送者的用户名（如果有）
@@ -2013,20 +1949,15 @@ async def cleanup_database(message: types.Message):
             await message.reply("❌ You do not have permission to use this command.")
             return
 
-        try:
-            bot_manager.record_activity(message.bot.id)
-        except Exception:
-            pass
-
         logger.info(f"[cleanup] Starting cleanup process for admin: {message.from_user.id}")
         await message.reply("🔄 Starting to clean up duplicate verification records...")
         
         # 导入清理函数
         from db_handler_aio import cleanup_duplicate_verify_codes
-        cleaned_count = await cleanup_duplicate_verify_codes()
+        cleaned_count, elapsed = await cleanup_duplicate_verify_codes()
         
-        logger.info(f"[cleanup] Cleanup completed, cleaned {cleaned_count} records")
-        await message.reply(f"✅ Cleanup complete! Cleaned {cleaned_count} duplicate records.")
+        logger.info(f"[cleanup] Cleanup completed, cleaned {cleaned_count} records in {elapsed:.2f}s")
+        await message.reply(f"✅ Cleanup complete! Cleaned {cleaned_count} duplicate records in {elapsed:.2f}s.")
         logger.info(f"Admin {message.from_user.id} performed database cleanup, cleaned {cleaned_count} duplicate records")
 
     except Exception as e:
@@ -2036,12 +1967,8 @@ async def cleanup_database(message: types.Message):
         await message.reply(f"❌ 清理失败: {e}")
 
 @router.chat_member()
-async def handle_chat_member_event(event: ChatMemberUpdated):
+async def handle_chat_member_event(event: ChatMemberUpdated, bot_ctx: BotContext):
     try:
-        try:
-            bot_manager.record_activity(event.bot.id)
-        except Exception:
-            pass
         # 获取事件相关信息
         chat_id = event.chat.id
         user = event.new_chat_member.user  # 获取变更状态的用户信息
@@ -2053,200 +1980,167 @@ async def handle_chat_member_event(event: ChatMemberUpdated):
 
         logger.info(f"Chat ID: {chat_id}, User ID: {user_id}, Old Status: {old_status}, New Status: {new_status}")
 
-        # 定义 API URLs
-        # welcome_msg_url = "http://127.0.0.1:5002/admin/telegram/social/welcome_msg"
-        welcome_msg_url = "http://172.31.91.67:4070/admin/telegram/social/welcome_msg"
-        # social_url = "http://127.0.0.1:5002/admin/telegram/social/socials"
-        social_url = "http://172.31.91.67:4070/admin/telegram/social/socials"
-        # welcome_msg_url = "http://172.25.183.151:4070/admin/telegram/social/welcome_msg"
-        # social_url = "http://172.25.183.151:4070/admin/telegram/social/socials"
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        current_brand = bot_manager.get_brand_by_bot_id(event.bot.id, DEFAULT_BRAND)
-        payload = {"verifyGroup": str(chat_id), "brand": current_brand, "type": "TELEGRAM"}
+        current_brand = bot_ctx.brand
 
-        is_verification_group = False
-        welcome_message = None
-
-        # 获取所有资讯群 ID
-        social_groups = set()
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(SOCIAL_API, headers=headers) as response:
-                    if response.status == 200:
-                        social_data = await response.json()
-                        social_groups = {
-                            item["socialGroup"]
-                            for item in social_data.get("data", [])
-                            if "socialGroup" in item
-                        }
-                    else:
-                        logger.error(f"获取资讯群数据失败，状态码: {response.status}")
-        except Exception as e:
-            logger.error(f"调用 /socials 接口失败: {e}")
+        # 經邀請連結入群：記錄連結由誰使用（連結池發出的連結可對應到驗證用戶）
+        if event.invite_link and new_status == "member":
+            invite_link_pool.joined(event.invite_link.invite_link, user.id)
 
         if old_status != "member" and new_status == "member":
-            # 如果是验证群，调用 welcome_msg_url 检查
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(WELCOME_API, headers=headers, data=payload) as response:
-                        # 解析一次 JSON，避免多次 await
-                        resp_json = await response.json()
-                        logger.info(f"监测到用户加入群组，返回数据: {resp_json}")
-                        if response.status == 200:
-                            # 判断是否为验证群
-                            data_obj = resp_json.get("data")
-                            if data_obj:
-                                is_verification_group = True
-                                if isinstance(data_obj, dict):
-                                    # 兼容 data.msg / data.lang
-                                    welcome_message = data_obj.get("msg") or ""
-                                    lang_hint = data_obj.get("lang") or resp_json.get("lang")
-                                    if lang_hint:
-                                        _set_group_lang(str(chat_id), str(lang_hint))
-                                        logger.info(f"[group_welcome] cached group lang: gid={chat_id} lang={lang_hint}")
-                                else:
-                                    # 字串格式
-                                    welcome_message = str(data_obj)
-                            else:
-                                logger.info(f"群组 {chat_id} 不是验证群")
-                        else:
-                            # 记录详细的错误信息，但不影响后续流程
-                            error_msg = resp_json.get("message", "Unknown error")
-                            logger.error(f"验证群接口返回失败 {resp_json}，状态码: {response.status}, 错误信息: {error_msg}")
-                            # 如果返回 500 且错误信息是 "Telegram social not found"，可能是配置问题
-                            if response.status == 500 and "Telegram social not found" in str(error_msg):
-                                logger.warning(f"验证群 {chat_id} 可能未在后端配置，跳过欢迎消息处理")
-            except Exception as e:
-                logger.error(f"调用验证群接口时出错: {e}, 群组ID: {chat_id}, 品牌: {current_brand}")
-            # 如果是验证群，发送欢迎消息
-            # if is_verification_group:
-            #     user_mention = f'<a href="tg://user?id={user.id}">{user.full_name}</a>'
-            #     welcome_message = welcome_message.replace("@{username}", user_mention)
-            #     await event.bot.send_message(chat_id=chat_id, text=welcome_message, parse_mode="HTML")
-            if is_verification_group:
-                user_mention = f'<a href="tg://user?id={user.id}">{user.full_name}</a>'
-                # 替换 @{username} 占位符
-                welcome_message = welcome_message.replace("@{username}", user_mention)
-
-                # 提取 referral link（兼容 <a href> 或純文本連結，並去除尾隨標點符號）
-                def _extract_first_url(text: str) -> Optional[str]:
-                    # 先匹配超鏈接 href
-                    m = re.search(r'href=["\'](https?://[^"\']+)["\']', text)
-                    if m:
-                        return m.group(1).strip()
-                    # 再匹配純文本 URL
-                    m = re.search(r'(https?://[^\s<>")\]]+)', text)
-                    if m:
-                        url = m.group(1)
-                        # 去除常見尾隨標點
-                        url = url.rstrip('.,;!?)"\']}' )
-                        return url.strip()
-                    return None
-
-                referral_link = _extract_first_url(welcome_message)
-                if not referral_link:
+            # 群組分類（資訊群/驗證群/歡迎語）走快取，溫熱時不打上游
+            classification = await chat_classifier.classify(chat_id, current_brand)
+            if classification.lang:
+                _set_group_lang(str(chat_id), classification.lang)
+
+            # 如果是验证群，加入歡迎語批次：短時間內的入群合併成一則歡迎消息
+            if classification.is_verify_group:
+                if not classification.referral_link:
                     logger.error("Referral link 提取失败，跳过欢迎消息发送")
                     return
+                welcome_join_aggregator.add(chat_id, (user, classification))
 
-                # 清理 HTML：轉義非 HTML 標籤的尖括號（如 <UID>），保留有效的 HTML 標籤
-                def _sanitize_html_for_telegram(text: str) -> str:
-                    """清理 HTML，轉義非標準標籤的尖括號"""
-                    # Telegram 支持的 HTML 標籤列表
-                    valid_tags = ['a', 'b', 'strong', 'i', 'em', 'u', 'ins', 's', 'strike', 'del', 
-                                 'code', 'pre', 'blockquote', 'tg-spoiler']
-                    # 先保護有效的 HTML 標籤
-                    import html
-                    # 轉義所有尖括號，然後恢復有效的 HTML 標籤
-                    # 方法：先找到所有有效的 HTML 標籤並臨時替換
-                    tag_placeholders = {}
-                    tag_pattern = r'<(/?)(' + '|'.join(valid_tags) + r')(\s[^>]*)?>'
-                    counter = 0
-                    def replace_valid_tag(match):
-                        nonlocal counter
-                        placeholder = f"__TAG_PLACEHOLDER_{counter}__"
-                        tag_placeholders[placeholder] = match.group(0)
-                        counter += 1
-                        return placeholder
-                    text = re.sub(tag_pattern, replace_valid_tag, text, flags=re.IGNORECASE)
-                    # 轉義剩餘的尖括號
-                    text = html.escape(text)
-                    # 恢復有效的 HTML 標籤
-                    for placeholder, original_tag in tag_placeholders.items():
-                        text = text.replace(placeholder, original_tag)
-                    return text
-
-                # 清理歡迎消息中的 HTML
-                safe_welcome_message = _sanitize_html_for_telegram(welcome_message)
-
-                # 构建按钮
-                # button = InlineKeyboardButton(text="Register Now", url=referral_link)
-                # button_markup = InlineKeyboardMarkup(inline_keyboard=[[button]])  # 确保 inline_keyboard 是二维数组
-                reply_markup = InlineKeyboardMarkup(
-                    inline_keyboard=[
-                        [InlineKeyboardButton(text="Get Started!", url=referral_link)]
-                    ]
-                )
-
-                # 图片路径
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                image_path = os.path.join(current_dir, "..", "pics", "FindUID.jpg")
-                image_file = FSInputFile(image_path)
-                try:
-                    # 发送图片和按钮
-                    await bot.send_photo(
-                        chat_id=chat_id,
-                        photo=image_file,
-                        caption=safe_welcome_message,
-                        parse_mode="HTML",
-                        reply_markup=reply_markup,
-                    )
-                    logger.info(f"发送欢迎图片和按钮给用户 {user_mention}")
-                except Exception as e:
-                    logger.error(f"发送图片失败: {e}")
-
-            # 如果是资讯群，检查是否为验证通过的用户
-            elif str(chat_id) in social_groups:
-                
+            # 如果是资讯群，加入驗證檢查批次：整批查庫，未驗證者並行踢除
+            elif classification.is_social:
                 if user.is_bot:
                     logger.info(f"檢測到 bot {user_id} 加入资讯群 {chat_id}")
                     return
 
-                logger.info(f"[资讯群检查] 用户 {user_id} ({user.full_name}) 加入资讯群 {chat_id}，开始验证检查...")
-                
-                # 增加延迟检查，因为验证记录可能需要时间同步到数据库
-                # 先立即检查一次
-                verified_user = await get_verified_user(user_id, chat_id)
-                logger.info(f"[资讯群检查] 用户 {user_id} 首次数据库检查结果: {'已验证' if verified_user else '未验证'}")
-                
-                # 如果第一次检查未通过，等待 2 秒后再次检查（给数据库同步时间）
-                if not verified_user:
-                    logger.info(f"[资讯群检查] 用户 {user_id} 首次检查未通过，等待 2 秒后重试（可能验证记录正在同步）...")
-                    await asyncio.sleep(2)
-                    verified_user = await get_verified_user(user_id, chat_id)
-                    logger.info(f"[资讯群检查] 用户 {user_id} 二次数据库检查结果: {'已验证' if verified_user else '未验证'}")
-                
-                if not verified_user:
-                    logger.warning(f"[资讯群检查] 用户 {user_id} 在资讯群 {chat_id} 中未找到验证记录，准备踢除...")
-                    logger.warning(f"[资讯群检查] 可能的原因：1) 用户未完成验证 2) 验证记录未同步到数据库 3) info_group_id 不匹配")
-                    try:
-                        await event.bot.ban_chat_member(chat_id=chat_id, user_id=int(user_id))
-                        logger.warning(f"[资讯群检查] 已踢除未验证用户 {user_id} ({user.full_name}) 从资讯群 {chat_id}")
-                    except Exception as ban_error:
-                        logger.error(f"[资讯群检查] 踢除用户 {user_id} 时出错: {ban_error}")
-                else:
-                    # 已验证用户
-                    logger.info(f"[资讯群检查] ✓ 验证通过用户 {user_id} ({user.full_name}) 成功加入资讯群 {chat_id}")
+                logger.info(f"[资讯群检查] 用户 {user_id} ({user.full_name}) 加入资讯群 {chat_id}，排入批量验证检查")
+                social_join_aggregator.add((event.bot.id, chat_id), (event.bot, user))
 
     except Exception as e:
         logger.error(f"处理 chat_member 事件时发生错误: {e}")
 
+# Telegram 圖片 caption 上限（按解析 HTML 後的文字計，UTF-16 長度）
+TELEGRAM_CAPTION_LIMIT = 1024
+
+def _telegram_text_length(html_text: str) -> int:
+    """HTML 消息在 Telegram 端的文字長度：去掉標籤、還原實體後按 UTF-16 計。"""
+    plain = html.unescape(re.sub(r"<[^>]+>", "", html_text))
+    return len(plain.encode("utf-16-le")) // 2
+
+def _render_welcome(template: str, users) -> str:
+    user_mentions = ", ".join(
+        f'<a href="tg://user?id={u.id}">{html.escape(u.full_name)}</a>' for u in users
+    )
+    # 模板已清理過 HTML，只需替换 @{username} 占位符
+    return template.replace("@{username}", user_mentions)
+
+def _split_welcome_batches(template: str, users) -> list:
+    """按渲染後的 caption 長度切分新成員，每組的歡迎語不超過 TELEGRAM_CAPTION_LIMIT（單人超出時單獨成組）。"""
+    groups, current = [], []
+    for user in users:
+        if current and _telegram_text_length(_render_welcome(template, current + [user])) > TELEGRAM_CAPTION_LIMIT:
+            groups.append(current)
+            current = []
+        current.append(user)
+    if current:
+        groups.append(current)
+    return groups
+
+async def _send_batched_welcome(chat_id, items):
+    """
+    一批新成員合併發送歡迎消息（@{username} 替換為新成員）。
+    名字較長時按 caption 長度拆成多則；單人仍超出 caption 上限時改發文字消息（不帶圖片）。
+    """
+    users = {}
+    for user, _ in items:
+        users[user.id] = user
+    # 同一批以最新的分類結果為準
+    classification = items[-1][1]
+    template = classification.welcome_template or ""
+
+    # 构建按钮
+    # button = InlineKeyboardButton(text="Register Now", url=referral_link)
+    # button_markup = InlineKeyboardMarkup(inline_keyboard=[[button]])  # 确保 inline_keyboard 是二维数组
+    reply_markup = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="Get Started!", url=classification.referral_link)]
+        ]
+    )
+
+    # 图片路径
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    image_path = os.path.join(current_dir, "..", "pics", "FindUID.jpg")
+    for group in _split_welcome_batches(template, list(users.values())):
+        safe_welcome_message = _render_welcome(template, group)
+        try:
+            if _telegram_text_length(safe_welcome_message) <= TELEGRAM_CAPTION_LIMIT:
+                # 发送图片和按钮
+                await bot.send_photo(
+                    chat_id=chat_id,
+                    photo=FSInputFile(image_path),
+                    caption=safe_welcome_message,
+                    parse_mode="HTML",
+                    reply_markup=reply_markup,
+                )
+                logger.info(f"发送欢迎图片和按钮给 {len(group)} 位新成员，群组 {chat_id}")
+            else:
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=safe_welcome_message,
+                    parse_mode="HTML",
+                    reply_markup=reply_markup,
+                )
+                logger.warning(f"欢迎语超出 caption 长度限制，改发文字消息给 {len(group)} 位新成员，群组 {chat_id}")
+        except Exception as e:
+            logger.error(f"发送欢迎消息失败: {e}")
+
+async def _check_social_join_batch(key, items):
+    """資訊群入群批次：整批查驗證記錄，未通過者等待後複查一次，仍未通過則並行踢除。"""
+    _, chat_id = key
+    event_bot = items[0][0]
+    users = {}
+    for _, user in items:
+        users[str(user.id)] = user
+
+    verified = await get_verified_user_ids(users.keys(), chat_id)
+    pending = [uid for uid in users if uid not in verified]
+    logger.info(f"[资讯群检查] 群组 {chat_id} 批量检查 {len(users)} 人，首次未通过 {len(pending)} 人")
+
+    # 如果第一次检查未通过，等待 2 秒后再次检查（给数据库同步时间），整批只等一次
+    if pending:
+        await asyncio.sleep(2)
+        verified = await get_verified_user_ids(pending, chat_id)
+        pending = [uid for uid in pending if uid not in verified]
+
+    for uid, user in users.items():
+        if uid not in pending:
+            logger.info(f"[资讯群检查] ✓ 验证通过用户 {uid} ({user.full_name}) 成功加入资讯群 {chat_id}")
+    if not pending:
+        return
+
+    logger.warning(f"[资讯群检查] 群组 {chat_id} 有 {len(pending)} 位用户未找到验证记录，准备踢除...")
+    logger.warning(f"[资讯群检查] 可能的原因：1) 用户未完成验证 2) 验证记录未同步到数据库 3) info_group_id 不匹配")
+    sem = asyncio.Semaphore(10)
+
+    async def _ban(uid):
+        async with sem:
+            try:
+                await event_bot.ban_chat_member(chat_id=chat_id, user_id=int(uid))
+                logger.warning(f"[资讯群检查] 已踢除未验证用户 {uid} ({users[uid].full_name}) 从资讯群 {chat_id}")
+            except Exception as ban_error:
+                logger.error(f"[资讯群检查] 踢除用户 {uid} 时出错: {ban_error}")
+
+    await asyncio.gather(*(_ban(uid) for uid in pending))
+
+# 入群事件聚合：歡迎語每批最多 20 人（發送時再按 caption 長度拆分），驗證檢查每批最多 200 人
+welcome_join_aggregator = JoinAggregator(
+    _send_batched_welcome,
+    window=float(os.getenv("JOIN_BATCH_WINDOW", "2")),
+    max_batch=20,
+    name="welcome",
+)
+social_join_aggregator = JoinAggregator(
+    _check_social_join_batch,
+    window=float(os.getenv("JOIN_BATCH_WINDOW", "2")),
+    max_batch=200,
+    name="social_join",
+)
+
 @router.message(Command("send_to_topic"))
 async def send_to_specific_topic(message: types.Message):
     """測試從本地文件夾發送圖片"""
-    try:
-        bot_manager.record_activity(message.bot.id)
-    except Exception:
-        pass
     command_parts = message.text.split()
     if len(command_parts) < 4:
         await message.reply("用法：/send_local_image <群組ID> <Topic ID> <圖片文件名> <文字內容>")
@@ -2325,11 +2219,11 @@ async def handle_api_request(request, bot: Bot):
                 status=400,
             )
 
-        # 获取成员数量
+        # 获取成员数量（走快取，refresh=1 时强制从 Telegram 重新获取）
         try:
-            member_count = await bot.get_chat_member_count(chat_id)
+            meta = await group_metadata.get(chat_id, force=params.get("refresh") == "1")
             return web.json_response(
-                {"status": "success", "chat_id": chat_id, "member_count": member_count},
+                {"status": "success", "chat_id": chat_id, "member_count": meta.member_count},
                 status=200,
             )
         except Exception as e:
@@ -2342,6 +2236,40 @@ async def handle_api_request(request, bot: Bot):
         logger.error(f"API 请求处理失败: {e}")
         return web.json_response({"status": "error", "message": str(e)}, status=500)
 
+async def handle_member_counts(request: web.Request):
+    """
+    批量查询群组成员数与标题（走快取）：
+    GET ?chat_ids=1,2,3 或 POST {"chat_ids": [1, 2, 3]}
+    """
+    try:
+        if request.method == "POST":
+            raw_ids = (await request.json()).get("chat_ids") or []
+        else:
+            raw_ids = [c for c in request.query.get("chat_ids", "").split(",") if c.strip()]
+        if not raw_ids:
+            return web.json_response({"status": "error", "message": "Missing 'chat_ids' parameter."}, status=400)
+        if len(raw_ids) > MAX_MEMBER_COUNT_BATCH:
+            return web.json_response(
+                {"status": "error", "message": f"At most {MAX_MEMBER_COUNT_BATCH} chat_ids per request."},
+                status=400,
+            )
+        try:
+            chat_ids = [int(str(c).strip()) for c in raw_ids]
+        except ValueError:
+            return web.json_response({"status": "error", "message": "'chat_ids' must be integers."}, status=400)
+
+        results = await group_metadata.get_many(chat_ids)
+        data, errors = {}, {}
+        for chat_id, meta in results.items():
+            if isinstance(meta, GroupMetadata):
+                data[str(chat_id)] = meta.to_dict()
+            else:
+                errors[str(chat_id)] = str(meta)
+        return web.json_response({"status": "success", "data": data, "errors": errors})
+    except Exception as e:
+        logger.error(f"批量查询成员数量失败: {e}")
+        return web.json_response({"status": "error", "message": str(e)}, status=500)
+
 async def handle_send_announcement(request: web.Request, *, bot: Bot):
     try:
         try:
@@ -2372,113 +2300,47 @@ async def handle_send_announcement(request: web.Request, *, bot: Bot):
         # if not auth or auth != "Bearer your_api_key":
         #     return web.json_response({"status": "error", "message": "Unauthorized"}, status=401)
 
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        payload = {"brand": "BYD", "type": "TELEGRAM"}
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(SOCIAL_API, headers=headers, data=payload) as resp:
-                if resp.status != 200:
-                    return web.json_response({"status": "error", "message": "Failed to fetch social group info"}, status=500)
-                social_data = await resp.json()
-
-        results = []
-
-        async def send_to_channel(chat_id, topic_id, lang_content, lang_code):
-            try:
-                # 添加AI提示词到文案末尾
-                from multilingual_utils import AI_TRANSLATE_HINT
-                
-                # 检查是否已经包含AI提示词
-                def has_ai_hint(text):
-                    """检查文本是否已经包含 AI 提示词"""
-                    ai_hint_patterns = [
-                        "~AI翻译", "~AI 自動翻譯", "~AI Translation",
-                        "AI翻译", "AI 自動翻譯", "AI Translation",
-                        "由AI", "by AI", "AI翻訳", "AI 자동 번역",
-                        "仅供参考", "for reference", "参考用", "참고용"
-                    ]
-                    text_lower = text.lower()
-                    return any(pattern.lower() in text_lower for pattern in ai_hint_patterns)
-                
-                # 如果内容已经包含AI提示词，不再添加；英文直接不添加
-                if has_ai_hint(lang_content):
-                    final_content = lang_content
-                    logger.info(f"内容已包含AI提示词，不再添加")
-                elif str(lang_code).lower().startswith("en"):
-                    # 英文不附加 AI 提示詞
-                    final_content = lang_content
-                    logger.info(f"英文內容不添加 AI 提示詞")
-                else:
-                    # 非英文附加對應語言提示
-                    hint = AI_TRANSLATE_HINT.get(lang_code, AI_TRANSLATE_HINT["en_US"])
-                    final_content = lang_content + "\n" + hint
-                
-                # 处理HTML格式的内容
-                def process_html_content(text):
-                    """处理HTML格式的内容，确保链接和格式正确"""
-                    # 替换Markdown链接为HTML链接
-                    import re
-                    # 处理 [text](url) 格式的链接
-                    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<a href="\2">\1</a>', text)
-                    # 处理 **text** 格式的粗体
-                    text = re.sub(r'\*\*([^*]+)\*\*', r'<b>\1</b>', text)
-                    # 处理 *text* 格式的斜体
-                    text = re.sub(r'\*([^*]+)\*', r'<i>\1</i>', text)
-                    # 替换换行符
-                    text = text.replace("<br>", "\n")
-                    return text
-                
-                # 处理内容为HTML格式
-                processed_content = process_html_content(final_content)
-                # 為 RTL 語言自動加入方向控制字元（不影響可見文字）
-                processed_content = apply_rtl_if_needed(processed_content)
-                
-                logger.info(f"准备发送到频道 {chat_id}, topic {topic_id}, 语言 {lang_code}")
-                logger.info(f"内容长度: {len(processed_content)} 字符")
-                
-                if image_url:
-                    temp_file_path = f"/tmp/temp_image_{chat_id}_{topic_id}.jpg"
-                    logger.info(f"开始下载图片: {image_url}")
-                    async with aiohttp.ClientSession() as img_session:
-                        async with img_session.get(image_url) as img_resp:
-                            if img_resp.status == 200:
-                                async with aiofiles.open(temp_file_path, "wb") as f:
-                                    await f.write(await img_resp.read())
-                                file = FSInputFile(temp_file_path)
-                                logger.info(f"图片下载完成，开始发送到Telegram")
-                                await asyncio.wait_for(bot.send_photo(
-                                    chat_id=chat_id,
-                                    photo=file,
-                                    caption=processed_content,
-                                    message_thread_id=topic_id,
-                                    parse_mode="HTML"
-                                ), timeout=15.0)  # 增加超时时间到15秒
-                                os.remove(temp_file_path)
-                                logger.info(f"图片消息发送成功")
-                            else:
-                                raise Exception(f"Image fetch error {img_resp.status}")
-                else:
-                    logger.info(f"开始发送文本消息到Telegram")
-                    await asyncio.wait_for(bot.send_message(
-                        chat_id=chat_id,
-                        text=processed_content,
-                        message_thread_id=topic_id,                        
-                        parse_mode="HTML"
-                    ), timeout=15.0)  # 增加超时时间到15秒
-                    logger.info(f"文本消息发送成功")
-
-                return {"chat_id": chat_id, "topic_id": topic_id, "lang": lang_code, "status": "sent"}
-
-            except asyncio.TimeoutError:
-                logger.error(f"发送到频道 {chat_id} 超时")
-                return {"chat_id": chat_id, "topic_id": topic_id, "lang": lang_code, "status": "failed", "error": "Timeout while sending to Telegram"}
-            except Exception as e:
-                logger.error(f"发送到频道 {chat_id} 失败: {e}")
-                return {"chat_id": chat_id, "topic_id": topic_id, "lang": lang_code, "status": "failed", "error": str(e)}
+        socials_index = await socials_snapshot.get_index()
+        if socials_index is None:
+            return web.json_response({"status": "error", "message": "Failed to fetch social group info"}, status=500)
+
+        # 每個語言版本只轉換一次（AI 提示詞、Markdown -> HTML、RTL）
+        prepared_content = prepare_announcements(content_dict)
+
+        async def send_to_channel(target: dict) -> None:
+            """發送單個頻道；限速、超時與重試由 announcement_broadcaster 負責，失敗直接拋出。"""
+            chat_id = target["chat_id"]
+            topic_id = target["topic_id"]
+            lang_code = target["lang"]
+            processed_content = prepared_content[lang_code]
+
+            logger.info(f"准备发送到频道 {chat_id}, topic {topic_id}, 语言 {lang_code}")
+            logger.info(f"内容长度: {len(processed_content)} 字符")
+
+            if media:
+                # 圖片已在廣播開始前下載一次，首次上傳後其餘頻道使用 file_id
+                await media.send(lambda photo: bot.send_photo(
+                    chat_id=chat_id,
+                    photo=photo,
+                    caption=processed_content,
+                    message_thread_id=topic_id,
+                    parse_mode="HTML"
+                ))
+                logger.info(f"图片消息发送成功")
+            else:
+                logger.info(f"开始发送文本消息到Telegram")
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=processed_content,
+                    message_thread_id=topic_id,
+                    parse_mode="HTML"
+                )
+                logger.info(f"文本消息发送成功")
 
-        # 準備所有待發送的任務
-        tasks = []
-        for item in social_data.get("data", []):
+        # 準備所有待發送的目標
+        targets = []
+        # Announcements 主題直接查索引，不再掃描全部 chats
+        for item, chat in socials_index.topic("Announcements"):
             chat_id = item.get("socialGroup")
             channel_lang = item.get("lang")
             
@@ -2488,65 +2350,50 @@ async def handle_send_announcement(request: web.Request, *, bot: Bot):
                 logger.info(f"Channel {chat_id} has no language set, using default: {channel_lang}")
             
             # 查找对应的语言内容
-            lang_content = content_dict.get(channel_lang)
-            if not lang_content:
+            if channel_lang not in prepared_content:
                 logger.warning(f"No content found for language {channel_lang} in channel {chat_id}")
                 continue
             
-            for chat in item.get("chats", []):
-                if chat.get("name") == "Announcements" and chat.get("enable"):
-                    topic_id = chat.get("chatId")
-                    tasks.append(send_to_channel(chat_id, topic_id, lang_content, channel_lang))
-                    logger.info(f"Prepared announcement for channel {chat_id} (lang: {channel_lang})")
-
-        # 立即返回响应，后台异步处理发送任务
-        if tasks:
-            logger.info(f"准备后台异步发送 {len(tasks)} 个公告任务")
-            
-            # 创建后台任务处理发送
-            async def background_send_announcements():
+            topic_id = chat.get("chatId")
+            targets.append({"chat_id": chat_id, "topic_id": topic_id, "lang": channel_lang})
+            logger.info(f"Prepared announcement for channel {chat_id} (lang: {channel_lang})")
+
+        # 立即返回响应，后台并发发送（速率由 announcement_broadcaster 控制）
+        if targets:
+            media = None
+            if image_url:
+                # 整次廣播只下載一次圖片
                 try:
-                    results = []
-                    logger.info(f"开始串行发送 {len(tasks)} 个公告任务")
-                    for i, task in enumerate(tasks, 1):
-                        logger.info(f"发送第 {i}/{len(tasks)} 个公告")
-                        try:
-                            result = await task
-                            results.append(result)
-                            # 在每次发送之间添加短暂延迟，避免API限流
-                            if i < len(tasks):
-                                await asyncio.sleep(1.0)
-                        except Exception as e:
-                            logger.error(f"发送第 {i} 个公告时发生异常: {e}")
-                            results.append({"status": "failed", "error": str(e)})
-                    
-                    # 发送到 Discord 机器人
-                    try:
-                        async with aiohttp.ClientSession() as session:
-                            # 发送所有语言内容到 Discord
-                            dc_payload = {"content": content_dict, "image": image_url}
-                            async with session.post(DISCORD_BOT, json=dc_payload) as dc_resp:
-                                dc_resp_json = await dc_resp.json()
-                                logger.info(f"[TG] Discord 發送結果: {dc_resp.status} - {dc_resp_json}")
-                    except Exception as e:
-                        logger.error(f"[TG] 呼叫 Discord 發送公告時出錯: {e}")
+                    media = await BroadcastMedia.fetch(image_url)
+                except Exception as e:
+                    logger.error(f"下载公告图片失败: {image_url}, {e}")
+                    return web.json_response({"status": "error", "message": f"Failed to fetch image: {e}"}, status=502)
+            try:
+                job = announcement_broadcaster.start(targets, send_to_channel, announcement_id=data.get("announcement_id"))
+            except ValueError as e:
+                return web.json_response({"status": "error", "message": str(e)}, status=409)
+            logger.info(f"公告 {job.announcement_id} 已排入背景發送，共 {len(targets)} 個頻道")
 
-                    # 统计发送结果
-                    success_count = sum(1 for r in results if r.get("status") == "sent")
-                    failed_count = len(results) - success_count
-                    
-                    logger.info(f"[TG] 公告發送完成: 成功 {success_count}/{len(results)} 個頻道")
-                    
+            async def send_to_discord():
+                # Discord 與 Telegram 的發送互不依賴，同時進行
+                try:
+                    async with aiohttp.ClientSession() as session:
+                        # 发送所有语言内容到 Discord
+                        dc_payload = {"content": content_dict, "image": image_url}
+                        async with session.post(DISCORD_BOT, json=dc_payload) as dc_resp:
+                            dc_resp_json = await dc_resp.json()
+                            logger.info(f"[TG] Discord 發送結果: {dc_resp.status} - {dc_resp_json}")
                 except Exception as e:
-                    logger.error(f"后台发送公告时发生错误: {e}")
-            
-            # 启动后台任务
-            asyncio.create_task(background_send_announcements())
+                    logger.error(f"[TG] 呼叫 Discord 發送公告時出錯: {e}")
+
+            asyncio.create_task(send_to_discord())
             
             return web.json_response({
                 "status": "success", 
-                "message": f"公告信息佇列中... {len(tasks)} 個頻道將在背景中處理.", 
-                "queued_count": len(tasks)
+                "message": f"公告信息佇列中... {len(targets)} 個頻道將在背景中處理.", 
+                "queued_count": len(targets),
+                "announcement_id": job.announcement_id,
+                "status_url": f"/api/announcement_status/{job.announcement_id}",
             }, status=200)
         else:
             logger.warning("No announcement tasks prepared")
@@ -2562,11 +2409,50 @@ async def handle_send_announcement(request: web.Request, *, bot: Bot):
         logger.error(f"詳細錯誤: {traceback.format_exc()}")
         return web.json_response({"status": "error", "message": str(e)}, status=500)
 
+async def handle_posts_notify(request: web.Request):
+    """CMS 文章就緒時呼叫，立即觸發一輪拉取並發布。"""
+    article_publisher.notify()
+    return web.json_response({"status": "success", "message": "Publish triggered"})
+
+async def handle_announcement_status(request: web.Request):
+    """查詢公告廣播進度：sent/failed/remaining 與預估剩餘時間。"""
+    announcement_id = request.match_info.get("announcement_id", "")
+    job = announcement_broadcaster.get(announcement_id)
+    if job is None:
+        return web.json_response({"status": "error", "message": "Announcement not found"}, status=404)
+    return web.json_response({"status": "success", "data": job.snapshot(announcement_broadcaster.limiter)})
+
+def _is_authorized(request: web.Request) -> bool:
+    """Authorization: Bearer <BOT_REGISTER_API_KEY>（未配置 key 時一律拒絕）。"""
+    auth = request.headers.get("Authorization", "")
+    return bool(BOT_REGISTER_API_KEY) and auth.startswith("Bearer ") and auth.split(" ", 1)[1] == BOT_REGISTER_API_KEY
+
+async def handle_db_health(request: web.Request):
+    """
+    數據庫健康檢查：SELECT 1 延遲 + 連接池狀態與指標；數據庫不可用時返回 503。
+    錯誤文字可能帶主機名/庫名/SQL，只在 Bearer 認證後返回；未認證時只有狀態與計數。
+    """
+    authorized = _is_authorized(request)
+    data = pool_status()
+    if not authorized:
+        data["stats"].pop("last_error", None)
+    try:
+        data["ping_ms"] = round(await asyncio.wait_for(ping_database(), timeout=5.0), 2)
+    except Exception as e:
+        data["ping_error"] = f"{type(e).__name__}: {e}" if authorized else type(e).__name__
+        return web.json_response({"status": "error", "data": data}, status=503)
+    return web.json_response({"status": "success", "data": data})
+
 async def start_aiohttp_server(bot: Bot, manager: BotManager):
     """启动 HTTP API 服务器"""
     app = web.Application()
     app.router.add_get("/api/get_member_count", lambda request: handle_api_request(request, bot))
+    app.router.add_get("/api/get_member_counts", handle_member_counts)
+    app.router.add_post("/api/get_member_counts", handle_member_counts)
     app.router.add_post("/api/send_announcement", partial(handle_send_announcement, bot=bot))
+    app.router.add_get("/api/announcement_status/{announcement_id}", handle_announcement_status)
+    app.router.add_post("/api/posts/notify", handle_posts_notify)
+    app.router.add_get("/api/health/db", handle_db_health)
     
     app.router.add_post("/api/send_copy_signal", partial(handle_send_copy_signal, bot=bot))
     app.router.add_post("/api/completed_trade", partial(handle_trade_summary, bot=bot))
@@ -2576,10 +2462,35 @@ async def start_aiohttp_server(bot: Bot, manager: BotManager):
 
     # 多 Bot 管理端點
     async def _require_auth(request: web.Request):
-        auth = request.headers.get("Authorization", "")
-        if not BOT_REGISTER_API_KEY or not auth.startswith("Bearer ") or auth.split(" ", 1)[1] != BOT_REGISTER_API_KEY:
+        if not _is_authorized(request):
             raise web.HTTPUnauthorized()
 
+    async def handle_invalidate_detail_cache(request: web.Request):
+        """後台修改 bot 配置後清除 DETAIL 快取；brand / botUsername 都不傳時清除全部。"""
+        await _require_auth(request)
+        try:
+            payload = await request.json() if request.can_read_body else {}
+        except Exception:
+            return web.json_response({"status": "error", "message": "Invalid JSON"}, status=400)
+        removed = invalidate_bot_detail(payload.get("brand"), payload.get("botUsername"))
+        return web.json_response({"status": "success", "removed": removed})
+
+    async def handle_invalidate_verification_index(request: web.Request):
+        """其他進程停用/刪除驗證記錄後通知：按 userId 和/或 verifyCode 清除驗證索引，之後的查詢回退查庫。"""
+        await _require_auth(request)
+        try:
+            payload = await request.json() if request.can_read_body else {}
+        except Exception:
+            return web.json_response({"status": "error", "message": "Invalid JSON"}, status=400)
+        user_ids = payload.get("userIds") or ([payload["userId"]] if payload.get("userId") else [])
+        verify_codes = payload.get("verifyCodes") or ([payload["verifyCode"]] if payload.get("verifyCode") else [])
+        if not user_ids and not verify_codes:
+            return web.json_response({"status": "error", "message": "Missing userId or verifyCode"}, status=400)
+        for user_id in user_ids:
+            verification_index.remove(user_id)
+        removed = len(user_ids) + sum(verification_index.remove_code(code) for code in verify_codes)
+        return web.json_response({"status": "success", "removed": removed})
+
     async def handle_register_bot(request: web.Request):
         try:
             payload = await request.json()
@@ -2595,27 +2506,6 @@ async def start_aiohttp_server(bot: Bot, manager: BotManager):
             return web.json_response({"status": "error", "message": "Invalid brand."}, status=400)
 
         try:
-            def _router_factory():
-                # 為動態 Bot 構建新的 Router，註冊相同的 handlers（避免重複附加已存在的 router 實例）
-                r = Router()
-                # group/private verify
-                r.message.register(handle_verify_command, Command("verify"))
-                r.message.register(handle_private_verify_command, Command("pverify"))
-                r.message.register(handle_verify_shortcut, Command("verify"))
-                # menu + start + free text
-                r.message.register(show_menu, Command("menu"))
-                r.message.register(handle_start, Command("start"))
-                r.message.register(handle_private_free_text)
-                # admin utils
-                r.message.register(unban_user, Command("unban"))
-                r.message.register(get_user_id, Command("getid"))
-                # chat member events
-                r.chat_member.register(handle_chat_member_event)
-                r.my_chat_member.register(handle_my_chat_member)
-                # callback handlers
-                r.callback_query.register(handle_inline_callbacks)
-                return r
-
             result = await manager.register_and_start_bot(
                 token=token,
                 brand=brand,
@@ -2626,7 +2516,6 @@ async def start_aiohttp_server(bot: Bot, manager: BotManager):
                 # 低頻保活：不自動停用（max_idle_seconds=None）
                 max_idle_seconds=None,
                 idle_check_interval=3600,
-                router_factory=_router_factory,
             )
             # 持久化這個代理 bot，方便重啟恢復
             try:
@@ -2713,6 +2602,8 @@ async def start_aiohttp_server(bot: Bot, manager: BotManager):
             return web.json_response({"status": "error", "message": str(e)}, status=500)
 
     app.router.add_post("/api/bots/register", handle_register_bot)
+    app.router.add_post("/api/detail_cache/invalidate", handle_invalidate_detail_cache)
+    app.router.add_post("/api/verification_index/invalidate", handle_invalidate_verification_index)
     app.router.add_get("/api/bots/list", handle_list_bots)
     app.router.add_post("/api/bots/stop", handle_stop_bot)
     app.router.add_post("/api/bots/stop_by_token", handle_stop_bot_by_token)
@@ -2731,20 +2622,9 @@ async def start_aiohttp_server(bot: Bot, manager: BotManager):
     return runner, app
 
 async def periodic_task(bot: Bot):
-    """周期性任务，每30秒检查未发布文章并发布"""
-
-    headers = {"Content-Type": "application/json"}
-
+    """文章發布任務：由 /api/posts/notify 推送觸發，輪詢僅作自適應間隔的兜底"""
     try:
-        while True:
-            posts_list = await fetch_unpublished_posts(MESSAGE_API_URL, headers)
-
-            if posts_list:
-                await publish_posts(bot, posts_list, UPDATE_MESSAGE_API_URL, headers)
-
-            # 将 sleep 逻辑分解为更小的间隔，响应性更好
-            for _ in range(30):  # 分解成 30 次 1 秒的 sleep
-                await asyncio.sleep(1)
+        await article_publisher.run()
     except asyncio.CancelledError:
         logger.info("周期性任务被取消，正在退出...")
         raise
@@ -2774,12 +2654,22 @@ def _cleanup_expired_lang_cache():
     if expired_user_keys or expired_group_keys:
         logger.debug(f"清理了 {len(expired_user_keys)} 个用户语言缓存、{len(expired_group_keys)} 个群组语言缓存")
 
+# 验证用户索引的全量重载间隔（秒）；平时靠 add_verified_user 写穿和查库回填保持一致
+VERIFY_INDEX_REFRESH_SECONDS = float(os.getenv("VERIFY_INDEX_REFRESH", "1800"))
+
 async def cache_cleanup_task():
-    """定期清理去重缓存和语言缓存的任务"""
+    """定期清理去重缓存和语言缓存的任务，并定期重载验证用户索引"""
     try:
         while True:
             await cleanup_dedup_cache()
             _cleanup_expired_lang_cache()
+            chat_classifier.cleanup()
+            group_metadata.cleanup()
+            bot_admin_cache.cleanup()
+            detail_cache.cleanup()
+            verify_throttle.cleanup()
+            if time.time() - verification_index.warmed_at >= VERIFY_INDEX_REFRESH_SECONDS:
+                await warm_verification_index()
             # 每1分钟清理一次缓存
             await asyncio.sleep(60)
     except asyncio.CancelledError:
@@ -2791,11 +2681,28 @@ async def main():
     try:
         logger.info("开始启动 Telegram Bot...")
         
+        # 本地 sqlite 库首次使用时按模型建表（MySQL 表结构由 schema_migrations.py 管理）
+        if get_engine().dialect.name == "sqlite":
+            await init_schema()
+        else:
+            await ensure_schema()
+
         logger.info("加载活跃群组...")
         await load_active_groups()
         
         logger.info("设置路由器...")
         dp.include_router(router)
+        # 所有代理 bot 共用同一份 handler 表，只建立一次
+        bot_manager.attach_router(_build_agent_router())
+        # 分派時注入 bot_ctx（品牌、顯示名稱、語言快照），主 Bot 與代理 Bot 共用
+        bot_ctx_middleware = BotContextMiddleware(
+            bot_manager,
+            default_brand=DEFAULT_BRAND,
+            lang_loader=_load_lang_from_detail_by_bot,
+            lang_ttl=_LANG_CACHE_TTL_SECONDS,
+        )
+        dp.update.outer_middleware(bot_ctx_middleware)
+        bot_manager.dispatcher.update.outer_middleware(bot_ctx_middleware)
         
         logger.info("创建心跳任务...")
         heartbeat_task = asyncio.create_task(heartbeat(bot, interval=600))
@@ -2806,6 +2713,22 @@ async def main():
         logger.info("创建缓存清理任务...")
         cache_cleanup_task_instance = asyncio.create_task(cache_cleanup_task())
 
+        logger.info("创建群组资讯刷新任务...")
+        group_metadata_task = asyncio.create_task(group_metadata.run(lambda: list(group_registry)))
+
+        logger.info("创建群组注册表写入任务...")
+        group_registry_task = asyncio.create_task(group_registry.run())
+
+        logger.info("创建邀请链接池补充任务...")
+        invite_link_pool_task = asyncio.create_task(invite_link_pool.run())
+
+        logger.info("创建定时删除消息任务...")
+        deletion_scheduler.load()
+        deletion_scheduler_task = asyncio.create_task(deletion_scheduler.run())
+
+        logger.info("创建代理 bot 存储写入任务...")
+        agent_registry_task = asyncio.create_task(agent_registry.run())
+
         logger.info("启动 HTTP API 服务器...")
         http_server_runner, _ = await start_aiohttp_server(bot, bot_manager)
 
@@ -2825,6 +2748,11 @@ async def main():
             heartbeat_task, 
             periodic_task_instance, 
             cache_cleanup_task_instance,
+            group_metadata_task,
+            group_registry_task,
+            invite_link_pool_task,
+            deletion_scheduler_task,
+            agent_registry_task,
             polling_task,
             return_exceptions=True
         )
@@ -2867,8 +2795,7 @@ async def main():
         
         # 关闭数据库连接
         try:
-            from db_handler_aio import engine
-            await engine.dispose()
+            await dispose_engine()
             logger.info("数据库连接已关闭")
         except Exception as e:
             logger.error(f"关闭数据库连接时出错: {e}")
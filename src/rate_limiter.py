@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, TypeVar, Union
+
+from aiogram.exceptions import TelegramRetryAfter
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TelegramRateLimiter:
+    """
+    Telegram Bot API 發送限速（每個 bot 一份）：
+    - 全域：預設 30 則/秒，按固定間隔分配發送時槽
+    - 同一群組/頻道：預設 20 則/分鐘，即兩次發送至少間隔 3 秒
+    - 私聊：同一用戶 1 則/秒
+    - 收到 429 時呼叫 pause(retry_after)，暫停此 bot 的所有發送
+    acquire() 在拿到時槽前不會讓出控制權，檢查與預約是原子的，不需要鎖。
+    """
+
+    def __init__(self, global_rate: float = 30.0, group_interval: float = 3.0,
+                 private_interval: float = 1.0, prune_threshold: int = 10000):
+        self.global_rate = global_rate
+        self._global_interval = 1.0 / global_rate
+        self._group_interval = group_interval
+        self._private_interval = private_interval
+        self._prune_threshold = prune_threshold
+        self._next_global = 0.0
+        self._paused_until = 0.0
+        self._chat_next: Dict[str, float] = {}
+
+    def chat_interval(self, chat_id: Union[int, str]) -> float:
+        # 群組/頻道 id 為負數，私聊為正數
+        return self._group_interval if str(chat_id).startswith("-") else self._private_interval
+
+    async def acquire(self, chat_id: Union[int, str]) -> None:
+        key = str(chat_id)
+        while True:
+            now = time.monotonic()
+            ready_at = max(self._paused_until, self._chat_next.get(key, 0.0))
+            if ready_at > now:
+                await asyncio.sleep(ready_at - now)
+                continue
+            slot = max(now, self._next_global)
+            self._next_global = slot + self._global_interval
+            self._chat_next[key] = slot + self.chat_interval(key)
+            if len(self._chat_next) > self._prune_threshold:
+                self._prune(now)
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            return
+
+    def pause(self, seconds: float) -> None:
+        """429 退避：在 seconds 秒內不分配任何時槽。"""
+        self._paused_until = max(self._paused_until, time.monotonic() + max(0.0, float(seconds)))
+
+    def _prune(self, now: float) -> None:
+        for key in [k for k, ts in self._chat_next.items() if ts <= now]:
+            del self._chat_next[key]
+
+
+_LIMITERS: Dict[int, TelegramRateLimiter] = {}
+
+
+def get_rate_limiter(bot_id: int) -> TelegramRateLimiter:
+    """取得 bot 專屬的限速器；Telegram 的限制按 bot 計算，同一 bot 的所有發送路徑應共用一份。"""
+    limiter = _LIMITERS.get(bot_id)
+    if limiter is None:
+        limiter = TelegramRateLimiter()
+        _LIMITERS[bot_id] = limiter
+    return limiter
+
+
+async def call_with_limit(limiter: TelegramRateLimiter, chat_id: Union[int, str],
+                          factory: Callable[[], Awaitable[T]], *, max_retries: int = 3) -> T:
+    """
+    取得時槽後呼叫 factory()（每次重試都會重新建立請求）。
+    429 時暫停整個 bot 的發送再重試，超過 max_retries 次則拋出 TelegramRetryAfter。
+    """
+    attempt = 0
+    while True:
+        await limiter.acquire(chat_id)
+        try:
+            return await factory()
+        except TelegramRetryAfter as e:
+            limiter.pause(e.retry_after)
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            logger.warning(f"發送到 {chat_id} 觸發限流，{e.retry_after}s 後重試（第 {attempt} 次）")
@@ -0,0 +1,108 @@
+"""
+數據庫結構遷移：按模型宣告補建已有數據庫中缺少的表與索引（__table_args__），不修改已有的欄位。
+
+用法（在 src 目錄下）：
+    python schema_migrations.py verify   # 只檢查，列出缺少的表/索引，缺少時退出碼為 1
+    python schema_migrations.py apply    # 建立缺少的表/索引，完成後再檢查一次
+"""
+import asyncio
+import logging
+import sys
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db_handler_aio import Base, dispose_engine, get_engine
+
+
+logger = logging.getLogger(__name__)
+
+
+def _existing_indexes(sync_conn) -> Dict[str, Set[str]]:
+    inspector = inspect(sync_conn)
+    existing: Dict[str, Set[str]] = {}
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing[table.name] = {ix["name"] for ix in inspector.get_indexes(table.name)}
+    return existing
+
+
+def _existing_tables(sync_conn) -> Set[str]:
+    return set(inspect(sync_conn).get_table_names())
+
+
+async def missing_tables(db_engine: Optional[AsyncEngine] = None) -> List[str]:
+    """返回模型中宣告、但數據庫中不存在的表。"""
+    db_engine = db_engine or get_engine()
+    async with db_engine.connect() as conn:
+        existing = await conn.run_sync(_existing_tables)
+    return [t.name for t in Base.metadata.sorted_tables if t.name not in existing]
+
+
+async def apply_tables(db_engine: Optional[AsyncEngine] = None) -> List[str]:
+    """建立缺少的表（連同其索引），返回本次建立的表。"""
+    db_engine = db_engine or get_engine()
+    names = await missing_tables(db_engine)
+    if names:
+        tables = [Base.metadata.tables[name] for name in names]
+        logger.info(f"建立表 {names} ...")
+        async with db_engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=tables))
+    return names
+
+
+async def missing_indexes(db_engine: Optional[AsyncEngine] = None) -> List[str]:
+    """返回模型中宣告、但數據庫中不存在的索引（table.index）。表不存在時跳過。"""
+    db_engine = db_engine or get_engine()
+    async with db_engine.connect() as conn:
+        existing = await conn.run_sync(_existing_indexes)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name not in existing[table.name]:
+                missing.append(f"{table.name}.{index.name}")
+    return missing
+
+
+async def apply_indexes(db_engine: Optional[AsyncEngine] = None) -> List[str]:
+    """逐個建立缺少的索引（每個索引單獨提交，中途失敗時已建立的保留），返回本次建立的索引。"""
+    db_engine = db_engine or get_engine()
+    created = []
+    for name in await missing_indexes(db_engine):
+        table_name, index_name = name.split(".", 1)
+        index = next(ix for ix in Base.metadata.tables[table_name].indexes if ix.name == index_name)
+        logger.info(f"建立索引 {name} ...")
+        async with db_engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: index.create(sync_conn))
+        created.append(name)
+    return created
+
+
+async def _main(command: str) -> int:
+    try:
+        if command == "apply":
+            tables = await apply_tables()
+            logger.info(f"已建立 {len(tables)} 個表: {tables}")
+            created = await apply_indexes()
+            logger.info(f"已建立 {len(created)} 個索引: {created}")
+        missing = await missing_tables() + await missing_indexes()
+        if missing:
+            logger.warning(f"缺少表/索引: {missing}")
+            return 1
+        logger.info("所有模型宣告的表與索引均已存在")
+        return 0
+    finally:
+        await dispose_engine()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    if command not in ("apply", "verify"):
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(_main(command)))
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_topic(name) -> str:
+    """主題名稱正規化：去頭尾空白、合併連續空白、不分大小寫。"""
+    return " ".join(str(name or "").split()).casefold()
+
+
+class SocialsIndex:
+    """
+    一份社群配置的二級索引（只收錄 enable 的 chat），值為 (social, chat) 配對：
+    - by_topic：正規化後的主題名稱
+    - by_type：chat 類型（copy / holding ...，小寫）
+    - by_type_trader：(chat 類型, traderUid)
+    另有 social_groups：所有資訊群 id（字串）
+    """
+
+    def __init__(self, data: List[dict]):
+        self.data = data
+        self.social_groups: Set[str] = {str(item["socialGroup"]) for item in data if item.get("socialGroup") is not None}
+        self.by_topic: Dict[str, List[Tuple[dict, dict]]] = {}
+        self.by_type: Dict[str, List[Tuple[dict, dict]]] = {}
+        self.by_type_trader: Dict[Tuple[str, str], List[Tuple[dict, dict]]] = {}
+        for social in data:
+            for chat in social.get("chats") or []:
+                if not chat.get("enable"):
+                    continue
+                pair = (social, chat)
+                if chat.get("name"):
+                    self.by_topic.setdefault(normalize_topic(chat["name"]), []).append(pair)
+                chat_type = str(chat.get("type", "")).lower()
+                self.by_type.setdefault(chat_type, []).append(pair)
+                self.by_type_trader.setdefault((chat_type, str(chat.get("traderUid"))), []).append(pair)
+
+    def topic(self, name) -> List[Tuple[dict, dict]]:
+        return self.by_topic.get(normalize_topic(name), [])
+
+    def chat_type(self, chat_type, trader_uid=None) -> List[Tuple[dict, dict]]:
+        chat_type = str(chat_type or "").lower()
+        if trader_uid is None:
+            return self.by_type.get(chat_type, [])
+        return self.by_type_trader.get((chat_type, str(trader_uid)), [])
+
+
+class SocialsSnapshot:
+    """
+    SOCIAL_API（社群/主題配置）的共享快照：
+    - TTL 內直接返回記憶體中的配置
+    - 過期時同一時間只有一個請求在拉取（single-flight），其他呼叫者共用結果
+    - 拉取失敗時沿用上一份配置；從未成功過則返回 None
+    - 每次拉取成功後重建 SocialsIndex，按主題/類型匹配時只需查字典
+    """
+
+    def __init__(self, url: Optional[str], *, payload: Optional[dict] = None, ttl: float = 60.0):
+        self._url = url
+        self._payload = payload or {"brand": "BYD", "type": "TELEGRAM"}
+        self._ttl = ttl
+        self._index: Optional[SocialsIndex] = None
+        self._ts = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+
+    def invalidate(self) -> None:
+        """下次 get() 重新拉取（配置變更時呼叫）。"""
+        self._ts = 0.0
+
+    async def get(self, *, force: bool = False) -> Optional[List[dict]]:
+        index = await self.get_index(force=force)
+        return index.data if index is not None else None
+
+    async def get_index(self, *, force: bool = False) -> Optional[SocialsIndex]:
+        if not force and self._index is not None and time.time() - self._ts < self._ttl:
+            return self._index
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch())
+        # shield：單個呼叫者被取消時不影響共用的拉取
+        return await asyncio.shield(self._inflight)
+
+    async def _fetch(self) -> Optional[SocialsIndex]:
+        try:
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+            async with aiohttp.ClientSession() as session:
+                async with session.post(self._url, headers=headers, data=self._payload) as resp:
+                    if resp.status == 200:
+                        body = await resp.json()
+                        self._index = SocialsIndex(body.get("data", []) or [])
+                        self._ts = time.time()
+                    else:
+                        logger.error(f"获取社交群组配置失败，状态码: {resp.status}")
+        except Exception as e:
+            logger.error(f"调用 /socials 接口失败: {e}")
+        finally:
+            self._inflight = None
+        return self._index
+
+
+socials_snapshot = SocialsSnapshot(
+    os.getenv("SOCIAL_API"),
+    ttl=float(os.getenv("SOCIALS_CACHE_TTL", "60")),
+)
@@ -1,13 +1,17 @@
-import aiofiles
+import asyncio
 import os
 import json
 import logging
+import time
 import aiohttp
 import urllib.parse
 from aiogram import Bot
-from aiogram.types import FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from dotenv import load_dotenv
 from multilingual_utils import get_multilingual_content, apply_rtl_if_needed
+from broadcast_media import BroadcastMedia
+from socials_snapshot import socials_snapshot
+from rate_limiter import call_with_limit, get_rate_limiter
 
 load_dotenv()
 
@@ -65,154 +69,207 @@ def escape_markdown_v2(text):
         text = text.replace(ch, '\\' + ch)
     return text
 
+async def _prepare_post(post, socials_index):
+    """解析目標群組並下載圖片；文章無效或無匹配主題時返回 None。"""
+    topic = post.get("topic_name")
+    content = post.get("content")
+    image = post.get("image")
+
+    if not topic or not content:
+        logger.warning(f"文章数据不完整，跳过: {post}")
+        return None
+
+    # 查找匹配的群组和主题（主題索引查表）
+    matching_chats = [
+        {"chatId": social.get("socialGroup"), "topicId": chat.get("chatId"), "lang": social.get("lang", "en_US")}
+        for social, chat in socials_index.topic(topic)
+    ]
+    if not matching_chats:
+        logger.warning(f"未找到匹配的主题 {topic}，跳过文章: {post}")
+        return None
+
+    media = None
+    media_error = None
+    # 如果有圖片，先下載一次到記憶體；首次上傳後其餘群組使用 file_id
+    if image:
+        if not image.startswith("http"):
+            image = f"https://sp.signalcms.com{image}"
+            # image = f"http://172.25.183.139:5003{image}"
+        try:
+            media = await BroadcastMedia.fetch(image)
+        except Exception as e:
+            # 如果圖片下載失敗，記錄錯誤但繼續處理文字消息
+            logger.error(f"Error downloading image: {image}, {e}")
+            media_error = {"success": False, "error": f"Image download error: {e}"}
+    return {"post": post, "chats": matching_chats, "media": media, "media_error": media_error}
+
+async def _send_post_to_chat(bot: Bot, limiter, post, media, chat):
+    chat_id = chat.get("chatId")
+    topic_id = chat.get("topicId")
+    lang = chat.get("lang", "en_US")
+
+    logger.info(f"chat_id: {chat_id}, topic_id: {topic_id}, lang: {lang}")
+    try:
+        content = get_multilingual_content(post, lang)
+        content = apply_rtl_if_needed(content)
+
+        # 创建 "Trade Now" 按钮（临时使用示例链接）
+        # TODO: 之后需要根据 detail 接口的 jump 参数判断是否显示，并拼接完整链接
+        trade_button = InlineKeyboardButton(text="Trade Now", url="https://www.bydfi.com")
+        reply_markup = InlineKeyboardMarkup(inline_keyboard=[[trade_button]])
+
+        if media:
+            await call_with_limit(limiter, chat_id, lambda: media.send(lambda photo: bot.send_photo(
+                chat_id=chat_id,
+                photo=photo,
+                caption=content,
+                message_thread_id=topic_id,
+                parse_mode="HTML",
+                reply_markup=reply_markup
+            )))
+        else:
+            await call_with_limit(limiter, chat_id, lambda: bot.send_message(
+                chat_id=chat_id,
+                text=content,
+                message_thread_id=topic_id,
+                parse_mode="HTML",
+                reply_markup=reply_markup
+            ))
+
+        logger.info(f"成功发送文章到 Chat ID: {chat_id} 的主题 ID: {topic_id}")
+        return {"success": True, "chat_id": chat_id, "topic_id": topic_id}
+    except Exception as e:
+        logger.error(f"发送文章到 Chat ID {chat_id} 的主题 ID {topic_id} 失败: {e}")
+        return {"success": False, "error": str(e), "chat_id": chat_id, "topic_id": topic_id}
+
 async def publish_posts(bot: Bot, posts_list, update_url, headers):
     """
-    发布文章到目标群组的特定主题，并更新文章状态
+    发布文章到目标群组的特定主题，并更新文章状态。
+    - 主題匹配走 SocialsIndex 的主題索引；所有文章的圖片同時預先下載
+    - 文章按順序發布（同群內的先後不變），單篇文章對所有群組並發發送，速率由 bot 共用的限速器控制
+    - 狀態更新在每篇發布後立即於背景送出，共用一個 session，最後統一等待
     """
-    # socials_url = "http://127.0.0.1:5002/admin/telegram/social/socials"  # 查询 socialGroup 和 chatId 的接口
-    # socials_url = "http://172.31.91.67:4070/admin/telegram/social/socials"  # 查询 socialGroup 和 chatId 的接口
-    socials_url = "http://172.25.183.151:4070/admin/telegram/social/socials"
-    socials_payload = {"brand": "BYD", "type": "TELEGRAM"}
+    # 社群配置走共享快照，不再每次發布都重新拉取
+    socials_index = await socials_snapshot.get_index()
+    if socials_index is None:
+        logger.error("获取社交群组配置失败，跳过本轮发布")
+        return
 
-    try:
-        # 获取所有社交平台的配置
-        async with aiohttp.ClientSession() as session:
-            async with session.post(SOCIAL_API, headers=headers, data=socials_payload) as response:
-                if response.status == 200:
-                    socials_data = await response.json()
-                    social_chats = socials_data.get("data", [])
+    limiter = get_rate_limiter(bot.id)
+    prepared = [asyncio.create_task(_prepare_post(post, socials_index)) for post in posts_list]
+    status_tasks = []
+
+    async with aiohttp.ClientSession() as session:
+        try:
+            for task in prepared:
+                item = await task
+                if item is None:
+                    continue
+                post = item["post"]
+                post_id = post.get("id")
+                chats = []
+                for chat in item["chats"]:
+                    if not chat.get("chatId") or not chat.get("topicId"):
+                        logger.warning(f"未找到 chatId 或 topicId，跳过: {chat}")
+                        continue
+                    chats.append(chat)
+
+                logger.info(f"matching_chats: {chats}")
+                send_results = [item["media_error"]] if item["media_error"] else []
+                send_results += await asyncio.gather(
+                    *(_send_post_to_chat(bot, limiter, post, item["media"], chat) for chat in chats)
+                )
+
+                successful_sends = [r for r in send_results if r["success"]]
+                failed_sends = [r for r in send_results if not r["success"]]
+
+                if successful_sends:
+                    logger.info(f"文章 {post_id} 成功發送到 {len(successful_sends)} 個社群")
+                    if failed_sends:
+                        logger.warning(f"文章 {post_id} 有 {len(failed_sends)} 個社群發送失敗: {failed_sends}")
+
+                    # 只要有成功發送，就更新文章狀態為已發布
+                    status_tasks.append(asyncio.create_task(update_post_status(update_url, headers, post_id, session=session)))
                 else:
-                    logger.error(f"获取社交群组配置失败，状态码: {response.status}")
-                    return
+                    logger.error(f"文章 {post_id} 所有社群發送都失敗，不更新狀態")
+        finally:
+            for task in prepared:
+                task.cancel()
+            if status_tasks:
+                await asyncio.gather(*status_tasks, return_exceptions=True)
+
+async def update_post_status(update_url, headers, post_id, *, session=None):
+    """更新單篇文章狀態（後端沒有批量接口）；傳入 session 時複用連線。"""
+    payload = {"id": post_id, "is_sent_tg": 1}  # 更新文章状态为已发布
+    if session is None:
+        async with aiohttp.ClientSession() as own_session:
+            return await update_post_status(update_url, headers, post_id, session=own_session)
+    try:
+        async with session.post(update_url, headers=headers, data=json.dumps(payload)) as response:
+            if response.status == 200:
+                logger.info(f"成功更新文章状态: {post_id}")
+            else:
+                logger.error(f"更新文章状态失败，状态码: {response.status}")
     except Exception as e:
-        logger.error(f"调用 /socials 接口失败: {e}")
-        return
+        logger.error(f"调用 /posts/update 接口失败: {e}")
 
-    # 遍历每篇文章
-    for post in posts_list:
-        topic = post.get("topic_name")
-        content = post.get("content")
-        image = post.get("image")
-        post_id = post.get("id")
-
-        if not topic or not content:
-            logger.warning(f"文章数据不完整，跳过: {post}")
-            continue
-        
-        normalized_topic = topic.strip()
-        
-        # 查找匹配的群组和主题
-        matching_chats = [
-            {"chatId": social["socialGroup"], "topicId": chat["chatId"], "lang": social.get("lang", "en_US")}
-            for social in social_chats
-            for chat in social.get("chats", [])
-            if chat["enable"] and chat["name"] == normalized_topic
-        ]
-        
-        if not matching_chats:
-            logger.warning(f"未找到匹配的主题 {topic}，跳过文章: {post}")
-            continue
-
-        # 收集發送結果
-        send_results = []
-        temp_file_path = None
-        image_file = None
-        
-        # 如果有圖片，先下載一次
-        if image:
-            if not image.startswith("http"):
-                image = f"https://sp.signalcms.com{image}"
-                # image = f"http://172.25.183.139:5003{image}"
-            temp_file_path = f"/tmp/image_{post_id}.jpg"
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(image) as img_response:
-                        if img_response.status == 200:
-                            async with aiofiles.open(temp_file_path, "wb") as f:
-                                await f.write(await img_response.read())
-                            logger.info(f"Image downloaded successfully: {temp_file_path}")
-                            image_file = FSInputFile(temp_file_path)
-                        else:
-                            logger.error(f"Failed to download image: {image}")
-                            # 如果圖片下載失敗，記錄錯誤但繼續處理文字消息
-                            send_results.append({"success": False, "error": f"Image download failed: {image}"})
-            except Exception as e:
-                logger.error(f"Error downloading image: {e}")
-                send_results.append({"success": False, "error": f"Image download error: {e}"})
-        
-        logger.info(f"matching_chats: {matching_chats}")
-        # 遍历所有匹配的 chatId 和 topic_id，发送消息
-        for chat in matching_chats:
-            chat_id = chat.get("chatId")
-            topic_id = chat.get("topicId")
-            lang = chat.get("lang", "en_US")
-
-            logger.info(f"chat_id: {chat_id}, topic_id: {topic_id}, lang: {lang}")
-            
-            if not chat_id or not topic_id:
-                logger.warning(f"未找到 chatId 或 topicId，跳过: {chat}")
-                continue
-                
+
+class ArticlePublisher:
+    """
+    文章發布（事件驅動）：
+    - CMS 呼叫 /api/posts/notify 後立即拉取並發布未發布文章
+    - 輪詢只作兜底：閒置時間隔逐步加倍到 max_interval，有文章或收到推送後回到 min_interval
+    - 同一時間只跑一輪「拉取 + 發布」；發布途中收到推送會再補跑一輪，不會重複發送同一篇
+    """
+
+    def __init__(self, bot: Bot, posts_url, update_url, *, headers=None,
+                 min_interval: float = 30.0, max_interval: float = 600.0):
+        self._bot = bot
+        self._posts_url = posts_url
+        self._update_url = update_url
+        self._headers = headers or {"Content-Type": "application/json"}
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._interval = min_interval
+        self._wakeup = asyncio.Event()
+        self.last_run_ts = 0.0
+        self.last_published = 0
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    def notify(self) -> None:
+        """有新文章待發布（由推送接口呼叫）。"""
+        self._wakeup.set()
+
+    async def run_once(self) -> int:
+        posts_list = await fetch_unpublished_posts(self._posts_url, self._headers)
+        if posts_list:
+            await publish_posts(self._bot, posts_list, self._update_url, self._headers)
+        self.last_run_ts = time.time()
+        self.last_published = len(posts_list)
+        return len(posts_list)
+
+    async def run(self) -> None:
+        # 啟動時先跑一輪，補發停機期間累積的文章
+        pushed = True
+        while True:
             try:
-                content = get_multilingual_content(post, lang)
-                content = apply_rtl_if_needed(content)
-                
-                # 创建 "Trade Now" 按钮（临时使用示例链接）
-                # TODO: 之后需要根据 detail 接口的 jump 参数判断是否显示，并拼接完整链接
-                trade_button = InlineKeyboardButton(text="Trade Now", url="https://www.bydfi.com")
-                reply_markup = InlineKeyboardMarkup(inline_keyboard=[[trade_button]])
-                
-                if image and image_file:
-                    await bot.send_photo(
-                        chat_id=chat_id,
-                        photo=image_file,
-                        caption=content,
-                        message_thread_id=topic_id,
-                        parse_mode="HTML",
-                        reply_markup=reply_markup
-                    )
-                else:
-                    await bot.send_message(
-                        chat_id=chat_id,
-                        text=content,
-                        message_thread_id=topic_id,
-                        parse_mode="HTML",
-                        reply_markup=reply_markup
-                    )
-                    
-                logger.info(f"成功发送文章到 Chat ID: {chat_id} 的主题 ID: {topic_id}")
-                send_results.append({"success": True, "chat_id": chat_id, "topic_id": topic_id})
-                
+                count = await self.run_once()
             except Exception as e:
-                logger.error(f"发送文章到 Chat ID {chat_id} 的主题 ID {topic_id} 失败: {e}")
-                send_results.append({"success": False, "error": str(e), "chat_id": chat_id, "topic_id": topic_id})
-
-        # 清理臨時文件
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-            logger.info(f"已清理臨時文件: {temp_file_path}")
-
-        successful_sends = [r for r in send_results if r["success"]]
-        failed_sends = [r for r in send_results if not r["success"]]
-        
-        if successful_sends:
-            logger.info(f"文章 {post_id} 成功發送到 {len(successful_sends)} 個社群")
-            if failed_sends:
-                logger.warning(f"文章 {post_id} 有 {len(failed_sends)} 個社群發送失敗: {failed_sends}")
-            
-            # 只要有成功發送，就更新文章狀態為已發布
-            await update_post_status(update_url, headers, post_id)
-        else:
-            logger.error(f"文章 {post_id} 所有社群發送都失敗，不更新狀態")
+                logger.error(f"文章发布轮次失败: {e}")
+                count = 0
+            if pushed or count:
+                self._interval = self._min_interval
+            else:
+                self._interval = min(self._interval * 2, self._max_interval)
 
-async def update_post_status(update_url, headers, post_id):
-    payload = {"id": post_id, "is_sent_tg": 1}  # 更新文章状态为已发布
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(update_url, headers=headers, data=json.dumps(payload)) as response:
-                if response.status == 200:
-                    logger.info(f"成功更新文章状态: {post_id}")
-                else:
-                    logger.error(f"更新文章状态失败，状态码: {response.status}")
-        except Exception as e:
-            logger.error(f"调用 /posts/update 接口失败: {e}")
+            # 不用 wait_for：事件已觸發時它可能吞掉取消信號
+            waiter = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=self._interval)
+            finally:
+                waiter.cancel()
+            pushed = self._wakeup.is_set()
+            self._wakeup.clear()
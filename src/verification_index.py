@@ -0,0 +1,142 @@
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class VerificationIndex:
+    """
+    verified_users 的記憶體索引（只收錄 is_active 的記錄）：
+    - verify_code -> {user_id}：判斷 UID 是否已被其他用户使用
+    - user_id -> (verify_group_id, info_group_id, verify_code)：入群檢查
+    啟動時由 db_handler_aio.warm_verification_index() 全量載入，之後由 add_verified_user 寫穿。
+    索引只回答「命中」：查不到時返回 None，由呼叫者回退查庫（其他進程寫入的記錄不會漏判）。
+    命中直接作為結果，不再查庫。停用/刪除發生在其他進程，需由對方呼叫 remove / remove_code
+    （main 的 POST /api/verification_index/invalidate）；沒有通知時，被停用的記錄最多在 ttl 秒內仍被視為有效
+    （UID 仍算被佔用、用户仍可入群），過期後視為未命中，由查庫結果刷新（sync_code / upsert / remove）。
+    ttl 越短越接近數據庫，但未命中回退查庫的比例越高。
+    """
+
+    def __init__(self, ttl: float = 120.0):
+        self._ttl = ttl
+        self._by_code: Dict[str, Set[str]] = {}
+        # user_id -> (verify_group_id, info_group_id, verify_code, seen_at)
+        self._by_user: Dict[str, Tuple[str, str, str, float]] = {}
+        self._ready = False
+        self._warmed_at = 0.0
+        # 全量載入期間的寫入，載入完成後重放，避免被舊快照覆蓋
+        self._pending_writes: Optional[List[tuple]] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @property
+    def warmed_at(self) -> float:
+        return self._warmed_at
+
+    def __len__(self) -> int:
+        return len(self._by_user)
+
+    def begin_warm(self) -> None:
+        self._pending_writes = []
+
+    def finish_warm(self, rows: Iterable[Tuple[str, str, str, str]]) -> None:
+        """rows: (user_id, verify_group_id, info_group_id, verify_code)，整份替換現有索引。"""
+        by_code: Dict[str, Set[str]] = {}
+        by_user: Dict[str, Tuple[str, str, str, float]] = {}
+        now = time.time()
+        for user_id, verify_group_id, info_group_id, verify_code in rows:
+            self._put(by_code, by_user, str(user_id), str(verify_group_id), str(info_group_id), str(verify_code), now)
+        pending, self._pending_writes = self._pending_writes or [], None
+        self._by_code, self._by_user = by_code, by_user
+        for op in pending:
+            self._apply(*op)
+        self._ready = True
+        self._warmed_at = time.time()
+
+    def abort_warm(self) -> None:
+        self._pending_writes = None
+
+    def upsert(self, user_id, verify_group_id, info_group_id, verify_code) -> None:
+        self._record(("upsert", str(user_id), str(verify_group_id), str(info_group_id), str(verify_code), time.time()))
+
+    def remove(self, user_id) -> None:
+        """用户已停用或記錄已刪除。"""
+        self._record(("remove", str(user_id)))
+
+    def remove_code(self, verify_code) -> int:
+        """移除使用此 UID 的所有用户，返回移除的條數。"""
+        users = list(self._by_code.get(str(verify_code), ()))
+        for user_id in users:
+            self.remove(user_id)
+        return len(users)
+
+    def sync_code(self, verify_code, rows: Iterable[Tuple[str, str, str]]) -> None:
+        """
+        以查庫結果為準刷新某個 UID：rows 為該 UID 全部有效記錄 (user_id, verify_group_id, info_group_id)，
+        索引中使用此 UID、但不在 rows 裡的用户（已被停用或刪除）一併移除。
+        """
+        verify_code = str(verify_code)
+        rows = [(str(u), str(vg), str(ig)) for u, vg, ig in rows]
+        keep = {u for u, _, _ in rows}
+        for user_id in list(self._by_code.get(verify_code, ())):
+            if user_id not in keep:
+                self.remove(user_id)
+        for user_id, verify_group_id, info_group_id in rows:
+            self.upsert(user_id, verify_group_id, info_group_id, verify_code)
+
+    def _record(self, op: tuple) -> None:
+        self._apply(*op)
+        if self._pending_writes is not None:
+            self._pending_writes.append(op)
+
+    def _fresh(self, item) -> bool:
+        return item is not None and time.time() - item[3] < self._ttl
+
+    def check_code(self, user_id, verify_code) -> Optional[str]:
+        """
+        is_user_verified 的記憶體版本：UID 被其他用户使用返回 "warning"，只屬於本人返回 "verified"；
+        索引中沒有此 UID、或相關記錄已超過 ttl 返回 None。
+        """
+        users = self._by_code.get(str(verify_code))
+        if not users or not all(self._fresh(self._by_user.get(u)) for u in users):
+            return None
+        return "warning" if users - {str(user_id)} else "verified"
+
+    def is_verified_in(self, user_id, info_group_id) -> bool:
+        """用户已驗證且 info_group_id 匹配（且未超過 ttl）返回 True；False 只代表索引未命中，需回退查庫。"""
+        item = self._by_user.get(str(user_id))
+        return self._fresh(item) and item[1] == str(info_group_id)
+
+    def info_group_of(self, user_id) -> Optional[str]:
+        """索引中用户的 info_group_id（不論是否過期）。"""
+        item = self._by_user.get(str(user_id))
+        return item[1] if item is not None else None
+
+    def _apply(self, kind: str, user_id: str, *args) -> None:
+        if kind == "upsert":
+            self._put(self._by_code, self._by_user, user_id, *args)
+        else:
+            self._drop(self._by_code, self._by_user, user_id)
+
+    @classmethod
+    def _put(cls, by_code, by_user, user_id: str, verify_group_id: str, info_group_id: str, verify_code: str,
+             seen_at: float) -> None:
+        # user_id 在表中唯一：更新 UID 時先移除舊的 verify_code 映射
+        cls._drop(by_code, by_user, user_id)
+        by_user[user_id] = (verify_group_id, info_group_id, verify_code, seen_at)
+        by_code.setdefault(verify_code, set()).add(user_id)
+
+    @staticmethod
+    def _drop(by_code, by_user, user_id: str) -> None:
+        old = by_user.pop(user_id, None)
+        if old is None:
+            return
+        users = by_code.get(old[2])
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                by_code.pop(old[2], None)
@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# (text, parse_mode, cacheable)
+Reply = Tuple[str, Optional[str], bool]
+ThrottleKey = Tuple[int, int]
+
+_replies: contextvars.ContextVar[Optional[List[Reply]]] = contextvars.ContextVar("verify_replies", default=None)
+
+
+def record_reply(text: str, parse_mode: Optional[str] = None, *, cacheable: bool = True) -> None:
+    """記錄驗證流程發給用戶的回覆（在 VerifyThrottle.run() 之外呼叫時不做任何事）。
+    cacheable=False 用於暫時性錯誤（服務不可用、生成連結失敗等），此次結果不進快取。"""
+    replies = _replies.get()
+    if replies is not None:
+        replies.append((text, parse_mode, cacheable))
+
+
+class VerifyThrottle:
+    """
+    按 (bot_id, user_id) 的驗證節流：
+    - 同一用戶同時只跑一個驗證流程；相同請求（fingerprint，如驗證碼 + 驗證群）在進行中時等待同一結果，
+      不同請求排在其後
+    - 流程經 record_reply() 記錄的回覆快取 result_ttl 秒，期間相同請求直接返回記錄的回覆，不打上游
+    - 每用戶 window 秒內最多 max_attempts 次實際驗證（快取與合併的請求不計）
+    run() 返回 (狀態, 回覆)：fresh 表示流程已執行且回覆已發出；coalesced / cached 需由呼叫方重發回覆；
+    limited 表示超出頻率限制，回覆為空。
+    """
+
+    def __init__(self, *, result_ttl: float = 30.0, max_attempts: int = 5, window: float = 60.0):
+        self._result_ttl = result_ttl
+        self._max_attempts = max_attempts
+        self._window = window
+        self._inflight: Dict[ThrottleKey, Tuple[Hashable, asyncio.Future]] = {}
+        # {key: (fingerprint, replies, expires_at)}
+        self._results: Dict[ThrottleKey, Tuple[Hashable, List[Reply], float]] = {}
+        self._attempts: Dict[ThrottleKey, Deque[float]] = {}
+
+    async def run(self, key: ThrottleKey, fingerprint: Hashable,
+                  flow: Callable[[], Awaitable[None]]) -> Tuple[str, List[Reply]]:
+        while True:
+            entry = self._inflight.get(key)
+            if entry is None:
+                break
+            inflight_fingerprint, fut = entry
+            # 同一用戶的其他驗證進行中：相同請求共用結果，不同請求等它完成再跑，避免並發打上游
+            try:
+                replies = await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                # 進行中的流程被取消（而不是自己被取消）時重新判斷
+                if not fut.cancelled():
+                    raise
+                continue
+            except Exception:  # noqa: BLE001
+                if inflight_fingerprint == fingerprint:
+                    raise
+                continue
+            if inflight_fingerprint == fingerprint:
+                return "coalesced", replies
+
+        cached = self._results.get(key)
+        if cached is not None and cached[0] == fingerprint and cached[2] > time.time():
+            return "cached", cached[1]
+
+        if not self._allow(key):
+            logger.warning(f"[verify_throttle] 用戶 {key} 驗證過於頻繁，已拒絕")
+            return "limited", []
+
+        fut = asyncio.get_running_loop().create_future()
+        # 沒有其他請求等待時也取走異常，避免 'exception was never retrieved'
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = (fingerprint, fut)
+        replies: List[Reply] = []
+        token = _replies.set(replies)
+        try:
+            await flow()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            if replies and all(cacheable for _, _, cacheable in replies):
+                self._results[key] = (fingerprint, replies, time.time() + self._result_ttl)
+            else:
+                self._results.pop(key, None)
+            fut.set_result(replies)
+            return "fresh", replies
+        finally:
+            _replies.reset(token)
+            self._inflight.pop(key, None)
+
+    def _allow(self, key: ThrottleKey) -> bool:
+        now = time.time()
+        attempts = self._attempts.setdefault(key, deque())
+        while attempts and attempts[0] <= now - self._window:
+            attempts.popleft()
+        if len(attempts) >= self._max_attempts:
+            return False
+        attempts.append(now)
+        return True
+
+    def cleanup(self) -> None:
+        now = time.time()
+        for key in [k for k, (_, _, exp) in self._results.items() if exp <= now]:
+            self._results.pop(key, None)
+        for key in [k for k, v in self._attempts.items() if not v or v[-1] <= now - self._window]:
+            self._attempts.pop(key, None)
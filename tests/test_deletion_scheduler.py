@@ -0,0 +1,76 @@
+"""
+DeletionScheduler 測試：找不到 bot 時的重試/放棄，以及 flush() / load() 持久化往返。
+
+    cd src
+    python -m pytest ../tests/test_deletion_scheduler.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from deletion_scheduler import DeletionScheduler  # noqa: E402
+
+
+class FakeBot:
+    def __init__(self, bot_id: int):
+        self.id = bot_id
+        self.deleted = []
+
+    async def delete_messages(self, chat_id, message_ids):
+        self.deleted.append((chat_id, list(message_ids)))
+        return True
+
+
+def test_unresolved_bot_keeps_original_due_and_is_dropped_after_max_overdue():
+    scheduler = DeletionScheduler(lambda bot_id: None, max_overdue=100, retry_delay=30)
+    first_due = time.time() - 10
+    scheduler._push(first_due, 1, -100, 7)
+
+    # 找不到 bot：延後重試，原到期時間不變
+    asyncio.run(scheduler._delete_due())
+    assert len(scheduler) == 1
+    due, _, _, _, _, kept_first_due = scheduler._heap[0]
+    assert due > time.time() + 20
+    assert kept_first_due == first_due
+
+    # 多次重試後距原到期時間超過 max_overdue：放棄
+    scheduler._heap[0] = (time.time() - 1,) + scheduler._heap[0][1:5] + (time.time() - 100,)
+    asyncio.run(scheduler._delete_due())
+    assert len(scheduler) == 0
+
+
+def test_resolved_bot_deletes_due_messages_in_one_batch():
+    bot = FakeBot(1)
+    scheduler = DeletionScheduler(lambda bot_id: bot if bot_id == 1 else None)
+    now = time.time()
+    scheduler._push(now - 2, 1, -100, 7)
+    scheduler._push(now - 1, 1, -100, 8)
+    scheduler._push(now + 3600, 1, -100, 9)
+
+    assert asyncio.run(scheduler._delete_due()) == 2
+    assert bot.deleted == [(-100, [7, 8])]
+    assert len(scheduler) == 1
+
+
+def test_flush_and_load_round_trip(tmp_path):
+    store = tmp_path / "deletions.json"
+    scheduler = DeletionScheduler(lambda bot_id: None, store_path=str(store), max_overdue=100)
+    now = time.time()
+    scheduler._push(now + 60, 1, -100, 7)
+    # 已重試過的消息：due 後移，first_due 為原到期時間
+    scheduler._push(now + 30, 2, -200, 8, first_due=now - 50)
+    # 原到期時間已超過 max_overdue，載入時丟棄
+    scheduler._push(now + 30, 2, -200, 9, first_due=now - 200)
+    asyncio.run(scheduler.flush())
+
+    entries = json.loads(store.read_text(encoding="utf-8"))
+    assert {e["message_id"]: e["first_due"] for e in entries}[8] == now - 50
+
+    restored = DeletionScheduler(lambda bot_id: None, store_path=str(store), max_overdue=100)
+    assert restored.load() == 2
+    items = sorted((message_id, due, first_due) for due, _, _, _, message_id, first_due in restored._heap)
+    assert items == [(7, now + 60, now + 60), (8, now + 30, now - 50)]